@@ -0,0 +1,481 @@
+"""
+Throughput benchmark for the wallet tracker against a simulated chain.
+
+Runs a local fake JSON-RPC node (configurable latency, block time and
+transactions per block) plus a fake Telegram API, then drives the tracker's
+monitors with 100 to 100k wallets in fresh worker processes and reports sweep
+time, RPC calls per wallet, detection latency and memory.
+
+    python benchmark.py
+    python benchmark.py --wallets 1000,100000 --modes batch,adaptive --duration 30
+    python benchmark.py --json results.json
+
+Modes are MONITOR_MODE values run through background_monitor(), plus
+'monitor_wallet', which times sequential MultiChainWalletTracker.monitor_wallet
+calls (at most --per-wallet-cap wallets, extrapolated to a full sweep).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+CHAIN_IDS = ('ethereum', 'polygon', 'bsc')
+ZERO_BLOOM = '0x' + '0' * 512
+AGGREGATE3_SELECTOR = bytes.fromhex('82ad56cb')
+
+def wallet_address(index: int) -> str:
+    """Deterministic tracked wallet address shared by the node and the workers"""
+    return '0x' + format(0x1000 + index, '040x')
+
+class FakeChain:
+    """In-memory chain that mines blocks of transactions, some sent by tracked wallets"""
+    def __init__(self, wallets: int, block_time: float, txs_per_block: int, tracked_share: float, seed: int = 1):
+        self.wallets = [wallet_address(i) for i in range(wallets)]
+        self.block_time = block_time
+        self.txs_per_block = txs_per_block
+        self.tracked_share = tracked_share
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.nonces: Dict[str, int] = {}
+        self.head = 1
+        self.blocks: Dict[int, Dict] = {1: self.make_block(1, [])}
+        self.mined: List[List] = []  # [address, wall-clock time] per tracked send
+        self.calls: Counter = Counter()
+        self.posts = 0
+        self.running = False
+        self.sending = False  # tracked wallets only send while a run is in progress
+        self.thread: Optional[threading.Thread] = None
+    
+    def make_block(self, number: int, transactions: List[Dict]) -> Dict:
+        return {
+            'number': hex(number),
+            'hash': '0x' + format(number, '064x'),
+            'parentHash': '0x' + format(number - 1, '064x'),
+            'logsBloom': ZERO_BLOOM,
+            'transactions': transactions
+        }
+    
+    def mine(self):
+        now = time.time()
+        with self.lock:
+            number = self.head + 1
+            transactions = []
+            for i in range(self.txs_per_block):
+                if self.sending and self.wallets and self.random.random() < self.tracked_share:
+                    sender = self.random.choice(self.wallets)
+                    self.mined.append([sender, now])
+                else:
+                    sender = '0x' + format(self.random.getrandbits(160), '040x')
+                self.nonces[sender] = self.nonces.get(sender, 0) + 1
+                transactions.append({
+                    'hash': '0x' + format(number, '032x') + format(i, '032x'),
+                    'from': sender,
+                    'to': '0x' + format(self.random.getrandbits(160), '040x'),
+                    'value': hex(10 ** 15),
+                    'blockNumber': hex(number)
+                })
+            self.blocks[number] = self.make_block(number, transactions)
+            self.blocks.pop(number - 1000, None)
+            self.head = number
+    
+    def produce(self):
+        while self.running:
+            time.sleep(self.block_time)
+            self.mine()
+    
+    def start(self):
+        """Reset counters and start a run of tracked sends"""
+        with self.lock:
+            self.calls.clear()
+            self.posts = 0
+            self.mined = []
+        self.sending = True
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self.produce, daemon=True)
+            self.thread.start()
+    
+    def stop(self):
+        """Stop tracked sends; blocks keep coming so the last ones still get confirmations"""
+        self.sending = False
+    
+    def handle(self, method: str, params: list):
+        self.calls[method] += 1
+        if method == 'eth_getTransactionCount':
+            return hex(self.nonces.get(params[0].lower(), 0))
+        if method == 'eth_getBalance':
+            return hex(10 ** 18)
+        if method == 'eth_blockNumber':
+            return hex(self.head)
+        if method == 'eth_getBlockByNumber':
+            return self.blocks.get(int(params[0], 16))
+        if method == 'eth_getLogs':
+            return []
+        if method == 'eth_call':
+            return self.eth_call(params[0])
+        if method == 'eth_chainId':
+            return '0x1'
+        if method in ('web3_clientVersion', 'net_version'):
+            return 'benchmark'
+        raise KeyError(method)
+
+    def eth_call(self, call: Dict) -> str:
+        """Multicall3 aggregate3 over balance reads; every other call returns one ether"""
+        from eth_abi import decode, encode
+        data = bytes.fromhex(call['data'][2:])
+        if data[:4] != AGGREGATE3_SELECTOR:
+            return '0x' + (10 ** 18).to_bytes(32, 'big').hex()
+        results = [
+            (True, bytes.fromhex(self.eth_call({'to': target, 'data': '0x' + calldata.hex()})[2:]))
+            for target, _, calldata in decode(['(address,bool,bytes)[]'], data[4:])[0]
+        ]
+        return '0x' + encode(['(bool,bytes)[]'], [results]).hex()
+
+class IdleChain(FakeChain):
+    """The chains not under test: no wallets, never mines"""
+    def __init__(self):
+        super().__init__(0, 0, 0, 0)
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        pass  # workers drop keep-alive connections when they exit
+
+class FakeNode:
+    """HTTP front end for the fake chains and the fake Telegram API"""
+    def __init__(self, chain: str, latency: float, fake_chain: FakeChain):
+        self.chain = chain
+        self.latency = latency
+        self.chains = {chain_id: fake_chain if chain_id == chain else IdleChain() for chain_id in CHAIN_IDS}
+        self.telegram_messages = 0
+        self.server = QuietHTTPServer(('127.0.0.1', 0), self.handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def handler(self):
+        node = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def reply(self, payload, status: int = 200):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def do_GET(self):
+                chain = node.chains[node.chain]
+                if self.path == '/control/stats':
+                    with chain.lock:
+                        self.reply({
+                            'calls': dict(chain.calls),
+                            'posts': chain.posts,
+                            'mined': chain.mined,
+                            'head': chain.head,
+                            'telegram_messages': node.telegram_messages
+                        })
+                else:
+                    self.reply({'error': 'not found'}, 404)
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.path.startswith('/bot'):
+                    node.telegram_messages += 1
+                    self.reply({'ok': True})
+                    return
+                if self.path == '/control/start':
+                    node.chains[node.chain].start()
+                    self.reply({'ok': True})
+                    return
+                if self.path == '/control/stop':
+                    node.chains[node.chain].stop()
+                    self.reply({'ok': True})
+                    return
+                
+                chain = node.chains.get(self.path.strip('/').split('/')[-1])
+                if chain is None:
+                    self.reply({'error': 'unknown chain'}, 404)
+                    return
+                time.sleep(node.latency)
+                chain.posts += 1
+                request = json.loads(body)
+                
+                def answer(call):
+                    try:
+                        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': chain.handle(call['method'], call.get('params', []))}
+                    except KeyError:
+                        return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}}
+                
+                self.reply([answer(call) for call in request] if isinstance(request, list) else answer(request))
+        
+        return Handler
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def detection_latencies(mined: List[List], events: List[Dict]) -> Dict:
+    """Match each tracked send to the first activity event for its wallet at or after it was mined"""
+    by_address: Dict[str, List[float]] = {}
+    for event in events:
+        by_address.setdefault(event['address'].lower(), []).append(event['time'])
+    for times in by_address.values():
+        times.sort()
+    
+    latencies, missed = [], 0
+    for address, mined_at in mined:
+        detected = next((t for t in by_address.get(address, []) if t >= mined_at), None)
+        if detected is None:
+            missed += 1
+        else:
+            latencies.append(detected - mined_at)
+    return {
+        'sends': len(mined),
+        'missed': missed,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'max': max(latencies) if latencies else None
+    }
+
+def rss_mb() -> float:
+    """Current resident set size in MB"""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+def run_worker(config: Dict) -> Dict:
+    """Import the tracker against the fake node, run one mode and report measurements"""
+    import logging
+    import requests
+    node = config['node_url']
+    chain = config['chain']
+    os.environ.update({
+        'DATABASE_PATH': os.path.join(config['workdir'], 'benchmark.db'),
+        'TELEGRAM_BOT_TOKEN': 'benchmark',
+        'TELEGRAM_CHAT_ID': '1',
+        'TELEGRAM_API_URL': node,
+        'ALCHEMY_API_KEY': '',
+        'MONITOR_MODE': config['mode'],
+        'ACTIVITY_LOG_SIZE': str(max(10000, config['wallets'])),
+        'RPC_PROBE_INTERVAL': '3600'
+    })
+    for chain_id in CHAIN_IDS:
+        os.environ[f'RPC_URLS_{chain_id.upper()}'] = f"{node}/rpc/{chain_id}"
+        os.environ[f'SWEEP_INTERVAL_{chain_id.upper()}'] = str(config['sweep_interval'])
+        os.environ[f'CONFIRMATIONS_{chain_id.upper()}'] = str(config['confirmations'])
+    
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import wallet_tracker_multichain as wt
+    logging.getLogger().setLevel(logging.WARNING)
+    wt.init_state()
+    
+    baseline_rss = rss_mb()
+    started = time.monotonic()
+    wallets = [
+        wt.WalletInfo(address=wt.Web3.to_checksum_address(wallet_address(i)), chain=chain, label=f"bench-{i}",
+                      last_checked=wt.datetime.now())
+        for i in range(config['wallets'])
+    ]
+    wt.tracked_wallets.bulk_import(wallets)
+    for wallet in wallets:
+        wt.store.save_wallet(wallet)
+    wt.store.flush()
+    load_seconds = time.monotonic() - started
+    
+    # Baseline nonces / block cursors before the chain starts moving
+    started = time.monotonic()
+    if config['mode'] == 'blocks':
+        wt.block_scanner.run_once()
+    else:
+        wt.polling_engine.sweep_chain(chain, wallets)
+    cold_sweep = time.monotonic() - started
+    
+    result = {'load_seconds': round(load_seconds, 3), 'cold_sweep_seconds': round(cold_sweep, 3)}
+    # Mine for the run duration, then keep monitoring long enough to see the last blocks
+    requests.post(f"{node}/control/start")
+    threading.Timer(config['duration'], requests.post, (f"{node}/control/stop",)).start()
+    run_started = time.monotonic()
+    run_seconds = config['duration'] + config['grace']
+    
+    checked = None  # every wallet is monitored, except in 'monitor_wallet' mode
+    if config['mode'] == 'monitor_wallet':
+        # Sequential per-wallet checks, repeated for the run
+        sample = wallets[:config['per_wallet_cap']]
+        passes = []
+        while time.monotonic() - run_started < run_seconds:
+            pass_started = time.monotonic()
+            for wallet in sample:
+                wt.tracker.monitor_wallet(wallet)
+            passes.append(time.monotonic() - pass_started)
+        per_wallet = sum(passes) / (len(passes) * len(sample))
+        result.update({
+            'sweeps': len(passes),
+            'sweep_seconds': round(per_wallet * len(wallets), 3),
+            'sweep_extrapolated': len(sample) < len(wallets)
+        })
+        swept_wallets = len(sample) * len(passes)
+        checked = {wallet.address.lower() for wallet in sample}
+    else:
+        def sweep_totals() -> List[float]:
+            counts = wt.sweep_duration.values.get((chain, config['mode']))
+            return [sum(counts[:-1]), counts[-1]] if counts else [0, 0.0]
+        
+        threading.Thread(target=wt.background_monitor, daemon=True).start()
+        time.sleep(run_seconds)
+        # Large wallet counts can take longer than the run for a single sweep
+        while not sweep_totals()[0] and time.monotonic() - run_started < config['max_wait']:
+            time.sleep(0.5)
+        totals = sweep_totals()
+        sweeps = totals[0]
+        result.update({
+            'sweeps': sweeps,
+            'sweep_seconds': round(totals[1] / sweeps, 3) if sweeps else None,
+            'sweep_extrapolated': False
+        })
+        if config['mode'] == 'adaptive':
+            swept_wallets = wt.adaptive_scheduler.polls
+        else:
+            swept_wallets = sweeps * len(wallets)
+    
+    # Let queued alerts reach the fake Telegram API
+    deadline = time.monotonic() + 30
+    while wt.tracker.alert_dispatcher.queue_depth() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    time.sleep(0.5)
+    stats = requests.get(f"{node}/control/stats").json()
+    events = [
+        {'address': event.address, 'time': event.timestamp.timestamp()}
+        for event in wt.activity_log.query(limit=wt.activity_log.capacity)
+    ]
+    rpc_calls = sum(stats['calls'].values())
+    result.update({
+        'run_seconds': round(time.monotonic() - run_started, 3),
+        'blocks': stats['head'] - 1,
+        'rpc_calls': rpc_calls,
+        'rpc_posts': stats['posts'],
+        'rpc_calls_by_method': stats['calls'],
+        'rpc_calls_per_wallet_check': round(rpc_calls / swept_wallets, 3) if swept_wallets else None,
+        'detection': detection_latencies(
+            [send for send in stats['mined'] if checked is None or send[0] in checked], events
+        ),
+        'telegram_messages': stats['telegram_messages'],
+        'rss_mb': round(rss_mb(), 1),
+        'rss_growth_mb': round(rss_mb() - baseline_rss, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    })
+    return result
+
+def run_scenario(args, mode: str, wallets: int) -> Dict:
+    fake_chain = FakeChain(wallets, args.block_time, args.txs_per_block, args.tracked_share, args.seed)
+    node = FakeNode(args.chain, args.latency_ms / 1000, fake_chain)
+    config = {
+        'node_url': node.url,
+        'chain': args.chain,
+        'mode': mode,
+        'wallets': wallets,
+        'duration': args.duration,
+        'sweep_interval': args.sweep_interval,
+        'confirmations': args.confirmations,
+        'per_wallet_cap': args.per_wallet_cap,
+        'grace': args.sweep_interval + (args.confirmations + 1) * args.block_time + 1,
+        'max_wait': args.max_wait
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        config['workdir'] = workdir
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(config)],
+            capture_output=True, text=True
+        )
+    node.server.shutdown()
+    if process.returncode != 0:
+        return {'mode': mode, 'wallets': wallets, 'error': process.stderr.strip().splitlines()[-1:]}
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result.update({'mode': mode, 'wallets': wallets})
+    return result
+
+def format_seconds(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value:.3f}"
+
+def print_table(results: List[Dict]):
+    header = ('mode', 'wallets', 'sweep s', 'sweeps', 'calls/check', 'detect p50', 'detect p95', 'missed', 'rss MB')
+    rows = []
+    for result in results:
+        if 'error' in result:
+            rows.append((result['mode'], str(result['wallets']), 'error: ' + ' '.join(result['error'])))
+            continue
+        detection = result['detection']
+        rows.append((
+            result['mode'],
+            str(result['wallets']),
+            format_seconds(result['sweep_seconds']) + ('*' if result['sweep_extrapolated'] else ''),
+            str(result['sweeps']),
+            str(result['rpc_calls_per_wallet_check']),
+            format_seconds(detection['p50']),
+            format_seconds(detection['p95']),
+            f"{detection['missed']}/{detection['sends']}",
+            str(result['peak_rss_mb'])
+        ))
+    widths = [max(len(str(row[i])) for row in rows + [header] if i < len(row)) for i in range(len(header))]
+    print('  '.join(title.ljust(width) for title, width in zip(header, widths)))
+    for row in rows:
+        print('  '.join(str(value).ljust(width) for value, width in zip(row, widths)))
+    if any(result.get('sweep_extrapolated') for result in results):
+        print('* extrapolated from --per-wallet-cap wallets')
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the wallet tracker against a simulated chain')
+    parser.add_argument('--wallets', default='100,1000,10000,100000', help='comma-separated wallet counts')
+    parser.add_argument('--modes', default='batch,adaptive,async,blocks,monitor_wallet',
+                        help="comma-separated MONITOR_MODE values, plus 'monitor_wallet'")
+    parser.add_argument('--chain', default='ethereum', choices=CHAIN_IDS)
+    parser.add_argument('--duration', type=float, default=15, help='seconds to run each scenario')
+    parser.add_argument('--latency-ms', type=float, default=20, help='fake node latency per HTTP request')
+    parser.add_argument('--block-time', type=float, default=2, help='seconds between fake blocks')
+    parser.add_argument('--txs-per-block', type=int, default=100)
+    parser.add_argument('--tracked-share', type=float, default=0.05,
+                        help='fraction of transactions sent by tracked wallets')
+    parser.add_argument('--sweep-interval', type=float, default=2, help='SWEEP_INTERVAL_<CHAIN> for the run')
+    parser.add_argument('--confirmations', type=int, default=0,
+                        help='CONFIRMATIONS_<CHAIN> for the run; detection latency then includes the confirmation wait')
+    parser.add_argument('--per-wallet-cap', type=int, default=200,
+                        help="wallets checked per pass in 'monitor_wallet' mode")
+    parser.add_argument('--max-wait', type=float, default=600,
+                        help='seconds to wait for a first sweep when one takes longer than the run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write raw results to this file')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker))))
+        return
+    
+    results = []
+    for wallets in [int(value) for value in args.wallets.split(',')]:
+        for mode in args.modes.split(','):
+            print(f"Running {mode} with {wallets} wallets...", file=sys.stderr)
+            results.append(run_scenario(args, mode, wallets))
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == '__main__':
+    main()
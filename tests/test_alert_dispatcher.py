@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+import wallet_tracker_multichain as wt
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None, text=''):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.text = text
+
+    def json(self):
+        if self.body is None:
+            raise ValueError('not JSON')
+        return self.body
+
+
+class FakeSession:
+    """Replays canned responses and records what was posted"""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posts = []
+
+    def post(self, url, data=None, timeout=None):
+        self.posts.append(data)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(wt.time, 'sleep', delays.append)
+    return delays
+
+
+def dispatcher(*responses, **kwargs):
+    kwargs.setdefault('rate_limit', 1000)
+    alerts = wt.AlertDispatcher(**kwargs)
+    alerts.session = FakeSession(*responses)
+    return alerts
+
+
+def test_token_bucket_allows_bursts_up_to_capacity():
+    bucket = wt.TokenBucket(rate=20, capacity=2)
+    started = time.monotonic()
+    bucket.acquire()
+    bucket.acquire()
+    assert time.monotonic() - started < 0.04
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+@pytest.mark.parametrize('response, delay', [
+    (FakeResponse(429, {'ok': False, 'parameters': {'retry_after': 7}}), 7.0),
+    (FakeResponse(429, None, {'Retry-After': '3'}, text='<html>Too Many Requests</html>'), 3.0),
+    (FakeResponse(429, None, text='Too Many Requests'), 1.0),
+    (FakeResponse(429, ['unexpected']), 1.0),
+])
+def test_deliver_waits_as_told_after_429(sleeps, response, delay):
+    alerts = dispatcher(response, FakeResponse(200, {'ok': True}), max_retries=2)
+    assert alerts.deliver('chat', 'hello')
+    assert sleeps == [delay]
+    assert alerts.sent == 1
+
+
+def test_deliver_backs_off_exponentially_on_server_errors(sleeps):
+    alerts = dispatcher(*[FakeResponse(502)] * 4, max_retries=3)
+    assert not alerts.deliver('chat', 'hello')
+    assert sleeps == [1, 2, 4]
+
+
+def test_deliver_gives_up_on_client_errors(sleeps):
+    alerts = dispatcher(FakeResponse(400, text='Bad Request: chat not found'), max_retries=3)
+    assert not alerts.deliver('chat', 'hello')
+    assert sleeps == []
+
+
+def test_burst_to_one_chat_is_coalesced_into_a_digest():
+    alerts = wt.AlertDispatcher(coalesce_ms=0)
+    alerts.threads = [None]  # keep submit from starting delivery workers
+    for n in range(3):
+        alerts.submit(f'alert {n}', 'chat')
+    alerts.submit('other', 'elsewhere')
+    chat_id, queued = alerts.next_batch()
+    assert (chat_id, [message for message, _ in queued]) == ('chat', ['alert 0', 'alert 1', 'alert 2'])
+    digest, = alerts.build_digests([message for message, _ in queued])
+    assert digest.startswith('📦 <b>3 alerts</b>')
+    assert digest.index('alert 0') < digest.index('alert 1') < digest.index('alert 2')
+
+
+def test_chat_waits_for_the_batch_in_flight():
+    alerts = wt.AlertDispatcher(coalesce_ms=0)
+    alerts.threads = [None]
+    alerts.submit('first', 'chat')
+    assert alerts.next_batch()[0] == 'chat'
+    alerts.submit('second', 'chat')
+    alerts.submit('other', 'elsewhere')
+    assert alerts.next_batch()[0] == 'elsewhere'  # not blocked by the busy chat
+
+    taken = []
+    worker = threading.Thread(target=lambda: taken.append(alerts.next_batch()))
+    worker.start()
+    worker.join(0.2)
+    assert taken == []
+    alerts.finished('chat')
+    worker.join(2)
+    assert [message for message, _ in taken[0][1]] == ['second']
@@ -0,0 +1,133 @@
+import pytest
+
+import wallet_tracker_multichain as wt
+
+WALLET = '0x' + '1' * 40
+OTHER = '0x' + '2' * 40
+USDC = '0x' + 'a' * 40
+
+
+def engine(tmp_path, rules, default_action='mute'):
+    rules_engine = wt.AlertRuleEngine(str(tmp_path / 'rules.json'), default_action=default_action, reload_interval=0)
+    rules_engine.save(rules)
+    return rules_engine
+
+
+def transfer(value, address=WALLET, chain='ethereum', label='hot', direction='in', counterparty=OTHER):
+    return {'address': address, 'chain': chain, 'wallet_label': label, 'direction': direction,
+            'counterparty': counterparty, 'value': str(value), 'tx_hash': '0xabc', 'block_number': 1,
+            'explorer_url': 'https://example.org'}
+
+
+def token_transfer(value, symbol='USDC', token_address=USDC):
+    return dict(transfer(value), token=symbol, token_address=token_address)
+
+
+def activity(address=WALLET, chain='ethereum', label='hot'):
+    return {'address': address, 'chain': chain, 'wallet_label': label, 'tx_count': 5}
+
+
+@pytest.mark.parametrize('spec, message', [
+    ({'name': 'x', 'colour': 'red'}, 'unknown field'),
+    ({'chains': ['nowhere']}, 'unknown chain'),
+    ({'wallets': ['0x123']}, 'invalid address'),
+    ({'action': 'page'}, "'action'"),
+    ({'labels': 5}, "'labels'"),
+])
+def test_compile_rejects_invalid_rules(spec, message):
+    with pytest.raises(ValueError, match=message):
+        wt.AlertRuleEngine.compile([spec])
+
+
+def test_compile_indexes_by_scope_and_token():
+    index = wt.AlertRuleEngine.compile([
+        {'wallets': [WALLET], 'tokens': ['usdc', '0x' + 'A' * 40]},
+        {'labels': ['hot'], 'min_value': 5},
+        {'chains': ['ethereum', 'polygon'], 'tokens': ['Native']},
+        {},
+    ])
+    assert set(index) == {('address', WALLET), ('label', 'hot'), ('chain', 'ethereum'), ('chain', 'polygon'),
+                          ('any', '')}
+    assert set(index[('address', WALLET)]) == {'USDC', USDC}
+    assert set(index[('chain', 'ethereum')]) == {wt.NATIVE_ASSET}
+    assert index[('label', 'hot')]['*'][0] == [5.0]
+
+
+def test_route_picks_rules_by_scope_token_and_min_value(tmp_path):
+    rules = engine(tmp_path, [
+        {'wallets': [WALLET], 'min_value': 10, 'chat_id': 'treasury'},
+        {'labels': ['hot'], 'tokens': ['USDC'], 'chat_id': 'stables'},
+        {'chains': ['polygon'], 'chat_id': 'polygon'},
+    ])
+    assert rules.route(transfer(20)) == ['treasury']
+    assert rules.route(transfer(5)) == []
+    assert rules.route(token_transfer(20)) == ['treasury', 'stables']
+    assert rules.route(token_transfer(1, symbol='USDT', token_address=OTHER)) == []
+    assert rules.route(transfer(1, address=OTHER, chain='polygon', label='cold')) == ['polygon']
+
+
+def test_route_applies_max_value_without_min_value(tmp_path):
+    rules = engine(tmp_path, [
+        {'max_value': 1, 'chat_id': 'small'},
+        {'max_value': 100, 'chat_id': 'medium'},
+        {'min_value': 50, 'max_value': 200, 'chat_id': 'band'},
+    ])
+    assert rules.route(transfer(0.5)) == ['small', 'medium']
+    assert rules.route(transfer(75)) == ['band', 'medium']
+    assert rules.route(transfer(150)) == ['band']
+    assert rules.route(transfer(500)) == []
+    assert rules.route(activity()) == []  # nonce changes carry no amount
+
+
+def test_route_filters_direction_kind_and_counterparty(tmp_path):
+    rules = engine(tmp_path, [
+        {'direction': 'out', 'chat_id': 'out'},
+        {'kinds': ['activity'], 'chat_id': 'activity'},
+        {'counterparty_allow': [OTHER], 'chat_id': 'allowed'},
+        {'counterparty_deny': [OTHER], 'chat_id': 'denied'},
+    ])
+    assert rules.route(transfer(1)) == ['allowed']
+    assert rules.route(transfer(1, direction='out', counterparty=WALLET)) == ['out', 'denied']
+    assert rules.route(activity()) == ['activity', 'denied']
+
+
+def test_mute_wins_and_default_action_applies(tmp_path):
+    rules = engine(tmp_path, [
+        {'labels': ['hot'], 'max_value': 0.05, 'action': 'mute'},
+        {'labels': ['hot'], 'chat_id': 'hot'},
+    ], default_action='alert')
+    assert rules.route(transfer(0.01)) == []
+    assert rules.route(transfer(1)) == ['hot']
+    assert rules.route(transfer(1, label='cold')) == [wt.TELEGRAM_CHAT_ID]
+
+
+def test_cooldowns_are_kept_per_rule_even_with_the_same_name(tmp_path):
+    rules = engine(tmp_path, [
+        {'name': 'dup', 'wallets': [WALLET], 'cooldown': 300, 'chat_id': 'a'},
+        {'name': 'dup', 'labels': ['hot'], 'cooldown': 300, 'chat_id': 'b'},
+    ])
+    assert rules.route(transfer(1)) == ['a', 'b']
+    assert rules.route(transfer(1)) == []
+    assert rules.route(transfer(1, address=OTHER)) == ['b']
+    assert rules.route(transfer(1, address=OTHER, label='cold')) == []
+
+
+def test_retraction_only_alerts_chats_that_were_alerted(tmp_path, monkeypatch):
+    tracker = wt.MultiChainWalletTracker()
+    tracker.alert_rules = engine(tmp_path, [
+        {'wallets': [WALLET], 'cooldown': 300, 'chat_id': 'a'},
+        {'labels': ['hot'], 'min_value': 10, 'chat_id': 'b'},
+    ])
+    sent = []
+    monkeypatch.setattr(tracker, 'send_telegram_alert', lambda message, detected_at=None, chat_id=None: sent.append(chat_id))
+    monkeypatch.setattr(tracker, 'add_recent_transaction', lambda record: None)
+
+    first, second = transfer(20), transfer(1)
+    tracker.alert_on(first, 'first')
+    tracker.alert_on(second, 'second')  # rule a is cooling down, rule b needs 10
+    assert (first['alerted_chats'], second['alerted_chats']) == (['a', 'b'], [])
+
+    sent.clear()
+    tracker.retract_transfer(second)
+    tracker.retract_transfer(first)
+    assert sent == ['a', 'b']
@@ -0,0 +1,128 @@
+from array import array
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+import wallet_tracker_multichain as wt
+
+ADDRESS = '0x' + '1' * 40
+G = wt.GWEI
+ETH = 10 ** 18
+
+
+@pytest.fixture(params=['numpy', 'array'])
+def columns(request, monkeypatch):
+    """Build timestamp/gwei columns the way BalanceHistory.columns returns them, with and without numpy"""
+    if request.param == 'numpy':
+        np = pytest.importorskip('numpy')
+        return lambda ts, gwei: (np.array(ts, dtype='<f8'), np.array(gwei, dtype='<i8'))
+    monkeypatch.setattr(wt, 'np', None)
+    return lambda ts, gwei: (array('d', ts), array('q', gwei))
+
+
+def test_downsample_min_max_last_per_bucket(columns):
+    ts, gwei = columns([0, 1, 2, 5, 6, 9], [3 * G, G, 2 * G, 5 * G, 4 * G, 7 * G])
+    assert wt.downsample(ts, gwei, 0, 10, 2) == [
+        {'t': 0, 'min': 1.0, 'max': 3.0, 'last': 2.0},
+        {'t': 5, 'min': 4.0, 'max': 7.0, 'last': 7.0},
+    ]
+
+
+def test_downsample_skips_empty_buckets_and_clips_range(columns):
+    ts, gwei = columns([0, 1, 8, 20], [G, 2 * G, 3 * G, 4 * G])
+    points = wt.downsample(ts, gwei, 1, 10, 3)
+    assert [point['t'] for point in points] == [1, 7]
+    assert [point['last'] for point in points] == [2.0, 3.0]
+
+
+def test_downsample_puts_end_sample_in_last_bucket(columns):
+    ts, gwei = columns([0, 10], [G, 2 * G])
+    points = wt.downsample(ts, gwei, 0, 10, 2)
+    assert points[-1] == {'t': 5, 'min': 2.0, 'max': 2.0, 'last': 2.0}
+
+
+def test_downsample_empty_range(columns):
+    ts, gwei = columns([0, 1], [G, 2 * G])
+    assert wt.downsample(ts, gwei, 5, 10, 4) == []
+
+
+def wallet():
+    return wt.WalletInfo(address=ADDRESS, chain='ethereum', label='a', last_checked=datetime.now())
+
+
+def test_history_records_changes_and_heartbeats(tmp_path):
+    history = wt.BalanceHistory(str(tmp_path), min_interval=100)
+    history.record(wallet(), ETH, now=0)
+    history.record(wallet(), ETH + 1, now=50)  # the same in gwei and recent, skipped
+    history.record(wallet(), 2 * ETH, now=60)
+    history.record(wallet(), 2 * ETH, now=161)
+    assert history.flush() == 3
+    ts, gwei = history.columns('ethereum', ADDRESS)
+    assert list(ts) == [0, 60, 161]
+    assert list(gwei) == [G, 2 * G, 2 * G]
+
+
+def test_history_drops_samples_older_than_the_file(tmp_path):
+    # Two processes writing the same wallet, e.g. after a shard hand-off
+    old_owner = wt.BalanceHistory(str(tmp_path))
+    new_owner = wt.BalanceHistory(str(tmp_path))
+    new_owner.record(wallet(), 5 * G, now=200)
+    new_owner.flush()
+    old_owner.record(wallet(), 4 * G, now=150)
+    old_owner.record(wallet(), 6 * G, now=250)
+    assert old_owner.flush() == 1
+    assert list(new_owner.columns('ethereum', ADDRESS)[0]) == [200, 250]
+
+
+def test_history_realigns_half_written_rows(tmp_path):
+    history = wt.BalanceHistory(str(tmp_path))
+    history.record(wallet(), ETH, now=10)
+    history.flush()
+    ts_path, _ = history.paths('ethereum', ADDRESS)
+    with open(ts_path, 'ab') as f:
+        f.write(array('d', [20]).tobytes())  # a timestamp whose balance never made it to disk
+    history.record(wallet(), 3 * ETH, now=30)
+    history.flush()
+    ts, gwei = history.columns('ethereum', ADDRESS)
+    assert list(ts) == [10, 30]
+    assert list(gwei) == [G, 3 * G]
+
+
+def test_series_covers_stored_range(tmp_path):
+    history = wt.BalanceHistory(str(tmp_path))
+    for t in range(10):
+        history.record(wallet(), t * 10 ** 18, now=1000 + t)
+    history.flush()
+    series = history.series('ethereum', ADDRESS, end=1009, points=3)
+    assert series['samples'] == 10
+    assert series['start'] == 1000
+    assert [point['last'] for point in series['points']] == [2.0, 5.0, 9.0]
+
+
+def test_history_keeps_large_balances_exact(tmp_path):
+    history = wt.BalanceHistory(str(tmp_path))
+    balance = 123_456_789 * ETH + 123_456_789_123  # well past 2**53 wei
+    history.record(wallet(), balance, now=0)
+    history.record(wallet(), balance + G, now=1)
+    history.flush()
+    assert list(history.columns('ethereum', ADDRESS)[1]) == [balance // G, balance // G + 1]
+
+
+def test_history_converts_float_wei_columns(tmp_path):
+    ts_path = tmp_path / f'ethereum_{ADDRESS}.ts'
+    ts_path.write_bytes(array('d', [10, 20]).tobytes())
+    (tmp_path / f'ethereum_{ADDRESS}.wei').write_bytes(array('d', [1.5 * ETH, 2e27]).tobytes())
+    history = wt.BalanceHistory(str(tmp_path))
+    assert list(history.columns('ethereum', ADDRESS)[1]) == [15 * 10 ** 8, 2 * 10 ** 18]
+    assert not (tmp_path / f'ethereum_{ADDRESS}.wei').exists()
+
+
+@pytest.mark.parametrize('query', ['start=nan', 'end=inf', 'start=-inf&end=10', 'start=10&end=10', 'start=20&end=10'])
+def test_history_rejects_bad_ranges(monkeypatch, query):
+    wallets = wt.WalletRegistry()
+    wallets.add(wallet())
+    monkeypatch.setattr(wt, 'tracked_wallets', wallets)
+    app = Flask(__name__)
+    app.register_blueprint(wt.bp)
+    assert app.test_client().get(f'/api/wallets/{ADDRESS}/history?{query}').status_code == 400
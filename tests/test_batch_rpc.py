@@ -0,0 +1,74 @@
+import pytest
+
+import wallet_tracker_multichain as wt
+
+
+class FakePool:
+    """Answers each JSON-RPC batch with a canned reply built from the payload"""
+    chain = 'ethereum'
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.payloads = []
+
+    def post(self, payload, timeout=None):
+        self.payloads.append(payload)
+        return self.reply(payload)
+
+
+def echo_reversed(payload):
+    """Results in reverse order, as some providers return them"""
+    return [{'jsonrpc': '2.0', 'id': call['id'], 'result': f"{call['method']}:{call['params'][0]}"}
+            for call in reversed(payload)]
+
+
+def test_batch_maps_results_back_by_id():
+    client = wt.BatchRpcClient(FakePool(echo_reversed), batch_size=10)
+    calls = [('eth_getBalance', [f'0x{i}']) for i in range(4)]
+    assert client.batch(calls) == [f'eth_getBalance:0x{i}' for i in range(4)]
+
+
+def test_batch_returns_none_for_failed_and_missing_calls():
+    def reply(payload):
+        return [
+            {'jsonrpc': '2.0', 'id': 0, 'result': '0x1'},
+            {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': 'header not found'}},
+            # id 2 is dropped by the endpoint
+            {'jsonrpc': '2.0', 'id': 3, 'result': None},
+        ]
+    client = wt.BatchRpcClient(FakePool(reply))
+    assert client.batch([('eth_blockNumber', [])] * 4) == ['0x1', None, None, None]
+
+
+def test_batch_splits_into_chunks_with_fresh_ids():
+    pool = FakePool(echo_reversed)
+    client = wt.BatchRpcClient(pool, batch_size=2)
+    calls = [('eth_getTransactionCount', [f'0x{i}']) for i in range(5)]
+    assert client.batch(calls) == [f'eth_getTransactionCount:0x{i}' for i in range(5)]
+    assert [len(payload) for payload in pool.payloads] == [2, 2, 1]
+    assert [call['id'] for call in pool.payloads[-1]] == [0]
+
+
+def test_call_raises_on_error_reply():
+    client = wt.BatchRpcClient(FakePool(lambda payload: {'jsonrpc': '2.0', 'id': 0, 'error': {'message': 'nope'}}))
+    with pytest.raises(wt.RpcError, match='nope'):
+        client.call('eth_blockNumber', [])
+
+
+def test_batch_propagates_transport_failures():
+    def reply(payload):
+        raise wt.RpcError('No healthy RPC endpoint for ethereum')
+    client = wt.BatchRpcClient(FakePool(reply))
+    with pytest.raises(wt.RpcError):
+        client.batch([('eth_blockNumber', [])])
+
+
+def test_batches_are_timed_once_not_per_method(monkeypatch):
+    monkeypatch.setattr(wt, 'rpc_latency', wt.Histogram('latency', '', ('chain', 'method')))
+    monkeypatch.setattr(wt, 'rpc_calls', wt.Counter('calls', '', ('chain', 'method')))
+    client = wt.BatchRpcClient(FakePool(echo_reversed))
+    client.batch([('eth_getBalance', ['0x1']), ('eth_getBalance', ['0x2']), ('eth_call', ['0x3'])])
+    client.batch([('eth_getBalance', ['0x4'])])
+    assert {labels: sum(counts[:-1]) for labels, counts in wt.rpc_latency.values.items()} == {
+        ('ethereum', 'batch'): 1, ('ethereum', 'eth_getBalance'): 1}
+    assert wt.rpc_calls.values == {('ethereum', 'eth_getBalance'): 3, ('ethereum', 'eth_call'): 1}
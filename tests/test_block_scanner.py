@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+import wallet_tracker_multichain as wt
+
+
+class FakeStore:
+    """Keeps chain cursors in memory and counts flushes"""
+    def __init__(self, cursors=None):
+        self.cursors = dict(cursors or {})
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+    def load_chain_cursors(self):
+        return dict(self.cursors)
+
+    def save_chain_cursor(self, chain, block_number, block_hash):
+        self.cursors[chain] = (block_number, block_hash)
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    def call(self, method, params):
+        self.calls.append(method)
+        return hex(100)
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    """Two joined workers, this one second by id, sharing a store"""
+    coordinator = wt.ShardCoordinator(None, worker_id='b')
+    coordinator.joined = True
+    coordinator.set_members(['a', 'b'])
+    monkeypatch.setattr(wt, 'shard', coordinator)
+    monkeypatch.setattr(wt, 'store', FakeStore({'ethereum': (90, '0x5a')}))
+    monkeypatch.setattr(wt, 'tracked_wallets', wt.WalletRegistry())
+    return coordinator
+
+
+def scanner():
+    client = FakeClient()
+    return wt.BlockScanner(SimpleNamespace(rpc_clients={'ethereum': client}), track_tokens=False), client
+
+
+def test_only_the_first_live_worker_leads(sharded):
+    assert not sharded.is_leader()
+    sharded.set_members(['b', 'c'])
+    assert sharded.is_leader()
+    sharded.joined = False
+    assert not sharded.is_leader()
+
+
+def test_followers_do_not_scan(sharded):
+    block_scanner, client = scanner()
+    assert block_scanner.run_once() == wt.SHARD_HEARTBEAT_INTERVAL
+    assert client.calls == []
+    assert wt.store.flushes == 0
+
+
+def test_new_leader_resumes_from_the_stored_cursors(sharded):
+    block_scanner, _ = scanner()
+    block_scanner.resume({'ethereum': (50, '0x01')})  # stale, loaded at startup
+    block_scanner.run_once()
+    sharded.set_members(['b'])  # worker a left
+    assert block_scanner.check_leadership()
+    assert wt.store.flushes == 1
+    assert block_scanner.cursors == {'ethereum': 90}
+    assert [block.hash for block in block_scanner.windows['ethereum']] == ['0x5a']
+
+
+def test_former_leader_drops_its_scan_state(sharded):
+    sharded.set_members(['b'])
+    block_scanner, _ = scanner()
+    assert block_scanner.check_leadership()
+    block_scanner.next_scan['ethereum'] = 1.0
+    sharded.set_members(['a', 'b'])
+    assert not block_scanner.check_leadership()
+    assert (block_scanner.cursors, block_scanner.windows, block_scanner.next_scan) == ({}, {}, {})
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+from web3 import Web3
+
+import wallet_tracker_multichain as wt
+
+TOKEN = '0x' + 'c' * 40
+ALICE = '0x' + '1' * 40
+BOB = '0x' + '2' * 40
+CAROL = '0x' + '3' * 40
+
+
+def reference_bloom(*items):
+    """logsBloom as the yellow paper builds it: 3 bits per item in a big-endian 256-byte array"""
+    bloom = bytearray(256)
+    for item in items:
+        digest = Web3.keccak(item)
+        for i in (0, 2, 4):
+            bit = ((digest[i] << 8) | digest[i + 1]) & 2047
+            bloom[255 - bit // 8] |= 1 << (bit % 8)
+    return '0x' + bloom.hex()
+
+
+def transfer_log(sender, recipient, block, log_index=0, topics=None):
+    return {
+        'address': TOKEN,
+        'topics': topics or [wt.TRANSFER_TOPIC, wt.address_to_topic(sender), wt.address_to_topic(recipient)],
+        'data': hex(10 ** 18),
+        'blockNumber': hex(block),
+        'transactionHash': '0x' + f'{block:064x}',
+        'logIndex': hex(log_index),
+    }
+
+
+def block_with(number, *logs):
+    items = []
+    for log in logs:
+        items.append(bytes.fromhex(log['address'][2:]))
+        items.extend(bytes.fromhex(topic[2:]) for topic in log['topics'])
+    return {'number': hex(number), 'logsBloom': reference_bloom(*items)}
+
+
+def test_bloom_mask_matches_reference_bits():
+    topic = bytes.fromhex(wt.TRANSFER_TOPIC[2:])
+    assert wt.bloom_mask(topic) == int(reference_bloom(topic), 16)
+    assert bin(wt.TRANSFER_BLOOM_MASK).count('1') <= 3
+
+
+def test_candidates_come_from_the_block_bloom():
+    scanner = wt.TokenTransferScanner(tracker=None)
+    block = block_with(1, transfer_log(ALICE, BOB, 1))
+    assert scanner.candidate_addresses(block, [ALICE, BOB, CAROL]) == [ALICE, BOB]
+    assert scanner.candidate_addresses({'number': '0x2', 'logsBloom': '0x' + '00' * 256}, [ALICE]) == []
+    # A block whose bloom holds the wallet but no Transfer topic is skipped too
+    assert scanner.candidate_addresses({'number': '0x3', 'logsBloom': reference_bloom(
+        bytes.fromhex(wt.address_to_topic(ALICE)[2:]))}, [ALICE]) == []
+
+
+class FakeClient:
+    def __init__(self, logs):
+        self.logs = logs
+        self.calls = []
+
+    def batch(self, calls):
+        self.calls.extend(calls)
+        return [self.logs for _ in calls]
+
+
+def test_scan_fetches_logs_only_for_matching_block_ranges():
+    logs = [transfer_log(ALICE, CAROL, 10), transfer_log(CAROL, ALICE, 11, 1),
+            transfer_log(CAROL, BOB, 11, 2, topics=[wt.TRANSFER_TOPIC, wt.address_to_topic(CAROL),
+                                                      wt.address_to_topic(BOB), '0x' + '0' * 64])]
+    client = FakeClient(logs)
+    reader = SimpleNamespace(load_token_metadata=lambda chain, tokens: {
+        token: {'symbol': 'TKN', 'decimals': 18} for token in tokens})
+    scanner = wt.TokenTransferScanner(SimpleNamespace(rpc_clients={'ethereum': client}, portfolio_reader=reader))
+    wallets = {ALICE: 'alice', BOB: 'bob'}
+    blocks = [block_with(10, logs[0]), block_with(11, logs[1]), block_with(12), block_with(13, logs[0])]
+
+    matches = scanner.scan_blocks('ethereum', blocks, wallets)
+    ranges = {(call[1][0]['fromBlock'], call[1][0]['toBlock']) for call in client.calls}
+    assert ranges == {('0xa', '0xb'), ('0xd', '0xd')}
+    assert len(client.calls) == 4  # sender and recipient queries per range
+    # Logs are deduplicated across queries and the ERC-721 style log is ignored
+    assert [(wallet, direction) for wallet, _, direction, _ in matches] == [('alice', 'out'), ('alice', 'in')]
@@ -0,0 +1,81 @@
+import pytest
+
+import wallet_tracker_multichain as wt
+
+TOKEN = '0x' + 'c' * 40
+OWNERS = ['0x' + f'{n:040x}' for n in range(1, 6)]
+
+
+def unpack(call):
+    """The (target, allowFailure, calldata) entries of an aggregate3 eth_call"""
+    method, (request, block) = call
+    assert method == 'eth_call'
+    data = bytes.fromhex(request['data'][2:])
+    assert data[:4] == wt.AGGREGATE3_SELECTOR
+    return wt.abi_decode(['(address,bool,bytes)[]'], data[4:])[0]
+
+
+def aggregate3(entries, answer):
+    """Encode the aggregate3 reply Multicall3 would give, with answer(target, calldata) as (success, data)"""
+    results = [answer(target.lower(), calldata) for target, _, calldata in entries]
+    return '0x' + wt.abi_encode(['(bool,bytes)[]'], [results]).hex()
+
+
+def balance_of(target, calldata):
+    """A uint256 balance derived from the owner, failing for owner 3"""
+    owner = int.from_bytes(calldata[-20:], 'big')
+    if owner == 3:
+        return False, b''
+    return True, (owner * 10 ** 18 + (1 if target == TOKEN else 0)).to_bytes(32, 'big')
+
+
+def test_multicall_calls_pack_each_chunk_with_failures_allowed():
+    subcalls = [(TOKEN, bytes([n]) * 36) for n in range(5)]
+    calls = wt.multicall_calls('ethereum', subcalls, chunk_size=2, block='0x10')
+    assert [call[1][0]['to'] for call in calls] == [wt.CHAINS['ethereum']['multicall3']] * 3
+    assert {call[1][1] for call in calls} == {'0x10'}
+    entries = [entry for call in calls for entry in unpack(call)]
+    assert [(target.lower(), allow_failure, calldata) for target, allow_failure, calldata in entries] == [
+        (TOKEN, True, calldata) for _, calldata in subcalls]
+
+
+def test_decode_round_trips_chunks_and_sub_call_failures():
+    subcalls = [(TOKEN, n.to_bytes(32, 'big')) for n in range(5)]
+    calls = wt.multicall_calls('ethereum', subcalls, chunk_size=2)
+    results = [aggregate3(unpack(call), lambda target, calldata: (calldata[-1] != 2, calldata * 2))
+               for call in calls]
+    assert wt.decode_multicall_results(results, 5, chunk_size=2) == [
+        n.to_bytes(32, 'big') * 2 if n != 2 else None for n in range(5)]
+
+
+@pytest.mark.parametrize('failed', [None, '0x', '0xdeadbeef'])
+def test_failed_eth_call_voids_its_whole_chunk(failed):
+    calls = wt.multicall_calls('ethereum', [(TOKEN, bytes([n])) for n in range(5)], chunk_size=2)
+    results = [aggregate3(unpack(call), lambda target, calldata: (True, calldata)) for call in calls]
+    results[1] = failed
+    assert wt.decode_multicall_results(results, 5, chunk_size=2) == [b'\x00', b'\x01', None, None, b'\x04']
+
+
+def test_reply_with_the_wrong_entry_count_is_rejected():
+    entries = unpack(wt.multicall_calls('ethereum', [(TOKEN, b'\x01'), (TOKEN, b'\x02')])[0])
+    assert wt.decode_multicall_results([aggregate3(entries[:1], lambda *_: (True, b'\x01'))], 2) == [None, None]
+
+
+def test_balances_round_trip_through_aggregate3():
+    queries = [(owner, None) for owner in OWNERS] + [(OWNERS[0], TOKEN)]
+    calls = wt.balance_calls('ethereum', queries)
+    entries = [entry for call in calls for entry in unpack(call)]
+    multicall = wt.CHAINS['ethereum']['multicall3'].lower()
+    assert [target.lower() for target, _, _ in entries] == [multicall] * 5 + [TOKEN]
+    assert [calldata[:4] for _, _, calldata in entries] == [wt.GET_ETH_BALANCE_SELECTOR] * 5 + [wt.BALANCE_OF_SELECTOR]
+
+    results = [aggregate3(unpack(call), balance_of) for call in calls]
+    assert wt.decode_balances('ethereum', results, len(queries)) == [
+        10 ** 18, 2 * 10 ** 18, None, 4 * 10 ** 18, 5 * 10 ** 18, 10 ** 18 + 1]
+
+
+def test_balances_without_multicall_use_plain_calls(monkeypatch):
+    monkeypatch.setitem(wt.CHAINS['ethereum'], 'multicall3', None)
+    calls = wt.balance_calls('ethereum', [(OWNERS[0], None), (OWNERS[1], TOKEN)])
+    assert [method for method, _ in calls] == ['eth_getBalance', 'eth_call']
+    assert wt.decode_balances('ethereum', ['0x10', None], 2) == [16, None]
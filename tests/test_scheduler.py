@@ -0,0 +1,33 @@
+from datetime import datetime
+
+import wallet_tracker_multichain as wt
+
+
+def wallet(min_interval=None, max_interval=None):
+    return wt.WalletInfo(address='0x' + '1' * 40, chain='ethereum', label='a', last_checked=datetime.now(),
+                         min_interval=min_interval, max_interval=max_interval)
+
+
+def scheduler():
+    return wt.AdaptiveScheduler(tracker=None, max_interval=100, backoff=2, speedup=4)
+
+
+def test_bounds_honour_overrides():
+    chain_default = wt.CHAINS['ethereum']['sweep_interval']
+    assert scheduler().bounds(wallet()) == (chain_default, max(chain_default, 100))
+    assert scheduler().bounds(wallet(min_interval=5, max_interval=1)) == (1, 1)
+    assert scheduler().bounds(wallet(min_interval=5, max_interval=50)) == (5, 50)
+
+
+def test_reschedule_backs_off_speeds_up_and_clamps():
+    schedule = scheduler()
+    entry = wt.ScheduleEntry(wallet(min_interval=10, max_interval=60), 10, 0)
+    schedule.entries[('ethereum', entry.wallet.address)] = entry
+    intervals = []
+    for active in (False, False, False, None, True, True):
+        schedule.reschedule(entry, active, now=1000)
+        intervals.append(entry.interval)
+    assert intervals == [20, 40, 60, 60, 15, 10]
+    assert entry.due == 1010
+    assert schedule.pop_due(1010) == [entry]
+    assert schedule.pop_due(2000) == []  # earlier heap items were superseded
@@ -0,0 +1,93 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import wallet_tracker_multichain as wt
+
+USDC = '0x' + 'a' * 40
+UNKNOWN = '0x' + 'b' * 40
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def vectorized(request, monkeypatch):
+    """Run valuations through the numpy path and the pure Python fallback"""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(wt, 'np', None)
+
+
+def write_prices(path, prices, mtime=None):
+    with open(path, 'w') as f:
+        json.dump(prices, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_price_sources_must_implement_fetch():
+    class Incomplete(wt.PriceSource):
+        pass
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_static_source_reloads_when_file_changes(tmp_path):
+    path = str(tmp_path / 'prices.json')
+    write_prices(path, {'ethereum': {'native': 3000, '0x' + 'A' * 40: 1}}, mtime=1000)
+    source = wt.StaticPriceSource(path)
+    assert source.fetch([('ethereum', 'native'), ('ethereum', USDC), ('polygon', 'native')]) == {
+        ('ethereum', 'native'): 3000.0,
+        ('ethereum', USDC): 1.0,
+    }
+    write_prices(path, {'ethereum': {'native': 3500}}, mtime=2000)
+    assert source.fetch([('ethereum', 'native'), ('ethereum', USDC)]) == {('ethereum', 'native'): 3500.0}
+
+
+def wallet(n, chain, label):
+    return wt.WalletInfo(address='0x' + str(n) * 40, chain=chain, label=label, last_checked=datetime.now())
+
+
+class NoRpcReader(wt.PortfolioReader):
+    """Reader with metadata preloaded; any RPC attempt fails the test"""
+    def __init__(self, token_metadata):
+        super().__init__({})
+        self.token_metadata = token_metadata
+
+    def call_many(self, chain, subcalls):
+        raise AssertionError('totals must not make RPC calls')
+
+
+def test_totals_values_cached_balances(tmp_path, vectorized):
+    path = str(tmp_path / 'prices.json')
+    write_prices(path, {'ethereum': {'native': 2000, USDC: 1, UNKNOWN: 5}, 'polygon': {'native': 0.5}})
+    cache = wt.WalletStateCache(ttl=3600, stale=3600)
+    whale, fund, missing = wallet(1, 'ethereum', 'whale'), wallet(2, 'polygon', 'fund'), wallet(3, 'ethereum', 'fund')
+    cache.put(whale, 2 * 10 ** 18, 1, {USDC: 150 * 10 ** 6, UNKNOWN: 10 ** 18})
+    cache.put(fund, 10 * 10 ** 18, 1)
+    reader = NoRpcReader({('ethereum', USDC): {'symbol': 'USDC', 'decimals': 6}})
+    valuation = wt.PortfolioValuation(cache, reader, wt.PriceCache(wt.StaticPriceSource(path)))
+
+    totals = valuation.totals([whale, fund, missing])
+    assert totals['total'] == pytest.approx(4155)
+    assert totals['by_chain']['ethereum'] == pytest.approx(4150)
+    assert totals['by_chain']['polygon'] == pytest.approx(5)
+    assert totals['by_label'] == pytest.approx({'whale': 4150, 'fund': 5})
+    assert totals['unresolved_tokens'] == [f'ethereum:{UNKNOWN}']
+    assert totals['unpriced'] == []
+    assert totals['uncached_wallets'] == 1
+
+
+def test_totals_reports_unpriced_assets(tmp_path, vectorized):
+    path = str(tmp_path / 'prices.json')
+    write_prices(path, {'ethereum': {'native': 2000}})
+    cache = wt.WalletStateCache(ttl=3600, stale=3600)
+    whale = wallet(1, 'ethereum', 'whale')
+    cache.put(whale, 10 ** 18, 1, {USDC: 10 ** 6})
+    reader = NoRpcReader({('ethereum', USDC): {'symbol': 'USDC', 'decimals': 6}})
+    valuation = wt.PortfolioValuation(cache, reader, wt.PriceCache(wt.StaticPriceSource(path)))
+
+    totals = valuation.totals([whale])
+    assert totals['total'] == pytest.approx(2000)
+    assert totals['unpriced'] == [f'ethereum:{USDC}']
+    assert totals['unresolved_tokens'] == []
@@ -0,0 +1,68 @@
+import io
+from datetime import datetime
+
+import pytest
+from web3 import Web3
+
+import wallet_tracker_multichain as wt
+
+CHECKSUMMED = '0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed'
+
+
+@pytest.fixture
+def checksums(monkeypatch):
+    """Fresh tracked wallets, and a log of every address checksummed"""
+    monkeypatch.setattr(wt, 'tracked_wallets', wt.WalletRegistry())
+    computed = []
+    original = Web3.to_checksum_address
+
+    def to_checksum_address(address):
+        computed.append(address)
+        return original(address)
+    monkeypatch.setattr(wt.Web3, 'to_checksum_address', staticmethod(to_checksum_address))
+    return computed
+
+
+def test_parse_wallet_rows_skips_header_and_flags_bad_json():
+    assert list(wt.parse_wallet_rows(io.StringIO('address,chain,label\n0x1,ethereum,a\n'), 'csv')) == [
+        (2, {'address': '0x1', 'chain': 'ethereum', 'label': 'a'})]
+    assert list(wt.parse_wallet_rows(io.StringIO('{"address": "0x1"}\n\nnot json\n[1]\n'), 'ndjson')) == [
+        (1, {'address': '0x1'}), (3, None), (4, None)]
+
+
+def test_validate_reports_errors_by_line(checksums):
+    wallets, errors = wt.validate_wallet_rows([
+        (1, None),
+        (2, {'address': CHECKSUMMED, 'chain': 'nowhere'}),
+        (3, {'address': '0x123', 'chain': 'ethereum'}),
+        (4, {'address': CHECKSUMMED.replace('a', 'A', 1), 'chain': 'ethereum'}),
+        (5, {'address': CHECKSUMMED, 'chain': 'Ethereum', 'label': ' treasury '}),
+    ])
+    assert errors == [
+        {'line': 1, 'error': 'Invalid JSON object'},
+        {'line': 2, 'error': 'Invalid chain'},
+        {'line': 3, 'error': 'Invalid wallet address format'},
+        {'line': 4, 'error': 'Invalid address checksum'},
+    ]
+    assert [(w.address, w.chain, w.label) for w in wallets] == [(CHECKSUMMED, 'ethereum', 'treasury')]
+
+
+def test_validate_checksums_each_new_address_once(checksums):
+    wallets, errors = wt.validate_wallet_rows([
+        (1, {'address': CHECKSUMMED.lower(), 'chain': 'ethereum'}),
+        (2, {'address': CHECKSUMMED.upper().replace('0X', '0x'), 'chain': 'ethereum'}),
+        (3, {'address': CHECKSUMMED, 'chain': 'ethereum'}),
+    ])
+    assert errors == []
+    assert [w.address for w in wallets] == [CHECKSUMMED] * 3
+    assert len(checksums) == 1
+
+
+def test_validate_skips_checksums_of_tracked_wallets(checksums):
+    wt.tracked_wallets.add(wt.WalletInfo(address=CHECKSUMMED, chain='ethereum', label='a', last_checked=datetime.now()))
+    wallets, errors = wt.validate_wallet_rows([
+        (1, {'address': CHECKSUMMED.lower(), 'chain': 'ethereum'}),
+        (2, {'address': CHECKSUMMED, 'chain': 'ethereum'}),
+    ])
+    assert (len(wallets), errors, checksums) == (2, [], [])
+    assert wt.tracked_wallets.bulk_import(wallets) == []
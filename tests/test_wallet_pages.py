@@ -0,0 +1,104 @@
+import re
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+import wallet_tracker_multichain as wt
+
+
+def wallet(n, chain='ethereum', label=None):
+    return wt.WalletInfo(address='0x' + f'{n:040x}', chain=chain, label=label or f'wallet {n}',
+                         last_checked=datetime.now())
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Ten wallets on each of two chains, installed as the tracked wallets"""
+    wallets = wt.WalletRegistry()
+    wallets.bulk_import([wallet(n, chain, f"{'hot' if n % 2 else 'cold'} {n}")
+                         for chain in ('ethereum', 'polygon') for n in range(1, 11)])
+    monkeypatch.setattr(wt, 'tracked_wallets', wallets)
+    return wallets
+
+
+def keys(wallets):
+    return [(w.chain, int(w.address, 16)) for w in wallets]
+
+
+def test_scan_walks_key_order_after_and_before_a_cursor(registry):
+    everything = list(registry.scan())
+    assert keys(everything) == sorted(keys(everything))
+    cursor = wt.WalletRegistry.key('ethereum', wallet(9).address)
+    assert keys(registry.scan(after=cursor)) == [('ethereum', 10)] + [('polygon', n) for n in range(1, 11)]
+    assert keys(registry.scan(before=cursor)) == [('ethereum', n) for n in range(8, 0, -1)]
+
+
+def test_scan_limits_to_a_chain_and_applies_matchers(registry):
+    cursor = wt.WalletRegistry.key('ethereum', wallet(10).address)
+    assert keys(registry.scan(after=cursor, chain='ethereum')) == []
+    assert keys(registry.scan(before=cursor, chain='polygon')) == []
+    match = wt.wallet_matcher(None, 'HOT')
+    assert keys(registry.scan(chain='polygon', match=match)) == [('polygon', n) for n in range(1, 11, 2)]
+    assert keys(registry.scan(match=wt.wallet_matcher('cold 4', None))) == [('ethereum', 4), ('polygon', 4)]
+
+
+def test_wallet_page_round_trips_cursors(registry):
+    first, more = wt.wallet_page(None, None, 'ethereum', None, 4)
+    assert (keys(first), more) == ([('ethereum', n) for n in range(1, 5)], True)
+    after = wt.parse_wallet_cursor(wt.wallet_cursor(first[-1]))
+    second, more = wt.wallet_page(after, None, 'ethereum', None, 4)
+    assert (keys(second), more) == ([('ethereum', n) for n in range(5, 9)], True)
+    last, more = wt.wallet_page(wt.parse_wallet_cursor(wt.wallet_cursor(second[-1])), None, 'ethereum', None, 4)
+    assert (keys(last), more) == ([('ethereum', 9), ('ethereum', 10)], False)
+    back, more = wt.wallet_page(None, wt.parse_wallet_cursor(wt.wallet_cursor(second[0])), 'ethereum', None, 4)
+    assert (keys(back), more) == (keys(first), False)
+
+
+def test_wallet_page_survives_removal_of_the_cursor_wallet(registry):
+    page, _ = wt.wallet_page(None, None, None, None, 3)
+    cursor = wt.parse_wallet_cursor(wt.wallet_cursor(page[-1]))
+    registry.remove(page[-1].chain, page[-1].address)
+    following, more = wt.wallet_page(cursor, None, None, None, 3)
+    assert keys(following) == [('ethereum', 4), ('ethereum', 5), ('ethereum', 6)]
+    previous, _ = wt.wallet_page(None, cursor, None, None, 3)
+    assert keys(previous) == [('ethereum', 1), ('ethereum', 2)]
+
+
+@pytest.mark.parametrize('cursor', ['ethereum', 'nowhere:0x' + '1' * 40, 'ethereum:0x123'])
+def test_parse_wallet_cursor_rejects_malformed_cursors(cursor):
+    with pytest.raises(ValueError):
+        wt.parse_wallet_cursor(cursor)
+
+
+def test_parse_fields_rejects_unknown_names():
+    assert wt.parse_fields('address, chain', wt.WALLET_FIELDS) == ['address', 'chain']
+    assert wt.parse_fields('', wt.WALLET_FIELDS) is None
+    with pytest.raises(ValueError, match='secret'):
+        wt.parse_fields('address,secret', wt.WALLET_FIELDS)
+
+
+def test_transactions_reject_unknown_fields():
+    app = Flask(__name__)
+    app.register_blueprint(wt.bp)
+    client = app.test_client()
+    response = client.get('/api/transactions?fields=id,nope')
+    assert response.status_code == 400
+    assert 'nope' in response.get_json()['error']
+    assert client.get('/api/transactions?fields=id,chain,value').status_code == 200
+
+
+def test_dashboard_pages_through_wallets(registry):
+    app = Flask(__name__, root_path=wt.os.path.dirname(wt.__file__))
+    app.register_blueprint(wt.bp)
+    html = app.test_client().get('/?chain=polygon&q=hot').get_data(as_text=True)
+    assert '<span id="walletCount">20</span> total, filtered below' in html
+    labels = re.findall(r'<h3 class="font-semibold text-lg">(.*?)</h3>', html)
+    assert labels == [f'hot {n}' for n in (1, 3, 5, 7, 9)]
+
+
+@pytest.mark.parametrize('query', ['since=abc', 'before=1.5', 'since=1&before=x', 'limit=ten'])
+def test_transactions_reject_malformed_arguments(query):
+    app = Flask(__name__)
+    app.register_blueprint(wt.bp)
+    assert app.test_client().get(f'/api/transactions?{query}').status_code == 400
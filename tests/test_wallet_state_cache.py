@@ -0,0 +1,79 @@
+import json
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+import wallet_tracker_multichain as wt
+
+ADDRESS = '0x' + '1' * 40
+
+
+class DownClient:
+    """RPC client whose endpoints are all failing"""
+    def call(self, method, params):
+        raise wt.RpcError('No healthy RPC endpoint for ethereum')
+
+    def batch(self, calls):
+        raise wt.RpcError('No healthy RPC endpoint for ethereum')
+
+
+def wallet():
+    return wt.WalletInfo(address=ADDRESS, chain='ethereum', label='a', last_checked=datetime.now())
+
+
+def test_misses_are_not_queued_without_a_refresher():
+    cache = wt.WalletStateCache()
+    assert cache.get(wallet()) is None
+    assert cache.revalidate_queue == {}
+    assert cache.revalidator is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_misses_are_queued_for_the_refresher():
+    cache = wt.WalletStateCache()
+    refreshed = []
+    cache.refresh = refreshed.extend
+    cache.revalidator = object()  # keep the background thread from starting
+    cache.get(wallet())
+    assert list(cache.revalidate_queue) == [('ethereum', ADDRESS)]
+
+
+def test_entries_go_stale_then_expire(monkeypatch):
+    cache = wt.WalletStateCache(ttl=10, stale=20)
+    now = [1000.0]
+    monkeypatch.setattr(wt.time, 'monotonic', lambda: now[0])
+    cache.put(wallet(), 5, 1)
+    assert cache.get(wallet())['balance_wei'] == 5
+    now[0] += 15
+    assert cache.get(wallet())['balance_wei'] == 5
+    now[0] += 20
+    assert cache.get(wallet()) is None
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'stale_hits': 1, 'misses': 1}
+
+
+@pytest.fixture
+def down_tracker(monkeypatch):
+    tracker = wt.MultiChainWalletTracker()
+    tracker.rpc_clients['ethereum'] = DownClient()
+    wallets = wt.WalletRegistry()
+    wallets.add(wallet())
+    monkeypatch.setattr(wt, 'tracker', tracker)
+    monkeypatch.setattr(wt, 'tracked_wallets', wallets)
+    return tracker
+
+
+def test_refresh_keeps_cached_state_when_rpc_fails(down_tracker):
+    down_tracker.state_cache.put(wallet(), 10 ** 18, 3)
+    down_tracker.refresh_wallet_states([wallet()])
+    assert down_tracker.state_cache.get(wallet())['tx_count'] == 3
+
+
+def test_fresh_listing_serves_cache_when_rpc_fails(down_tracker):
+    down_tracker.state_cache.put(wallet(), 10 ** 18, 3)
+    app = Flask(__name__)
+    app.register_blueprint(wt.bp)
+    response = app.test_client().get('/api/wallets?fresh=1&fields=address,tx_count,balance')
+    assert response.status_code == 200
+    assert json.loads(response.get_data(as_text=True)) == [
+        {'address': ADDRESS, 'tx_count': 3, 'balance': '1.000000'}]
@@ -0,0 +1,64 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import wallet_tracker_multichain as wt
+
+
+class FlakyConnection:
+    """Connection whose writes fail with the given error until it is cleared"""
+    def __init__(self, conn, error=None):
+        self.conn = conn
+        self.error = error
+
+    def executemany(self, sql, params):
+        if self.error is not None:
+            raise self.error
+        return self.conn.executemany(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+
+def wallet(n):
+    return wt.WalletInfo(address='0x' + f'{n:040x}', chain='ethereum', label=f'wallet {n}', last_checked=datetime.now())
+
+
+def test_flush_groups_writes_into_one_transaction(tmp_path):
+    store = wt.WalletStore(str(tmp_path / 'wallets.db'))
+    for n in range(3):
+        store.save_wallet(wallet(n))
+    store.save_chain_cursor('ethereum', 10, '0xabc')
+    assert store.flush() == 4
+    assert store.flush() == 0
+    assert len(store.load_wallets()) == 3
+    assert store.load_chain_cursors() == {'ethereum': (10, '0xabc')}
+
+
+def test_flush_keeps_writes_when_the_database_is_unavailable(tmp_path):
+    store = wt.WalletStore(str(tmp_path / 'wallets.db'))
+    store.conn = FlakyConnection(store.conn, sqlite3.OperationalError('database is locked'))
+    store.save_wallet(wallet(1))
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    store.save_wallet(wallet(2))
+    store.conn.error = None
+    assert store.flush() == 2
+    assert [w.label for w in store.load_wallets()] == ['wallet 1', 'wallet 2']
+
+
+def test_flush_drops_writes_that_can_never_succeed(tmp_path):
+    store = wt.WalletStore(str(tmp_path / 'wallets.db'))
+    store.conn = FlakyConnection(store.conn, sqlite3.IntegrityError('UNIQUE constraint failed'))
+    store.save_wallet(wallet(1))
+    with pytest.raises(sqlite3.IntegrityError):
+        store.flush()
+    store.conn.error = None
+    assert store.flush() == 0
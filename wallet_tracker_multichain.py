@@ -1,187 +1,3405 @@
+import io
 import os
+import re
+import csv
 import json
+import html
+import math
+import bisect
 import time
+import heapq
+import socket
+import hashlib
+import itertools
+import sys
+import fcntl
+import queue
+import atexit
+import sqlite3
+import asyncio
 import threading
+import importlib
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Blueprint, Flask, Response, render_template, request, jsonify, redirect, url_for
 from web3 import Web3
+from eth_abi import decode as abi_decode, encode as abi_encode
 import requests
+import aiohttp
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
 
+try:
+    import numpy as np
+except ImportError:  # balance history falls back to the array module
+    np = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-production')
-
 # Configuration
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '8031337051:AAHNNUgJ9wWUgwQdKEH4Preg3kS4HeV6ug4')
 TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID', '1114236546')
 ALCHEMY_API_KEY = os.environ.get('ALCHEMY_API_KEY', '')
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Alert dispatch
+ALERT_QUEUE_SIZE = int(os.environ.get('ALERT_QUEUE_SIZE', 1000))  # pending messages before new ones are dropped
+ALERT_WORKERS = int(os.environ.get('ALERT_WORKERS', 2))
+ALERT_RATE_LIMIT = float(os.environ.get('ALERT_RATE_LIMIT', 25))  # messages per second, Telegram allows 30
+ALERT_COALESCE_MS = int(os.environ.get('ALERT_COALESCE_MS', 1000))  # window for merging alerts to one chat
+ALERT_MAX_RETRIES = int(os.environ.get('ALERT_MAX_RETRIES', 5))
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Wallet state cache behind /api/wallets
+BALANCE_CACHE_TTL = float(os.environ.get('BALANCE_CACHE_TTL', 60))  # seconds an entry counts as fresh
+BALANCE_CACHE_STALE = float(os.environ.get('BALANCE_CACHE_STALE', 600))  # extra seconds stale entries are served
+BALANCE_CACHE_SIZE = int(os.environ.get('BALANCE_CACHE_SIZE', 100000))  # entries kept before LRU eviction
+
+# Monitoring configuration
+MONITOR_MODE = os.environ.get('MONITOR_MODE', 'batch')  # 'batch', 'async', 'blocks' or 'legacy'
+RPC_BATCH_SIZE = int(os.environ.get('RPC_BATCH_SIZE', 200))  # JSON-RPC calls per HTTP POST
+RPC_TIMEOUT = float(os.environ.get('RPC_TIMEOUT', 10))
+RPC_MAX_IN_FLIGHT = int(os.environ.get('RPC_MAX_IN_FLIGHT', 4))  # concurrent requests per chain (async mode)
+RPC_POOL_SIZE = int(os.environ.get('RPC_POOL_SIZE', 10))  # keep-alive connections per endpoint
+RPC_PROBE_INTERVAL = float(os.environ.get('RPC_PROBE_INTERVAL', 30))  # seconds between endpoint health probes
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 3))  # consecutive failures before an endpoint is skipped
+CIRCUIT_COOLDOWN = float(os.environ.get('CIRCUIT_COOLDOWN', 30))  # seconds a tripped endpoint is skipped
+SCHEDULER_MAX_INTERVAL = float(os.environ.get('SCHEDULER_MAX_INTERVAL', 600))  # slowest poll for a dormant wallet in 'adaptive' mode
+SCHEDULER_BACKOFF = float(os.environ.get('SCHEDULER_BACKOFF', 1.5))  # interval multiplier after a quiet poll
+SCHEDULER_SPEEDUP = float(os.environ.get('SCHEDULER_SPEEDUP', 4))  # interval divisor after a poll that found activity
+REORG_WINDOW = int(os.environ.get('REORG_WINDOW', 64))  # recent block hashes kept per chain to detect reorgs (blocks mode)
+BLOCK_SCAN_MAX_BLOCKS = int(os.environ.get('BLOCK_SCAN_MAX_BLOCKS', 20))  # blocks fetched per chain per scan (blocks mode)
+TRACK_TOKEN_TRANSFERS = os.environ.get('TRACK_TOKEN_TRANSFERS', 'true').lower() == 'true'  # ERC-20 logs (blocks mode)
+LOG_TOPIC_CHUNK = int(os.environ.get('LOG_TOPIC_CHUNK', 500))  # addresses per eth_getLogs topic filter
+MULTICALL3_ADDRESS = os.environ.get('MULTICALL3_ADDRESS', '0xcA11bde05977b3631167028862bE2a173976CA11')  # same on every supported chain
+MULTICALL_CHUNK = int(os.environ.get('MULTICALL_CHUNK', 500))  # balance reads packed into one aggregate3 eth_call
+
+# Persistence
+DATABASE_PATH = os.environ.get('DATABASE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wallet_tracker.db'))
+STORE_FLUSH_INTERVAL_MS = int(os.environ.get('STORE_FLUSH_INTERVAL_MS', 500))  # write-behind batch window
+STORE_SYNC_INTERVAL = float(os.environ.get('STORE_SYNC_INTERVAL', 5))  # seconds between reloads when web and monitor run apart
+MONITOR_LOCK_PATH = os.environ.get('MONITOR_LOCK_PATH', DATABASE_PATH + '.monitor.lock')
+MONITOR_SHARDING = os.environ.get('MONITOR_SHARDING', 'false').lower() == 'true'  # split wallets across several monitor processes
+SHARD_HEARTBEAT_INTERVAL = float(os.environ.get('SHARD_HEARTBEAT_INTERVAL', 5))  # seconds between worker heartbeats
+SHARD_WORKER_TIMEOUT = float(os.environ.get('SHARD_WORKER_TIMEOUT', 15))  # a worker silent this long loses its wallets
+SHARD_VNODES = int(os.environ.get('SHARD_VNODES', 64))  # hash ring points per worker; more gives a more even split
+RUN_MONITOR_IN_WEB = os.environ.get('RUN_MONITOR_IN_WEB', 'false').lower() == 'true'  # start the monitor from create_app()
+
+# Alert rules
+ALERT_RULES_FILE = os.environ.get('ALERT_RULES_FILE', DATABASE_PATH + '.rules.json')  # JSON list of rules, see README
+ALERT_RULES_DEFAULT = os.environ.get('ALERT_RULES_DEFAULT', 'alert')  # 'alert' or 'mute' events that no rule matches
+ALERT_RULES_RELOAD = float(os.environ.get('ALERT_RULES_RELOAD', 5))  # seconds between checks of the rules file for changes
+
+# Portfolio valuation
+PRICE_SOURCE = os.environ.get('PRICE_SOURCE', 'coingecko')  # 'coingecko', 'static' or 'package.module:factory'
+PRICE_FILE = os.environ.get('PRICE_FILE', 'prices.json')  # USD prices for the 'static' source
+PRICE_API_URL = os.environ.get('PRICE_API_URL', 'https://api.coingecko.com/api/v3')
+PRICE_TTL = float(os.environ.get('PRICE_TTL', 300))  # seconds a fetched price is reused
+
+# Balance history
+HISTORY_DIR = os.environ.get('HISTORY_DIR', DATABASE_PATH + '.history')  # one timestamp and one gwei column file per wallet
+HISTORY_MIN_INTERVAL = float(os.environ.get('HISTORY_MIN_INTERVAL', 3600))  # seconds between samples of an unchanged balance
+HISTORY_FLUSH_INTERVAL = float(os.environ.get('HISTORY_FLUSH_INTERVAL', 5))  # seconds samples are buffered before writing
+HISTORY_MAX_POINTS = int(os.environ.get('HISTORY_MAX_POINTS', 2000))  # most buckets /api/wallets/<address>/history returns
+GWEI = 10 ** 9  # history stores whole gwei as int64, exact up to ~9.2 billion of a native coin
+
+# Live dashboard stream
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 256))  # events buffered per subscriber before it is dropped
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))  # seconds between keep-alive events
+SSE_WALLET_EVENTS_MAX = int(os.environ.get('SSE_WALLET_EVENTS_MAX', 20))  # larger wallet changes go out as one summary event
+
+# Metrics
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))  # serve /metrics from a dedicated monitor process on this port; 0 = off
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds, RPC and Telegram requests
+ALERT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)  # seconds from detection to delivery
+
+# Activity log
+ACTIVITY_LOG_SIZE = int(os.environ.get('ACTIVITY_LOG_SIZE', 10000))  # events kept in memory, oldest evicted first
+ACTIVITY_PAGE_LIMIT = int(os.environ.get('ACTIVITY_PAGE_LIMIT', 1000))  # most events /api/transactions returns per page
+
+# Wallet lists
+WALLET_PAGE_LIMIT = int(os.environ.get('WALLET_PAGE_LIMIT', 1000))  # most wallets a paged /api/wallets request returns
+DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 50))  # wallets per dashboard page
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 500))  # rows serialized per chunk of a streamed response
 
-# Free RPC endpoints (no API key required)
+# Bulk import
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 5000))  # rows validated and inserted per pass
+ADDRESS_PATTERN = re.compile(r'0x[0-9a-fA-F]{40}')
+
+NATIVE_ASSET = 'native'  # asset key of a chain's own coin in price lookups
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+AGGREGATE3_SELECTOR = bytes.fromhex('82ad56cb')  # Multicall3 aggregate3((address,bool,bytes)[])
+GET_ETH_BALANCE_SELECTOR = bytes.fromhex('4d2301cc')  # Multicall3 getEthBalance(address)
+BALANCE_OF_SELECTOR = bytes.fromhex('70a08231')  # ERC-20 balanceOf(address)
+SYMBOL_SELECTOR = bytes.fromhex('95d89b41')  # ERC-20 symbol()
+DECIMALS_SELECTOR = bytes.fromhex('313ce567')  # ERC-20 decimals()
+
+# RPC endpoints per chain, tried in order of rolling health score
 CHAINS = {
     'ethereum': {
         'name': 'Ethereum',
-        'rpc_url': 'https://eth.llamarpc.com',
+        'symbol': 'ETH',
+        'rpc_urls': ['https://eth.llamarpc.com', 'https://ethereum-rpc.publicnode.com'],
+        'alchemy_network': 'eth-mainnet',
         'explorer': 'https://etherscan.io',
-        'chain_id': 1
+        'chain_id': 1,
+        'coingecko_id': 'ethereum',
+        'coingecko_platform': 'ethereum',
+        'sweep_interval': 12,
+        'confirmations': 3
     },
     'polygon': {
         'name': 'Polygon',
-        'rpc_url': 'https://polygon-rpc.com',
+        'symbol': 'POL',
+        'rpc_urls': ['https://polygon-rpc.com', 'https://polygon-bor-rpc.publicnode.com'],
+        'alchemy_network': 'polygon-mainnet',
         'explorer': 'https://polygonscan.com',
-        'chain_id': 137
+        'chain_id': 137,
+        'coingecko_id': 'polygon-ecosystem-token',
+        'coingecko_platform': 'polygon-pos',
+        'sweep_interval': 15,
+        'confirmations': 16
     },
     'bsc': {
         'name': 'BNB Chain',
-        'rpc_url': 'https://bsc-dataseed.binance.org/',
+        'symbol': 'BNB',
+        'rpc_urls': ['https://bsc-dataseed.binance.org/', 'https://bsc-dataseed1.defibit.io/',
+                     'https://bsc-rpc.publicnode.com'],
+        'alchemy_network': 'bnb-mainnet',
         'explorer': 'https://bscscan.com',
-        'chain_id': 56
+        'chain_id': 56,
+        'coingecko_id': 'binancecoin',
+        'coingecko_platform': 'binance-smart-chain',
+        'sweep_interval': 15,
+        'confirmations': 3
     }
 }
 
-@dataclass
-class WalletInfo:
-    address: str
-    chain: str
-    label: str
-    last_checked: datetime
-    last_tx_hash: Optional[str] = None
+# Allow per-chain overrides, e.g. SWEEP_INTERVAL_BSC=5 or RPC_URLS_POLYGON=https://a,https://b
+for _chain_id, _config in CHAINS.items():
+    _config['sweep_interval'] = float(os.environ.get(f'SWEEP_INTERVAL_{_chain_id.upper()}', _config['sweep_interval']))
+    # Blocks a transaction needs on top of it before it is alerted on; 0 alerts at the head
+    _config['confirmations'] = max(0, int(os.environ.get(f'CONFIRMATIONS_{_chain_id.upper()}', _config['confirmations'])))
+    # An empty MULTICALL3_<CHAIN> reads balances with one eth_getBalance per wallet instead
+    _config['multicall3'] = os.environ.get(f'MULTICALL3_{_chain_id.upper()}', MULTICALL3_ADDRESS) or None
+    # ERC-20 contracts read on every sweep and included in /api/portfolio, e.g. TOKENS_ETHEREUM=0xA0b8...,0xdAC1...
+    _config['tokens'] = [token.strip().lower() for token in os.environ.get(f'TOKENS_{_chain_id.upper()}', '').split(',')
+                         if token.strip()]
+    if os.environ.get(f'RPC_URLS_{_chain_id.upper()}'):
+        _config['rpc_urls'] = [url.strip() for url in os.environ[f'RPC_URLS_{_chain_id.upper()}'].split(',') if url.strip()]
+    if ALCHEMY_API_KEY:
+        _config['rpc_urls'].insert(0, f"https://{_config['alchemy_network']}.g.alchemy.com/v2/{ALCHEMY_API_KEY}")
+
+@dataclass
+class WalletInfo:
+    address: str
+    chain: str
+    label: str
+    last_checked: datetime
+    last_tx_hash: Optional[str] = None
+    min_interval: Optional[float] = None  # per-wallet poll interval overrides for 'adaptive' mode
+    max_interval: Optional[float] = None
+
+class WalletRegistry:
+    """Thread-safe wallet index keyed by (chain, lowercase address)"""
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.wallets: Dict[Tuple[str, str], WalletInfo] = {}
+        self.version = 0  # bumped on every change, lets readers cache derived indexes
+        self._snapshot: Tuple[WalletInfo, ...] = ()
+        self._chain_snapshots: Dict[str, Tuple[WalletInfo, ...]] = {}
+        self._snapshot_version = 0
+        self._ordered: Tuple[List[Tuple[str, str]], List[WalletInfo]] = ([], [])
+        self._ordered_version = 0
+    
+    @staticmethod
+    def key(chain: str, address: str) -> Tuple[str, str]:
+        return chain, address.lower()
+    
+    def get(self, chain: str, address: str) -> Optional[WalletInfo]:
+        return self.wallets.get(self.key(chain, address))
+    
+    def add(self, wallet: WalletInfo) -> bool:
+        """Insert a wallet; returns False if it is already tracked"""
+        key = self.key(wallet.chain, wallet.address)
+        with self.lock:
+            if key in self.wallets:
+                return False
+            self.wallets[key] = wallet
+            self.version += 1
+            return True
+    
+    def remove(self, chain: str, address: str) -> Optional[WalletInfo]:
+        """Delete a wallet and return it, or None if it wasn't tracked"""
+        with self.lock:
+            wallet = self.wallets.pop(self.key(chain, address), None)
+            if wallet is not None:
+                self.version += 1
+            return wallet
+    
+    def bulk_import(self, wallets: List[WalletInfo]) -> List[WalletInfo]:
+        """Insert many wallets under one lock; returns the ones that were new"""
+        added = []
+        with self.lock:
+            for wallet in wallets:
+                key = self.key(wallet.chain, wallet.address)
+                if key not in self.wallets:
+                    self.wallets[key] = wallet
+                    added.append(wallet)
+            if added:
+                self.version += 1
+        return added
+    
+    def export(self) -> List[Dict]:
+        """Plain dicts of (address, chain, label) for every tracked wallet"""
+        return [
+            {'address': wallet.address, 'chain': wallet.chain, 'label': wallet.label}
+            for wallet in self.snapshot()
+        ]
+    
+    def snapshot(self) -> Tuple[WalletInfo, ...]:
+        """Immutable view of all wallets, safe to iterate while others add or remove"""
+        with self.lock:
+            if self._snapshot_version != self.version:
+                self._snapshot = tuple(self.wallets.values())
+                self._chain_snapshots = {}
+                self._snapshot_version = self.version
+            return self._snapshot
+    
+    def for_chain(self, chain: str) -> Tuple[WalletInfo, ...]:
+        """Immutable view of the wallets on one chain"""
+        with self.lock:
+            snapshot = self.snapshot()
+            if chain not in self._chain_snapshots:
+                self._chain_snapshots[chain] = tuple(wallet for wallet in snapshot if wallet.chain == chain)
+            return self._chain_snapshots[chain]
+    
+    def ordered(self) -> Tuple[List[Tuple[str, str]], List[WalletInfo]]:
+        """Sorted keys and their wallets; pages are cut from this order so cursors work in every process"""
+        with self.lock:
+            if self._ordered_version != self.version:
+                keys = sorted(self.wallets)
+                self._ordered = (keys, [self.wallets[key] for key in keys])
+                self._ordered_version = self.version
+            return self._ordered
+    
+    def scan(self, after: Optional[Tuple[str, str]] = None, before: Optional[Tuple[str, str]] = None,
+             chain: Optional[str] = None, match: Optional[Callable[[WalletInfo], bool]] = None) -> Iterator[WalletInfo]:
+        """Wallets in key order after a cursor key, or in reverse order before one, optionally on one chain"""
+        keys, wallets = self.ordered()
+        lo, hi = 0, len(keys)
+        if chain is not None:
+            lo, hi = bisect.bisect_left(keys, (chain,)), bisect.bisect_left(keys, (chain + '\0',))
+        if before is not None:
+            indexes = range(bisect.bisect_left(keys, before, lo, hi) - 1, lo - 1, -1)
+        else:
+            indexes = range(bisect.bisect_right(keys, after, lo, hi) if after is not None else lo, hi)
+        for i in indexes:
+            if match is None or match(wallets[i]):
+                yield wallets[i]
+    
+    def __len__(self) -> int:
+        return len(self.wallets)
+    
+    def __iter__(self):
+        return iter(self.snapshot())
+
+class ActivityEvent:
+    """One detected activity; slots keep a buffer of millions of these compact"""
+    __slots__ = ('id', 'chain', 'address', 'wallet_label', 'timestamp', 'explorer_url', 'tx_count', 'balance',
+                 'tx_hash', 'block_number', 'direction', 'counterparty', 'value', 'token', 'token_address')
+    
+    def __init__(self, record: Dict, event_id: int = 0):
+        self.id = event_id
+        for field in self.__slots__[1:]:
+            setattr(self, field, record.get(field))
+        if isinstance(self.timestamp, str):
+            self.timestamp = datetime.fromisoformat(self.timestamp)
+    
+    def to_dict(self) -> Dict:
+        """JSON-ready record with the fields that are set"""
+        data = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value.isoformat() if isinstance(value, datetime) else value
+        return data
+
+def first_id_after(id_at, lo: int, hi: int, event_id: int) -> int:
+    """Binary search positions lo..hi (ids ascending) for the first id greater than event_id"""
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if id_at(mid) <= event_id:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def page_bounds(id_at, lo: int, hi: int, since: Optional[int], before: Optional[int], limit: int) -> Tuple[int, int]:
+    """Positions of the page after `since` (oldest first) or the newest page before `before`"""
+    if since is not None:
+        lo = first_id_after(id_at, lo, hi, since)
+    if before is not None:
+        hi = first_id_after(id_at, lo, hi, before - 1)
+    if since is not None:
+        return lo, min(hi, lo + limit)
+    return max(lo, hi - limit), hi
+
+class EventIndex:
+    """Events of one chain or wallet in id order; evicted from the front as the ring wraps"""
+    __slots__ = ('events', 'head')
+    
+    def __init__(self):
+        self.events: List[ActivityEvent] = []
+        self.head = 0
+    
+    def append(self, event: ActivityEvent):
+        self.events.append(event)
+    
+    def popleft(self):
+        self.head += 1
+        if self.head > 64 and self.head * 2 > len(self.events):
+            del self.events[:self.head]
+            self.head = 0
+    
+    def __len__(self) -> int:
+        return len(self.events) - self.head
+    
+    def page(self, since: Optional[int], before: Optional[int], limit: int) -> List[ActivityEvent]:
+        events = self.events
+        lo, hi = page_bounds(lambda i: events[i].id, self.head, len(events), since, before, limit)
+        return events[lo:hi]
+
+class ActivityLog:
+    """Fixed-capacity ring buffer of activity events with per-chain and per-wallet indexes"""
+    def __init__(self, capacity: int = ACTIVITY_LOG_SIZE):
+        self.capacity = max(1, capacity)
+        self.slots: List[Optional[ActivityEvent]] = [None] * self.capacity
+        self.start = 0  # slot of the oldest event
+        self.size = 0
+        self.next_id = 1
+        self.by_chain: Dict[str, EventIndex] = {}
+        self.by_wallet: Dict[Tuple[str, str], EventIndex] = {}
+        self.lock = threading.Lock()
+    
+    def append(self, record: Dict) -> ActivityEvent:
+        """Add a record as the newest event with the next id"""
+        with self.lock:
+            event = ActivityEvent(record, self.next_id)
+            self.insert(event)
+            return event
+    
+    def load(self, events: Iterable[ActivityEvent]):
+        """Append events read back from the store, keeping their ids"""
+        with self.lock:
+            for event in events:
+                self.insert(event)
+    
+    def insert(self, event: ActivityEvent):
+        """Place an event at the head of the ring, evicting the oldest when full; caller holds the lock"""
+        self.next_id = max(self.next_id, event.id + 1)
+        if self.size == self.capacity:
+            self.evict_oldest()
+        self.slots[(self.start + self.size) % self.capacity] = event
+        self.size += 1
+        
+        self.by_chain.setdefault(event.chain, EventIndex()).append(event)
+        self.by_wallet.setdefault((event.chain, event.address.lower()), EventIndex()).append(event)
+    
+    def evict_oldest(self):
+        event = self.slots[self.start]
+        self.slots[self.start] = None
+        self.start = (self.start + 1) % self.capacity
+        self.size -= 1
+        
+        self.by_chain[event.chain].popleft()
+        key = (event.chain, event.address.lower())
+        wallet_index = self.by_wallet[key]
+        wallet_index.popleft()
+        if not wallet_index:
+            del self.by_wallet[key]
+    
+    def last_id(self) -> int:
+        return self.next_id - 1
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def query(self, chain: Optional[str] = None, address: Optional[str] = None, since: Optional[int] = None,
+              before: Optional[int] = None, limit: int = 20) -> List[ActivityEvent]:
+        """Page of events oldest first: those after `since`, otherwise the newest before `before`"""
+        with self.lock:
+            if address is not None:
+                chains = [chain] if chain is not None else list(self.by_chain)
+                indexes = [self.by_wallet.get((chain_id, address.lower())) for chain_id in chains]
+                # A wallet lives on at most a few chains; merge their pages by id
+                events = sorted(
+                    (event for index in indexes if index is not None for event in index.page(since, before, limit)),
+                    key=lambda event: event.id
+                )
+                return events[:limit] if since is not None else events[-limit:]
+            if chain is not None:
+                index = self.by_chain.get(chain)
+                return index.page(since, before, limit) if index is not None else []
+            
+            slots, start, capacity = self.slots, self.start, self.capacity
+            lo, hi = page_bounds(lambda i: slots[(start + i) % capacity].id, 0, self.size, since, before, limit)
+            return [slots[(start + i) % capacity] for i in range(lo, hi)]
+
+# In-memory storage, loaded from and persisted to WalletStore
+tracked_wallets = WalletRegistry()
+activity_log = ActivityLog()
+
+class WalletStore:
+    """SQLite store for wallets, cursors and activity with write-behind batching"""
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS wallets (
+            chain TEXT NOT NULL,
+            address TEXT NOT NULL,
+            label TEXT NOT NULL,
+            last_checked TEXT NOT NULL,
+            last_tx_hash TEXT,
+            min_interval REAL,
+            max_interval REAL,
+            PRIMARY KEY (chain, address)
+        );
+        CREATE TABLE IF NOT EXISTS chain_cursors (
+            chain TEXT PRIMARY KEY,
+            block_number INTEGER NOT NULL,
+            block_hash TEXT
+        );
+        CREATE TABLE IF NOT EXISTS activity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chain TEXT NOT NULL,
+            address TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS activity_wallet ON activity (chain, address);
+        CREATE TABLE IF NOT EXISTS wallet_states (
+            chain TEXT NOT NULL,
+            address TEXT NOT NULL,
+            balance_wei TEXT,
+            tx_count INTEGER,
+            tokens TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (chain, address)
+        );
+        CREATE INDEX IF NOT EXISTS wallet_states_updated ON wallet_states (updated_at);
+        CREATE TABLE IF NOT EXISTS monitor_workers (
+            worker_id TEXT PRIMARY KEY,
+            heartbeat REAL NOT NULL,
+            started REAL NOT NULL
+        );
+    '''
+    
+    def __init__(self, path: str = DATABASE_PATH, flush_interval_ms: int = STORE_FLUSH_INTERVAL_MS):
+        self.path = path
+        self.flush_interval = max(1, flush_interval_ms) / 1000
+        self.pending: queue.Queue = queue.Queue()
+        self.retry_ops: List[Tuple[str, tuple]] = []  # a batch whose transaction failed, written first next time
+        self.write_lock = threading.Lock()
+        self.conn = self.connect()
+        self.conn.executescript(self.SCHEMA)
+        self.migrate()
+        self.writer_thread: Optional[threading.Thread] = None
+    
+    def migrate(self):
+        """Add columns introduced after a database was created"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(wallets)')}
+        with self.conn:
+            for column in ('min_interval', 'max_interval'):
+                if column not in columns:
+                    self.conn.execute(f'ALTER TABLE wallets ADD COLUMN {column} REAL')
+            if 'block_hash' not in {row[1] for row in self.conn.execute('PRAGMA table_info(chain_cursors)')}:
+                self.conn.execute('ALTER TABLE chain_cursors ADD COLUMN block_hash TEXT')
+    
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+    
+    def start(self):
+        """Start the background writer and flush remaining writes at exit"""
+        if self.writer_thread is None:
+            self.writer_thread = threading.Thread(target=self.writer_loop, daemon=True)
+            self.writer_thread.start()
+            atexit.register(self.flush)
+    
+    def writer_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing wallet store: {e}")
+    
+    def flush(self) -> int:
+        """Write all queued statements in one transaction; returns the number written
+        
+        If the database is locked, full or otherwise unavailable the batch is kept and written
+        ahead of newer statements on the next flush. Any other failure drops the batch.
+        """
+        with self.write_lock:
+            ops, self.retry_ops = self.retry_ops, []
+            while True:
+                try:
+                    ops.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            if not ops:
+                return 0
+            
+            try:
+                with self.conn:
+                    # Group consecutive statements of the same kind into executemany calls
+                    batch_sql, batch_params = ops[0][0], []
+                    for sql, params in ops:
+                        if sql != batch_sql:
+                            self.conn.executemany(batch_sql, batch_params)
+                            batch_sql, batch_params = sql, []
+                        batch_params.append(params)
+                    self.conn.executemany(batch_sql, batch_params)
+            except sqlite3.OperationalError:
+                self.retry_ops = ops
+                logger.error(f"Wallet store unavailable, keeping {len(ops)} writes for the next flush")
+                raise
+            except Exception:
+                logger.error(f"Dropped {len(ops)} wallet store writes")
+                raise
+        return len(ops)
+    
+    def save_wallet(self, wallet: WalletInfo):
+        self.pending.put((
+            'INSERT INTO wallets (chain, address, label, last_checked, last_tx_hash, min_interval, max_interval) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (chain, address) DO UPDATE SET label = excluded.label, '
+            'last_checked = excluded.last_checked, last_tx_hash = excluded.last_tx_hash, '
+            'min_interval = excluded.min_interval, max_interval = excluded.max_interval',
+            (wallet.chain, wallet.address.lower(), wallet.label, wallet.last_checked.isoformat(), wallet.last_tx_hash,
+             wallet.min_interval, wallet.max_interval)
+        ))
+    
+    def save_wallet_cursor(self, wallet: WalletInfo):
+        self.pending.put((
+            'UPDATE wallets SET last_tx_hash = ?, last_checked = ? WHERE chain = ? AND address = ?',
+            (wallet.last_tx_hash, wallet.last_checked.isoformat(), wallet.chain, wallet.address.lower())
+        ))
+    
+    def save_wallet_schedule(self, wallet: WalletInfo):
+        self.pending.put((
+            'UPDATE wallets SET min_interval = ?, max_interval = ? WHERE chain = ? AND address = ?',
+            (wallet.min_interval, wallet.max_interval, wallet.chain, wallet.address.lower())
+        ))
+    
+    def delete_wallet(self, chain: str, address: str):
+        self.pending.put(('DELETE FROM wallets WHERE chain = ? AND address = ?', (chain, address.lower())))
+        self.pending.put(('DELETE FROM wallet_states WHERE chain = ? AND address = ?', (chain, address.lower())))
+    
+    def save_wallet_state(self, wallet: WalletInfo, balance_wei: Optional[int], tx_count: Optional[int],
+                          token_balances: Dict[str, int]):
+        """Latest balances and nonce so web workers in other processes can serve them; timestamped at commit"""
+        self.pending.put((
+            'INSERT INTO wallet_states (chain, address, balance_wei, tx_count, tokens, updated_at) '
+            "VALUES (?, ?, ?, ?, ?, (julianday('now') - 2440587.5) * 86400.0) "
+            'ON CONFLICT (chain, address) DO UPDATE SET balance_wei = excluded.balance_wei, '
+            'tx_count = excluded.tx_count, tokens = excluded.tokens, updated_at = excluded.updated_at',
+            (wallet.chain, wallet.address.lower(), str(balance_wei) if balance_wei is not None else None, tx_count,
+             json.dumps({token: str(amount) for token, amount in token_balances.items()}))
+        ))
+    
+    def save_chain_cursor(self, chain: str, block_number: int, block_hash: Optional[str] = None):
+        self.pending.put((
+            'INSERT INTO chain_cursors (chain, block_number, block_hash) VALUES (?, ?, ?) '
+            'ON CONFLICT (chain) DO UPDATE SET block_number = excluded.block_number, block_hash = excluded.block_hash',
+            (chain, block_number, block_hash)
+        ))
+    
+    def record_activity(self, event: ActivityEvent):
+        """Queue an event; id 0 lets SQLite assign one"""
+        self.pending.put((
+            'INSERT INTO activity (id, chain, address, timestamp, record) VALUES (?, ?, ?, ?, ?)',
+            (event.id or None, event.chain, event.address.lower(), event.timestamp.isoformat(),
+             json.dumps(event.to_dict()))
+        ))
+    
+    def load_wallet_rows(self) -> List[tuple]:
+        """Raw (address, chain, label, last_checked, last_tx_hash, min_interval, max_interval) rows in one query"""
+        with self.write_lock:
+            return self.conn.execute(
+                'SELECT address, chain, label, last_checked, last_tx_hash, min_interval, max_interval FROM wallets'
+            ).fetchall()
+    
+    @staticmethod
+    def wallet_from_row(row: tuple) -> WalletInfo:
+        address, chain, label, last_checked, last_tx_hash, min_interval, max_interval = row
+        return WalletInfo(
+            address=Web3.to_checksum_address(address),
+            chain=chain,
+            label=label,
+            last_checked=datetime.fromisoformat(last_checked),
+            last_tx_hash=last_tx_hash,
+            min_interval=min_interval,
+            max_interval=max_interval
+        )
+    
+    def load_wallets(self) -> List[WalletInfo]:
+        """Load every stored wallet in one query"""
+        return [self.wallet_from_row(row) for row in self.load_wallet_rows()]
+    
+    def load_wallet_states(self, since: float = 0) -> List[Tuple[str, str, Optional[int], Optional[int], Dict[str, int], float]]:
+        """(chain, address, balance wei, nonce, token balances, unix time) of states written after since"""
+        with self.write_lock:
+            rows = self.conn.execute(
+                'SELECT chain, address, balance_wei, tx_count, tokens, updated_at FROM wallet_states WHERE updated_at > ?',
+                (since,)
+            ).fetchall()
+        return [
+            (chain, address, int(balance_wei) if balance_wei is not None else None, tx_count,
+             {token: int(amount) for token, amount in json.loads(tokens).items()}, updated_at)
+            for chain, address, balance_wei, tx_count, tokens, updated_at in rows
+        ]
+    
+    def load_chain_cursors(self) -> Dict[str, Tuple[int, Optional[str]]]:
+        """Last reported block number and hash per chain"""
+        with self.write_lock:
+            rows = self.conn.execute('SELECT chain, block_number, block_hash FROM chain_cursors').fetchall()
+        return {chain: (block_number, block_hash) for chain, block_number, block_hash in rows}
+    
+    def load_activity_since(self, last_id: int) -> List[ActivityEvent]:
+        """Events written after last_id, oldest first"""
+        with self.write_lock:
+            rows = self.conn.execute('SELECT id, record FROM activity WHERE id > ? ORDER BY id', (last_id,)).fetchall()
+        return [ActivityEvent(json.loads(raw), activity_id) for activity_id, raw in rows]
+    
+    def last_activity_id(self) -> int:
+        with self.write_lock:
+            return self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM activity').fetchone()[0]
+    
+    def heartbeat_worker(self, worker_id: str):
+        """Record that a monitor worker is alive; written immediately, not batched"""
+        now = time.time()
+        with self.write_lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO monitor_workers (worker_id, heartbeat, started) VALUES (?, ?, ?) '
+                'ON CONFLICT (worker_id) DO UPDATE SET heartbeat = excluded.heartbeat',
+                (worker_id, now, now)
+            )
+    
+    def remove_worker(self, worker_id: str):
+        with self.write_lock, self.conn:
+            self.conn.execute('DELETE FROM monitor_workers WHERE worker_id = ?', (worker_id,))
+    
+    def live_workers(self, timeout: float = SHARD_WORKER_TIMEOUT) -> List[str]:
+        """Ids of workers that heartbeat within the timeout, pruning the rest"""
+        cutoff = time.time() - timeout
+        with self.write_lock, self.conn:
+            self.conn.execute('DELETE FROM monitor_workers WHERE heartbeat < ?', (cutoff,))
+            rows = self.conn.execute('SELECT worker_id FROM monitor_workers ORDER BY worker_id').fetchall()
+        return [row[0] for row in rows]
+    
+    def load_recent_activity(self, limit: int = ACTIVITY_LOG_SIZE) -> List[ActivityEvent]:
+        """Most recent events, oldest first"""
+        with self.write_lock:
+            rows = self.conn.execute('SELECT id, record FROM activity ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [ActivityEvent(json.loads(raw), activity_id) for activity_id, raw in reversed(rows)]
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+class ShardCoordinator:
+    """Splits wallets across monitor workers by consistent hashing, with membership kept by store heartbeats"""
+    def __init__(self, store: WalletStore, worker_id: Optional[str] = None, vnodes: int = SHARD_VNODES,
+                 heartbeat_interval: float = SHARD_HEARTBEAT_INTERVAL, timeout: float = SHARD_WORKER_TIMEOUT):
+        self.store = store
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.vnodes = max(1, vnodes)
+        self.heartbeat_interval = heartbeat_interval
+        self.timeout = timeout
+        self.members: Tuple[str, ...] = ()
+        self.ring_points: List[int] = []
+        self.ring_owners: List[str] = []
+        self.version = 0  # bumped whenever membership changes
+        self.owned_cache: Dict[Optional[str], Tuple[Tuple[int, int], Tuple[WalletInfo, ...]]] = {}
+        self.joined = False
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+    
+    def set_members(self, members: List[str]) -> bool:
+        """Rebuild the ring for a new member list; returns True if it changed"""
+        members = tuple(sorted(members))
+        if members == self.members:
+            return False
+        points = sorted((ring_hash(f"{member}#{i}"), member) for member in members for i in range(self.vnodes))
+        with self.lock:
+            self.members = members
+            self.ring_points = [point for point, _ in points]
+            self.ring_owners = [member for _, member in points]
+            self.version += 1
+            self.owned_cache.clear()
+        return True
+    
+    def owner(self, chain: str, address: str) -> Optional[str]:
+        """Worker responsible for a wallet: the first ring point clockwise of its hash"""
+        with self.lock:
+            if not self.ring_points:
+                return None
+            index = bisect.bisect(self.ring_points, ring_hash(f"{chain}:{address.lower()}")) % len(self.ring_points)
+            return self.ring_owners[index]
+    
+    def owns(self, chain: str, address: str) -> bool:
+        return self.joined and self.owner(chain, address) == self.worker_id
+    
+    def is_leader(self) -> bool:
+        """Whether this worker is the live member that runs chain-wide work such as block scanning"""
+        with self.lock:
+            return self.joined and bool(self.members) and self.members[0] == self.worker_id
+    
+    def owned(self, chain: Optional[str] = None) -> Tuple[WalletInfo, ...]:
+        """This worker's wallets, on one chain or all; cached until wallets or membership change"""
+        version = (tracked_wallets.version, self.version)
+        cached = self.owned_cache.get(chain)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        wallets = tracked_wallets.for_chain(chain) if chain is not None else tracked_wallets.snapshot()
+        owned = tuple(wallet for wallet in wallets if self.owns(wallet.chain, wallet.address))
+        self.owned_cache[chain] = (version, owned)
+        return owned
+    
+    def heartbeat(self):
+        """Renew our membership and rebalance if workers joined or left"""
+        previous = {WalletRegistry.key(wallet.chain, wallet.address) for wallet in self.owned()}
+        self.store.heartbeat_worker(self.worker_id)
+        if not self.set_members(self.store.live_workers(self.timeout)):
+            return
+        owned = self.owned()
+        logger.info(f"Shard membership changed: {len(self.members)} workers, this one owns {len(owned)} wallets")
+        # Take over the latest cursors for wallets handed to us so their next poll doesn't re-alert
+        gained = {WalletRegistry.key(wallet.chain, wallet.address): wallet for wallet in owned}
+        for key in previous:
+            gained.pop(key, None)
+        if gained:
+            self.store.flush()
+            for row in self.store.load_wallet_rows():
+                wallet = gained.get(WalletRegistry.key(row[1], row[0]))
+                if wallet is not None:
+                    wallet.last_tx_hash = row[4]
+                    wallet.last_checked = datetime.fromisoformat(row[3])
+    
+    def join(self):
+        """Register as a worker and keep heartbeating in the background"""
+        if self.joined:
+            return
+        self.joined = True
+        self.heartbeat()
+        self.thread = threading.Thread(target=self.heartbeat_loop, daemon=True)
+        self.thread.start()
+        atexit.register(self.leave)
+        logger.info(f"Joined monitor shard as {self.worker_id}")
+    
+    def heartbeat_loop(self):
+        while self.joined:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"Error sending shard heartbeat: {e}")
+    
+    def leave(self):
+        """Drop out of the ring so the others pick up our wallets without waiting for the timeout"""
+        if self.joined:
+            self.joined = False
+            self.store.remove_worker(self.worker_id)
+    
+    def status(self) -> Dict:
+        members = self.store.live_workers(self.timeout)
+        return {
+            'worker_id': self.worker_id if self.joined else None,
+            'workers': members,
+            'leader': members[0] if members else None,
+            'owned_wallets': len(self.owned()) if self.joined else None
+        }
+
+class EventBroker:
+    """In-process pub/sub that fans dashboard events out to SSE subscribers"""
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: set = set()
+        self.lock = threading.Lock()
+    
+    def subscribe(self) -> queue.Queue:
+        subscriber: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+    
+    def close(self, subscriber: queue.Queue):
+        """Drop a subscriber and queue the None sentinel that ends its stream, so EventSource reconnects"""
+        self.unsubscribe(subscriber)
+        with subscriber.mutex:
+            subscriber.queue.clear()
+        try:
+            subscriber.put_nowait(None)
+        except queue.Full:
+            pass
+    
+    def publish(self, event: str, data: Dict):
+        """Encode an event once and hand it to every subscriber"""
+        message = f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # A stalled client; end its stream and let EventSource reconnect
+                self.close(subscriber)
+                logger.warning("Dropped slow event stream subscriber")
+    
+    def subscriber_count(self) -> int:
+        return len(self.subscribers)
+
+event_broker = EventBroker()
+
+def publish_wallet_changes(added: List[WalletInfo], removed: List[WalletInfo]):
+    """Per-wallet events for small changes, one wallets_changed summary for bulk ones so subscriber queues don't fill"""
+    if len(added) + len(removed) > SSE_WALLET_EVENTS_MAX:
+        event_broker.publish('wallets_changed', {'added': len(added), 'removed': len(removed)})
+        return
+    for wallet in removed:
+        event_broker.publish('wallet_removed', {'address': wallet.address, 'chain': wallet.chain})
+    for wallet in added:
+        event_broker.publish('wallet_added', wallet_event(wallet))
+
+def wallet_event(wallet: WalletInfo) -> Dict:
+    return {
+        'address': wallet.address,
+        'chain': wallet.chain,
+        'label': wallet.label,
+        'last_checked': wallet.last_checked.isoformat()
+    }
+
+def escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """Monotonic counter per label set"""
+    kind = 'counter'
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, *labels: str, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+    
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            yield f"{self.name}{format_labels(self.labels, labels)} {value}"
+
+class Histogram:
+    """Cumulative-bucket histogram per label set"""
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Tuple[str, ...], List[float]] = {}  # labels -> per-bucket counts, then +Inf, sum
+        self.lock = threading.Lock()
+    
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+    
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            values = [(labels, list(counts)) for labels, counts in self.values.items()]
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                bucket_labels = format_labels(self.labels, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {counts[-1]}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}"
+
+class CallbackMetric:
+    """Gauge or counter read from existing state at scrape time"""
+    def __init__(self, name: str, help_text: str, kind: str, labels: Tuple[str, ...], collect):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labels = labels
+        self.collect = collect  # callable returning {label values tuple: value}
+    
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.collect().items():
+            if value is not None:
+                yield f"{self.name}{format_labels(self.labels, labels)} {value}"
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text exposition format"""
+    def __init__(self):
+        self.metrics: List[Any] = []
+    
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+    
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+    
+    def callback(self, name: str, help_text: str, kind: str = 'gauge', labels: Tuple[str, ...] = (), collect=None):
+        self.metrics.append(CallbackMetric(name, help_text, kind, labels, collect))
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                logger.error(f"Error collecting metric {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+rpc_latency = metrics.histogram('wallet_tracker_rpc_request_duration_seconds',
+                                'JSON-RPC request latency including failover, by method or "batch" for batched calls',
+                                ('chain', 'method'))
+rpc_calls = metrics.counter('wallet_tracker_rpc_calls_total', 'JSON-RPC calls sent', ('chain', 'method'))
+rpc_errors = metrics.counter('wallet_tracker_rpc_errors_total', 'JSON-RPC calls that failed or returned an error',
+                             ('chain', 'method'))
+rpc_endpoint_failures = metrics.counter('wallet_tracker_rpc_endpoint_failures_total',
+                                        'HTTP attempts against one endpoint that failed and were failed over',
+                                        ('chain',))
+sweep_duration = metrics.histogram('wallet_tracker_sweep_duration_seconds',
+                                   'Time to poll or scan one chain', ('chain', 'mode'))
+chain_reorgs = metrics.counter('wallet_tracker_reorgs_total', 'Chain reorganisations seen by the block scanner', ('chain',))
+alert_rule_decisions = metrics.counter('wallet_tracker_alert_rule_decisions_total',
+                                       'Detected events by alert rule outcome', ('outcome',))
+alert_latency = metrics.histogram('wallet_tracker_alert_latency_seconds',
+                                  'Time from detection to Telegram accepting the alert', (), ALERT_LATENCY_BUCKETS)
+telegram_latency = metrics.histogram('wallet_tracker_telegram_request_duration_seconds',
+                                     'Telegram sendMessage request latency', ('status',))
+
+def record_rpc(chain: str, methods: List[str], started: float, failed: Iterable[str] = ()):
+    """Observe one HTTP round trip and count its calls and failures per method
+    
+    A round trip carrying several calls is timed once under the method "batch", since its
+    duration can't be attributed to any one of them.
+    """
+    rpc_latency.observe(time.monotonic() - started, chain, methods[0] if len(methods) == 1 else 'batch')
+    counts: Dict[str, int] = {}
+    for method in methods:
+        counts[method] = counts.get(method, 0) + 1
+    for method, count in counts.items():
+        rpc_calls.inc(chain, method, amount=count)
+    for method in failed:
+        rpc_errors.inc(chain, method)
+
+class RpcError(Exception):
+    """Raised when a JSON-RPC endpoint rejects a request"""
+
+class RpcEndpoint:
+    """One RPC URL with a keep-alive session, rolling health stats and a circuit breaker"""
+    def __init__(self, url: str, pool_size: int = RPC_POOL_SIZE):
+        self.url = url
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+        self.latency: Optional[float] = None  # EWMA of request latency in seconds
+        self.error_rate = 0.0  # EWMA of failures, 0..1
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # circuit breaker: skipped until this monotonic time
+    
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+    
+    def score(self) -> float:
+        """Lower is better: rolling latency penalised by the recent error rate"""
+        latency = self.latency if self.latency is not None else 1.0
+        return latency * (1 + 10 * self.error_rate)
+    
+    def record_success(self, latency: float):
+        with self.lock:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.error_rate *= 0.8
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+    
+    def record_failure(self):
+        with self.lock:
+            self.error_rate = 0.8 * self.error_rate + 0.2
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+                self.open_until = time.monotonic() + CIRCUIT_COOLDOWN
+    
+    def status(self) -> Dict:
+        return {
+            'url': self.url.split('/v2/')[0],  # never expose API keys
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'circuit_open': not self.available()
+        }
+
+class EndpointPool:
+    """Routes a chain's JSON-RPC requests to its healthiest endpoint, failing over on errors"""
+    def __init__(self, chain: str, urls: List[str]):
+        self.chain = chain
+        self.endpoints = [RpcEndpoint(url) for url in urls]
+    
+    def ranked(self) -> List[RpcEndpoint]:
+        """Endpoints with closed circuits, best score first"""
+        return sorted((endpoint for endpoint in self.endpoints if endpoint.available()), key=RpcEndpoint.score)
+    
+    def healthy(self) -> bool:
+        return any(endpoint.available() and endpoint.latency is not None for endpoint in self.endpoints)
+    
+    def post(self, payload: Any, timeout: float = RPC_TIMEOUT) -> Any:
+        """POST a JSON-RPC payload, trying endpoints in score order until one answers"""
+        last_error: Optional[Exception] = None
+        for endpoint in self.ranked():
+            started = time.monotonic()
+            try:
+                response = endpoint.session.post(endpoint.url, json=payload, timeout=timeout)
+                response.raise_for_status()
+                body = response.json()
+                if isinstance(payload, list) and not isinstance(body, list):
+                    # Some endpoints answer a rejected batch with a single error object
+                    raise RpcError(f"Batch request failed: {body.get('error', body)}")
+            except Exception as e:
+                endpoint.record_failure()
+                rpc_endpoint_failures.inc(self.chain)
+                last_error = e
+                logger.warning(f"RPC endpoint {endpoint.status()['url']} failed on {self.chain}: {e}")
+                continue
+            endpoint.record_success(time.monotonic() - started)
+            return body
+        raise RpcError(f"No healthy RPC endpoint for {self.chain}: {last_error}")
+    
+    def probe(self) -> bool:
+        """Measure every endpoint with eth_blockNumber, including tripped ones"""
+        payload = {'jsonrpc': '2.0', 'id': 0, 'method': 'eth_blockNumber', 'params': []}
+        for endpoint in self.endpoints:
+            started = time.monotonic()
+            try:
+                response = endpoint.session.post(endpoint.url, json=payload, timeout=RPC_TIMEOUT)
+                response.raise_for_status()
+                if 'result' not in response.json():
+                    raise RpcError('eth_blockNumber returned no result')
+                endpoint.record_success(time.monotonic() - started)
+            except Exception:
+                endpoint.record_failure()
+        return self.healthy()
+
+class BatchRpcClient:
+    """JSON-RPC client that packs many calls into each HTTP POST"""
+    def __init__(self, pool: EndpointPool, batch_size: int = RPC_BATCH_SIZE, timeout: float = RPC_TIMEOUT):
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+    
+    def call(self, method: str, params: list) -> Any:
+        """Send a single JSON-RPC call and return its result"""
+        payload = {'jsonrpc': '2.0', 'id': 0, 'method': method, 'params': params}
+        started = time.monotonic()
+        try:
+            body = self.pool.post(payload, self.timeout)
+        except Exception:
+            record_rpc(self.pool.chain, [method], started, (method,))
+            raise
+        record_rpc(self.pool.chain, [method], started, (method,) if 'error' in body else ())
+        if 'error' in body:
+            raise RpcError(f"{method} failed: {body['error']}")
+        return body.get('result')
+    
+    def batch(self, calls: List[Tuple[str, list]]) -> List[Any]:
+        """Send calls in chunks of batch_size; failed calls come back as None"""
+        results: List[Any] = []
+        for start in range(0, len(calls), self.batch_size):
+            chunk = calls[start:start + self.batch_size]
+            payload = [
+                {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+                for i, (method, params) in enumerate(chunk)
+            ]
+            methods = [method for method, _ in chunk]
+            started = time.monotonic()
+            try:
+                body = self.pool.post(payload, self.timeout)
+            except Exception:
+                record_rpc(self.pool.chain, methods, started, methods)
+                raise
+            by_id = {item.get('id'): item for item in body}
+            failed = []
+            for i in range(len(chunk)):
+                item = by_id.get(i)
+                if item is None or 'error' in item:
+                    results.append(None)
+                    failed.append(methods[i])
+                else:
+                    results.append(item.get('result'))
+            record_rpc(self.pool.chain, methods, started, failed)
+        return results
+
+def format_balance(balance_wei: int) -> str:
+    """Format a wei amount with six decimals of the native unit"""
+    return f"{Web3.from_wei(balance_wei, 'ether'):.6f}"
+
+def address_to_topic(address: str) -> str:
+    """Left-pad an address to a 32-byte log topic"""
+    return '0x' + address.lower()[2:].rjust(64, '0')
+
+def topic_to_address(topic: str) -> str:
+    """Extract the address from a 32-byte log topic"""
+    return Web3.to_checksum_address('0x' + topic[-40:])
+
+def bloom_mask(item: bytes) -> int:
+    """Bits an item sets in a 2048-bit logsBloom, as an int mask"""
+    digest = Web3.keccak(item)
+    mask = 0
+    for i in (0, 2, 4):
+        mask |= 1 << (((digest[i] << 8) | digest[i + 1]) & 2047)
+    return mask
+
+TRANSFER_BLOOM_MASK = bloom_mask(bytes.fromhex(TRANSFER_TOPIC[2:]))
+
+def address_calldata(selector: bytes, address: str) -> bytes:
+    """Calldata for a function that takes a single address"""
+    return selector + bytes.fromhex(address.lower()[2:].rjust(64, '0'))
+
+def decode_symbol(result: Optional[str]) -> Optional[str]:
+    """Decode an ERC-20 symbol() result, which is a string or bytes32 depending on the token"""
+    if not result or result == '0x':
+        return None
+    data = bytes.fromhex(result[2:])
+    try:
+        return abi_decode(['string'], data)[0] or None
+    except Exception:
+        return data[:32].rstrip(b'\x00').decode('utf-8', 'ignore') or None
+
+def decode_uint(data: Optional[bytes]) -> Optional[int]:
+    return int.from_bytes(data[:32], 'big') if data is not None and len(data) >= 32 else None
+
+def multicall_calls(chain: str, subcalls: List[Tuple[str, bytes]], chunk_size: int = MULTICALL_CHUNK,
+                    block: str = 'latest') -> List[Tuple[str, list]]:
+    """Pack (target, calldata) pairs into aggregate3 eth_calls; each sub-call may fail on its own"""
+    multicall = CHAINS[chain]['multicall3']
+    calls = []
+    for start in range(0, len(subcalls), chunk_size):
+        chunk = [(target, True, calldata) for target, calldata in subcalls[start:start + chunk_size]]
+        data = AGGREGATE3_SELECTOR + abi_encode(['(address,bool,bytes)[]'], [chunk])
+        calls.append(('eth_call', [{'to': multicall, 'data': '0x' + data.hex()}, block]))
+    return calls
+
+def decode_multicall_results(results: List[Any], count: int, chunk_size: int = MULTICALL_CHUNK) -> List[Optional[bytes]]:
+    """Return data of each sub-call packed by multicall_calls; None where it or its whole eth_call failed"""
+    decoded: List[Optional[bytes]] = []
+    for i, result in enumerate(results):
+        size = min(chunk_size, count - i * chunk_size)
+        entries = None
+        if result and result != '0x':
+            try:
+                entries = abi_decode(['(bool,bytes)[]'], bytes.fromhex(result[2:]))[0]
+            except Exception:
+                entries = None
+        if entries is None or len(entries) != size:
+            decoded.extend([None] * size)
+        else:
+            decoded.extend(data if success else None for success, data in entries)
+    return decoded
+
+def balance_calls(chain: str, queries: List[Tuple[str, Optional[str]]], block: str = 'latest') -> List[Tuple[str, list]]:
+    """Calls reading the native (token None) or ERC-20 balance of each (owner, token), via Multicall3 if the chain has it"""
+    multicall = CHAINS[chain]['multicall3']
+    if multicall is None:
+        return [
+            ('eth_getBalance', [owner, block]) if token is None else
+            ('eth_call', [{'to': token, 'data': '0x' + address_calldata(BALANCE_OF_SELECTOR, owner).hex()}, block])
+            for owner, token in queries
+        ]
+    return multicall_calls(chain, [
+        (multicall, address_calldata(GET_ETH_BALANCE_SELECTOR, owner)) if token is None else
+        (token, address_calldata(BALANCE_OF_SELECTOR, owner))
+        for owner, token in queries
+    ], block=block)
+
+def decode_balances(chain: str, results: List[Any], count: int) -> List[Optional[int]]:
+    """Balances in wei or token units from the results of balance_calls"""
+    if CHAINS[chain]['multicall3'] is None:
+        return [int(result, 16) if result not in (None, '0x') else None for result in results]
+    return [decode_uint(data) for data in decode_multicall_results(results, count)]
+
+def format_token_amount(amount: int, decimals: int) -> str:
+    return f"{amount / 10 ** decimals:.6f}"
+
+class PortfolioReader:
+    """Reads native and ERC-20 balances of many wallets in a few batched Multicall3 eth_calls"""
+    def __init__(self, rpc_clients: Dict[str, BatchRpcClient]):
+        self.rpc_clients = rpc_clients
+        self.token_metadata: Dict[Tuple[str, str], Dict] = {}  # (chain, token) -> symbol/decimals
+    
+    def call_many(self, chain: str, subcalls: List[Tuple[str, bytes]]) -> List[Optional[bytes]]:
+        """eth_call each (target, calldata), aggregated where the chain has Multicall3"""
+        client = self.rpc_clients[chain]
+        if CHAINS[chain]['multicall3'] is not None:
+            return decode_multicall_results(client.batch(multicall_calls(chain, subcalls)), len(subcalls))
+        results = client.batch([('eth_call', [{'to': target, 'data': '0x' + calldata.hex()}, 'latest'])
+                                for target, calldata in subcalls])
+        return [bytes.fromhex(result[2:]) if result not in (None, '0x') else None for result in results]
+    
+    def balances(self, chain: str, queries: List[Tuple[str, Optional[str]]]) -> List[Optional[int]]:
+        """Balance of each (owner, token) pair, with None as the token for the native balance"""
+        if not queries:
+            return []
+        return decode_balances(chain, self.rpc_clients[chain].batch(balance_calls(chain, queries)), len(queries))
+    
+    def load_token_metadata(self, chain: str, token_addresses: Iterable[str]) -> Dict[str, Dict]:
+        """Symbol and decimals for each token, fetched in one batch for unseen tokens
+        
+        Only complete lookups are cached; a token whose symbol() or decimals() call failed gets
+        placeholder values for this call and is fetched again next time.
+        """
+        token_addresses = set(token_addresses)
+        missing = [token for token in token_addresses if (chain, token) not in self.token_metadata]
+        fallback = {}
+        if missing:
+            subcalls = []
+            for token in missing:
+                subcalls.append((token, SYMBOL_SELECTOR))
+                subcalls.append((token, DECIMALS_SELECTOR))
+            results = self.call_many(chain, subcalls)
+            for i, token in enumerate(missing):
+                symbol = decode_symbol('0x' + results[2 * i].hex()) if results[2 * i] is not None else None
+                decimals = decode_uint(results[2 * i + 1])
+                if symbol is not None and decimals is not None and decimals < 256:  # decimals() is a uint8
+                    self.token_metadata[(chain, token)] = {'symbol': symbol, 'decimals': decimals}
+                else:
+                    logger.warning(f"Incomplete metadata for token {token} on {chain}, will retry")
+                    fallback[token] = {'symbol': symbol or token[:10], 'decimals': 18}
+        return {token: self.token_metadata.get((chain, token)) or fallback[token] for token in token_addresses}
+    
+    def snapshot(self, chain: str, wallets: List[WalletInfo], tokens: List[str]) -> List[Dict]:
+        """Native and token balances of the wallets on one chain"""
+        tokens = [token.lower() for token in tokens]
+        metadata = self.load_token_metadata(chain, tokens) if tokens else {}
+        assets: List[Optional[str]] = [None] + tokens
+        balances = self.balances(chain, [(wallet.address, token) for wallet in wallets for token in assets])
+        snapshot = []
+        for i, wallet in enumerate(wallets):
+            row = balances[i * len(assets):(i + 1) * len(assets)]
+            snapshot.append({
+                'address': wallet.address,
+                'chain': chain,
+                'label': wallet.label,
+                'symbol': CHAINS[chain]['symbol'],
+                'balance_wei': str(row[0]) if row[0] is not None else None,
+                'balance': format_balance(row[0]) if row[0] is not None else None,
+                'tokens': [
+                    {
+                        'address': token,
+                        'symbol': metadata[token]['symbol'],
+                        'balance_raw': str(amount) if amount is not None else None,
+                        'balance': format_token_amount(amount, metadata[token]['decimals']) if amount is not None else None
+                    }
+                    for token, amount in zip(tokens, row[1:])
+                ]
+            })
+        return snapshot
+
+class TokenBucket:
+    """Blocking token-bucket rate limiter"""
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(rate, 0.001)
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+HTML_TAG_PATTERN = re.compile(r'<(/?)([a-zA-Z]+)[^<>]*>')
+
+def html_balanced(text: str) -> bool:
+    """Whether every Telegram HTML tag in text is complete and closed in order"""
+    stack = []
+    for closing, name in HTML_TAG_PATTERN.findall(text):
+        if not closing:
+            stack.append(name.lower())
+        elif not stack or stack.pop() != name.lower():
+            return False
+    return not stack and HTML_TAG_PATTERN.sub('', text).count('<') == 0
+
+def truncate_html(text: str, limit: int) -> str:
+    """Shorten a Telegram HTML message at a line break, falling back to plain text if that would cut a tag"""
+    if len(text) <= limit:
+        return text
+    cut = text.rfind('\n', 0, limit - 1)
+    if cut > 0 and html_balanced(text[:cut]):
+        return text[:cut] + '\n…'
+    plain = html.escape(html.unescape(HTML_TAG_PATTERN.sub('', text)), quote=False)
+    return re.sub(r'&[^;\s]*$', '', plain[:limit - 1]) + '…'
+
+def retry_after(response: requests.Response, default: float) -> float:
+    """Seconds Telegram asks us to wait after a 429, from the JSON body or the Retry-After header"""
+    try:
+        value = response.json().get('parameters', {}).get('retry_after')
+    except (ValueError, AttributeError):
+        value = None
+    try:
+        return float(value or response.headers.get('Retry-After') or default)
+    except ValueError:
+        return default
+
+class AlertDispatcher:
+    """Delivers Telegram messages from a bounded queue, merging bursts per chat into digests"""
+    def __init__(self, max_pending: int = ALERT_QUEUE_SIZE, workers: int = ALERT_WORKERS,
+                 rate_limit: float = ALERT_RATE_LIMIT, coalesce_ms: int = ALERT_COALESCE_MS,
+                 max_retries: int = ALERT_MAX_RETRIES):
+        self.max_pending = max_pending
+        self.workers = max(1, workers)
+        self.bucket = TokenBucket(rate_limit)
+        self.coalesce_window = coalesce_ms / 1000
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.condition = threading.Condition()
+        self.pending: Dict[str, List[Tuple[str, float]]] = {}  # chat id -> queued (message, detected at)
+        self.ready: deque = deque()  # (due time, chat id), one entry per chat with pending messages
+        self.sending: set = set()  # chats a worker is delivering to; their next batch waits so order is kept
+        self.size = 0
+        self.dropped = 0
+        self.sent = 0
+        self.threads: List[threading.Thread] = []
+    
+    def start(self):
+        with self.condition:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self.worker_loop, name=f"alert-dispatcher-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+    
+    def submit(self, message: str, chat_id: str = TELEGRAM_CHAT_ID, detected_at: Optional[float] = None) -> bool:
+        """Queue a message; returns False if the queue is full and it was dropped"""
+        self.start()
+        with self.condition:
+            if self.size >= self.max_pending:
+                self.dropped += 1
+                logger.warning(f"Alert queue full, dropped message ({self.dropped} dropped so far)")
+                return False
+            if chat_id not in self.pending:
+                self.pending[chat_id] = []
+                self.ready.append((time.monotonic() + self.coalesce_window, chat_id))
+            self.pending[chat_id].append((message, detected_at if detected_at is not None else time.monotonic()))
+            self.size += 1
+            self.condition.notify()
+            return True
+    
+    def next_batch(self) -> Tuple[str, List[Tuple[str, float]]]:
+        """Block until a chat's coalescing window has passed and no worker is sending to it, and take its messages"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                wait = None
+                for i, (due, chat_id) in enumerate(self.ready):
+                    if chat_id in self.sending:
+                        continue
+                    if due <= now:
+                        del self.ready[i]
+                        messages = self.pending.pop(chat_id)
+                        self.size -= len(messages)
+                        self.sending.add(chat_id)
+                        return chat_id, messages
+                    wait = due - now
+                    break
+                self.condition.wait(wait)
+    
+    def finished(self, chat_id: str):
+        """Let the chat's next batch be taken once a worker is done with the current one"""
+        with self.condition:
+            self.sending.discard(chat_id)
+            self.condition.notify_all()
+    
+    def worker_loop(self):
+        while True:
+            chat_id, queued = self.next_batch()
+            delivered = True
+            try:
+                for text in self.build_digests([message for message, _ in queued]):
+                    try:
+                        delivered = self.deliver(chat_id, text) and delivered
+                    except Exception as e:
+                        delivered = False
+                        logger.error(f"Error sending Telegram alert: {e}")
+            finally:
+                self.finished(chat_id)
+            if delivered:
+                now = time.monotonic()
+                for _, detected_at in queued:
+                    alert_latency.observe(now - detected_at)
+    
+    @staticmethod
+    def build_digests(messages: List[str]) -> List[str]:
+        """Join messages into as few Telegram-sized texts as possible"""
+        separator = '\n➖➖➖➖➖\n'
+        limit = TELEGRAM_MESSAGE_LIMIT - 64  # room for the digest header
+        digests: List[str] = []
+        current = ''
+        for message in messages:
+            message = truncate_html(message.strip(), limit)
+            candidate = f"{current}{separator}{message}" if current else message
+            if len(candidate) > limit:
+                digests.append(current)
+                current = message
+            else:
+                current = candidate
+        if current:
+            digests.append(current)
+        if len(messages) > 1 and digests:
+            digests[0] = f"📦 <b>{len(messages)} alerts</b>\n\n{digests[0]}"
+        return digests
+    
+    def deliver(self, chat_id: str, text: str) -> bool:
+        """Send one message, retrying with exponential backoff on errors and rate limits"""
+        url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+        data = {'chat_id': chat_id, 'text': text, 'parse_mode': 'HTML'}
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            delay = min(60.0, 2 ** attempt)
+            started = time.monotonic()
+            try:
+                response = self.session.post(url, data=data, timeout=10)
+                telegram_latency.observe(time.monotonic() - started, str(response.status_code))
+                if response.status_code == 200:
+                    self.sent += 1
+                    logger.info("Telegram alert sent successfully")
+                    return True
+                if response.status_code == 429:
+                    delay = retry_after(response, delay)
+                elif response.status_code < 500:
+                    logger.error(f"Failed to send Telegram alert: {response.text}")
+                    return False
+                logger.warning(f"Telegram returned {response.status_code}, retrying in {delay:.1f}s")
+            except requests.RequestException as e:
+                telegram_latency.observe(time.monotonic() - started, 'error')
+                logger.warning(f"Error sending Telegram alert: {e}, retrying in {delay:.1f}s")
+            if attempt < self.max_retries:
+                time.sleep(delay)
+        logger.error("Giving up on Telegram alert after retries")
+        return False
+    
+    def queue_depth(self) -> int:
+        return self.size
+
+ALERT_RULE_FIELDS = frozenset(('name', 'wallets', 'labels', 'chains', 'kinds', 'tokens', 'direction', 'min_value',
+                               'max_value', 'counterparty_allow', 'counterparty_deny', 'cooldown', 'action', 'chat_id'))
+ALERT_RULE_KINDS = ('activity', 'transfer', 'token_transfer')
+
+def event_kind(record: Dict) -> str:
+    """'token_transfer', 'transfer' (native, blocks mode) or 'activity' (nonce change, polling modes)"""
+    if 'token' in record:
+        return 'token_transfer'
+    if 'direction' in record:
+        return 'transfer'
+    return 'activity'
+
+def event_value(record: Dict) -> Optional[float]:
+    """Transferred amount in whole coins or tokens, None for nonce changes which carry no amount"""
+    if 'direction' not in record:
+        return None
+    try:
+        return float(record['value'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def normalize_asset(asset: str) -> str:
+    """Token filter key: NATIVE_ASSET, a lowercase contract address or an upper-case symbol"""
+    asset = str(asset).strip()
+    if ADDRESS_PATTERN.fullmatch(asset):
+        return asset.lower()
+    if asset.lower() == NATIVE_ASSET:
+        return NATIVE_ASSET
+    return asset.upper()
+
+def event_assets(record: Dict) -> Tuple[str, ...]:
+    """Token filter keys an event matches"""
+    if 'token' in record:
+        return (str(record['token_address']).lower(), str(record['token']).upper())
+    return (NATIVE_ASSET,)
+
+def rule_list(spec: Dict, field: str) -> List[str]:
+    """A rule field that takes one string or a list of strings"""
+    value = spec.get(field)
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"'{field}' must be a string or a list of strings")
+    return value
+
+def rule_addresses(spec: Dict, field: str) -> List[str]:
+    addresses = [address.strip().lower() for address in rule_list(spec, field)]
+    for address in addresses:
+        if not ADDRESS_PATTERN.fullmatch(address):
+            raise ValueError(f"invalid address {address!r} in '{field}'")
+    return addresses
+
+class AlertRule:
+    """A compiled rule; wallet, label, chain, token and value bounds are applied by the AlertRuleEngine index"""
+    __slots__ = ('position', 'name', 'action', 'chains', 'kinds', 'direction', 'threshold', 'max_value', 'allow',
+                 'deny', 'cooldown', 'chat_id')
+    
+    def __init__(self, position: int, spec: Dict):
+        unknown = set(spec) - ALERT_RULE_FIELDS
+        if unknown:
+            raise ValueError(f"unknown field(s) {', '.join(sorted(unknown))}")
+        self.position = position  # place in the rules file, which also keys its cooldowns
+        self.name = str(spec.get('name') or f"rule {position + 1}")
+        self.action = spec.get('action', 'alert')
+        if self.action not in ('alert', 'mute'):
+            raise ValueError("'action' must be 'alert' or 'mute'")
+        chains = rule_list(spec, 'chains')
+        for chain in chains:
+            if chain not in CHAINS:
+                raise ValueError(f"unknown chain {chain!r}")
+        self.chains = frozenset(chains) or None
+        kinds = rule_list(spec, 'kinds')
+        for kind in kinds:
+            if kind not in ALERT_RULE_KINDS:
+                raise ValueError(f"'kinds' must be among {', '.join(ALERT_RULE_KINDS)}")
+        self.kinds = frozenset(kinds) or None
+        self.direction = spec.get('direction')
+        if self.direction not in (None, 'in', 'out'):
+            raise ValueError("'direction' must be 'in' or 'out'")
+        min_value = spec.get('min_value')
+        self.threshold = float(min_value) if min_value is not None else float('-inf')
+        self.max_value = float(spec['max_value']) if spec.get('max_value') is not None else None
+        self.allow = frozenset(rule_addresses(spec, 'counterparty_allow')) or None
+        self.deny = frozenset(rule_addresses(spec, 'counterparty_deny'))
+        self.cooldown = float(spec.get('cooldown') or 0)
+        self.chat_id = str(spec['chat_id']) if spec.get('chat_id') else TELEGRAM_CHAT_ID
+    
+    def matches(self, record: Dict, kind: str, value: Optional[float]) -> bool:
+        """Check the filters the index doesn't cover"""
+        if self.chains is not None and record['chain'] not in self.chains:
+            return False
+        if self.kinds is not None and kind not in self.kinds:
+            return False
+        if self.direction is not None and record.get('direction') != self.direction:
+            return False
+        if self.max_value is not None and (value is None or value > self.max_value):
+            return False
+        if self.allow is not None or self.deny:
+            counterparty = (record.get('counterparty') or '').lower()
+            if self.allow is not None and counterparty not in self.allow:
+                return False
+            if counterparty in self.deny:
+                return False
+        return True
+
+RuleBucket = Tuple[List[float], List[AlertRule], List[float], List[AlertRule]]
+
+class AlertRuleEngine:
+    """Picks the chats to alert about each event from the declarative rules in ALERT_RULES_FILE"""
+    def __init__(self, path: str = ALERT_RULES_FILE, default_action: str = ALERT_RULES_DEFAULT,
+                 reload_interval: float = ALERT_RULES_RELOAD):
+        self.path = path
+        self.default_action = default_action
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.specs: List[Dict] = []
+        # (scope kind, scope key) -> token key or '*' -> (ascending min_value thresholds, rules in the same order,
+        # ascending max_value ceilings, rules without min_value in the same order)
+        self.index: Dict[Tuple[str, str], Dict[str, RuleBucket]] = {}
+        self.mtime: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.last_fired: Dict[Tuple[int, str, str], float] = {}  # (rule position, chain, address) -> monotonic time
+    
+    @staticmethod
+    def compile(specs: Any) -> Dict[Tuple[str, str], Dict[str, RuleBucket]]:
+        """Index rules by wallet, label or chain scope and token so an event only visits rules that can match it"""
+        if not isinstance(specs, list):
+            raise ValueError("rules must be a list")
+        buckets: Dict[Tuple[str, str], Dict[str, List[AlertRule]]] = {}
+        for position, spec in enumerate(specs):
+            if not isinstance(spec, dict):
+                raise ValueError(f"rule {position + 1} must be an object")
+            try:
+                rule = AlertRule(position, spec)
+                scopes = [('address', address) for address in rule_addresses(spec, 'wallets')]
+                scopes.extend(('label', label) for label in rule_list(spec, 'labels'))
+                tokens = [normalize_asset(token) for token in rule_list(spec, 'tokens')] or ['*']
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"rule {position + 1}: {e}")
+            if not scopes:
+                scopes = [('chain', chain) for chain in rule.chains] if rule.chains else [('any', '')]
+            for scope in scopes:
+                for token in tokens:
+                    buckets.setdefault(scope, {}).setdefault(token, []).append(rule)
+        index = {}
+        for scope, by_token in buckets.items():
+            index[scope] = {}
+            for token, rules in by_token.items():
+                # Rules bounded only by max_value are bisected on it instead of sitting below every threshold
+                capped = sorted((rule for rule in rules if rule.threshold == float('-inf') and rule.max_value is not None),
+                                key=lambda rule: rule.max_value)
+                floored = sorted((rule for rule in rules if rule.threshold != float('-inf') or rule.max_value is None),
+                                 key=lambda rule: rule.threshold)
+                index[scope][token] = ([rule.threshold for rule in floored], floored,
+                                       [rule.max_value for rule in capped], capped)
+        return index
+    
+    def reload(self, force: bool = False):
+        """Recompile the rules if the file changed; a broken file keeps the previous rules"""
+        now = time.monotonic()
+        if not force and self.checked_at is not None and now - self.checked_at < self.reload_interval:
+            return
+        self.checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self.mtime and not force:
+            return
+        self.mtime = mtime
+        specs = []
+        try:
+            if mtime is not None:
+                with open(self.path) as f:
+                    data = json.load(f)
+                specs = data.get('rules') if isinstance(data, dict) else data
+            index = self.compile(specs)
+        except (OSError, ValueError) as e:
+            logger.error(f"Keeping previous alert rules, {self.path} is invalid: {e}")
+            return
+        with self.lock:
+            self.specs, self.index = specs, index
+        if mtime is not None:
+            logger.info(f"Loaded {len(specs)} alert rules from {self.path}")
+    
+    def save(self, specs: Any):
+        """Validate and atomically replace the rules file, raising ValueError for invalid rules"""
+        self.compile(specs)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'rules': specs}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.reload(force=True)
+    
+    def candidates(self, record: Dict) -> Iterator[AlertRule]:
+        """Rules whose scope and token cover the event and whose min_value it reaches or max_value it stays within"""
+        value = event_value(record)
+        key = value if value is not None else float('-inf')
+        scopes = (('address', record['address'].lower()), ('label', record.get('wallet_label') or ''),
+                  ('chain', record['chain']), ('any', ''))
+        tokens = ('*',) + event_assets(record)
+        index = self.index
+        for scope in scopes:
+            by_token = index.get(scope)
+            if by_token is None:
+                continue
+            for token in tokens:
+                bucket = by_token.get(token)
+                if bucket is not None:
+                    thresholds, rules, ceilings, capped = bucket
+                    yield from itertools.islice(rules, bisect.bisect_right(thresholds, key))
+                    if value is not None:
+                        yield from itertools.islice(capped, bisect.bisect_left(ceilings, value), None)
+    
+    def route(self, record: Dict) -> List[str]:
+        """Chat ids to alert about an activity record, empty if a rule mutes it or every match is cooling down"""
+        self.reload()
+        kind, value = event_kind(record), event_value(record)
+        matched: Dict[int, AlertRule] = {}
+        for rule in self.candidates(record):
+            if id(rule) not in matched and rule.matches(record, kind, value):
+                matched[id(rule)] = rule
+        if not matched:
+            alert_rule_decisions.inc('unmatched')
+            return [TELEGRAM_CHAT_ID] if self.default_action == 'alert' else []
+        if any(rule.action == 'mute' for rule in matched.values()):
+            alert_rule_decisions.inc('muted')
+            return []
+        now = time.monotonic()
+        chats = []
+        with self.lock:
+            for rule in matched.values():
+                if rule.cooldown:
+                    key = (rule.position, record['chain'], record['address'].lower())
+                    fired = self.last_fired.get(key)
+                    if fired is not None and now - fired < rule.cooldown:
+                        continue
+                    self.last_fired[key] = now
+                if rule.chat_id not in chats:
+                    chats.append(rule.chat_id)
+        alert_rule_decisions.inc('alerted' if chats else 'cooldown')
+        return chats
+
+class WalletStateCache:
+    """LRU cache of wallet balance and nonce with TTL and stale-while-revalidate"""
+    def __init__(self, ttl: float = BALANCE_CACHE_TTL, stale: float = BALANCE_CACHE_STALE,
+                 max_entries: int = BALANCE_CACHE_SIZE):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max(1, max_entries)
+        self.entries: OrderedDict = OrderedDict()  # (chain, address) -> entry dict
+        self.lock = threading.Lock()
+        self.revalidate_queue: Dict[Tuple[str, str], WalletInfo] = {}
+        self.revalidate_event = threading.Event()
+        self.revalidator: Optional[threading.Thread] = None
+        # callable(wallets) that fetches and put()s fresh state; only set where the monitor runs, so
+        # web workers leave misses to the monitor's sweeps instead of making RPC calls
+        self.refresh: Optional[Any] = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+    
+    def put(self, wallet: WalletInfo, balance_wei: Optional[int], tx_count: Optional[int],
+            token_balances: Optional[Dict[str, int]] = None, updated_at: Optional[float] = None) -> bool:
+        """Store a wallet's state, read now or at unix time updated_at (when loaded from WalletStore)
+        
+        Returns True when the state changed or hasn't been reported as persisted for half a TTL,
+        i.e. when the caller should write it to the store.
+        """
+        key = (wallet.chain, wallet.address.lower())
+        now = time.monotonic()
+        stored = now - max(0.0, time.time() - updated_at) if updated_at is not None else now
+        token_balances = token_balances or {}  # token contract -> raw balance
+        with self.lock:
+            previous = self.entries.get(key)
+            if updated_at is not None and previous is not None and previous['stored'] >= stored:
+                return False  # already holds something newer
+            persisted = previous['persisted'] if previous is not None else None
+            changed = previous is None or (previous['balance_wei'], previous['tx_count'], previous['tokens']) != (
+                balance_wei, tx_count, token_balances)
+            persist = updated_at is None and (changed or persisted is None or now - persisted > self.ttl / 2)
+            self.entries[key] = {
+                'balance_wei': balance_wei,
+                'tx_count': tx_count,
+                'tokens': token_balances,
+                'stored': stored,
+                'persisted': stored if updated_at is not None or persist else persisted,
+                'updated_at': datetime.fromtimestamp(updated_at) if updated_at is not None else datetime.now()
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return persist
+    
+    def get(self, wallet: WalletInfo) -> Optional[Dict]:
+        """Cached entry for a wallet; stale or missing entries are queued for revalidation if there is a refresher"""
+        key = (wallet.chain, wallet.address.lower())
+        with self.lock:
+            entry = self.entries.get(key)
+            age = time.monotonic() - entry['stored'] if entry else None
+            if entry is not None and age <= self.ttl + self.stale:
+                self.entries.move_to_end(key)
+            else:
+                entry = None
+            if entry is not None and age <= self.ttl:
+                self.hits += 1
+                return entry
+            if entry is not None:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+            if self.refresh is None:
+                return entry
+            self.revalidate_queue[key] = wallet
+        self.start_revalidator()
+        self.revalidate_event.set()
+        return entry
+    
+    def start_revalidator(self):
+        with self.lock:
+            if self.revalidator is None and self.refresh is not None:
+                self.revalidator = threading.Thread(target=self.revalidate_loop, daemon=True)
+                self.revalidator.start()
+    
+    def revalidate_loop(self):
+        while True:
+            self.revalidate_event.wait()
+            self.revalidate_event.clear()
+            with self.lock:
+                wallets = list(self.revalidate_queue.values())
+                self.revalidate_queue.clear()
+            if wallets:
+                try:
+                    self.refresh(wallets)
+                except Exception as e:
+                    logger.error(f"Error revalidating wallet cache: {e}")
+    
+    def stats(self) -> Dict:
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses
+        }
+
+class PriceSource(ABC):
+    """Fetches USD prices for (chain, asset) keys, asset being NATIVE_ASSET or a lowercase token contract"""
+    @abstractmethod
+    def fetch(self, assets: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        """Prices of the assets this source knows; the others are left out"""
+
+class StaticPriceSource(PriceSource):
+    """Prices from a JSON file such as {"ethereum": {"native": 3000, "0xa0b8...": 1.0}}, reloaded when it changes"""
+    def __init__(self, path: str = PRICE_FILE):
+        self.path = path
+        self.mtime: Optional[float] = None
+        self.table: Dict[Tuple[str, str], float] = {}
+    
+    def fetch(self, assets: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        mtime = os.path.getmtime(self.path)
+        if mtime != self.mtime:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.table = {
+                (chain, asset.lower()): float(price)
+                for chain, prices in data.items() for asset, price in prices.items()
+            }
+            self.mtime = mtime
+        return {asset: self.table[asset] for asset in assets if asset in self.table}
+
+class CoinGeckoPriceSource(PriceSource):
+    """CoinGecko simple price API: one request for all native coins and one per chain for token contracts"""
+    TOKEN_CHUNK = 100  # contract addresses per token_price request
+    
+    def __init__(self, api_url: str = PRICE_API_URL, timeout: float = 10):
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+    
+    def get(self, path: str, params: Dict) -> Dict:
+        response = self.session.get(f"{self.api_url}/{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+    
+    def fetch(self, assets: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        prices: Dict[Tuple[str, str], float] = {}
+        natives = {CHAINS[chain]['coingecko_id']: chain for chain, asset in assets if asset == NATIVE_ASSET}
+        if natives:
+            data = self.get('simple/price', {'ids': ','.join(natives), 'vs_currencies': 'usd'})
+            for coin_id, chain in natives.items():
+                if 'usd' in data.get(coin_id, {}):
+                    prices[(chain, NATIVE_ASSET)] = float(data[coin_id]['usd'])
+        tokens: Dict[str, List[str]] = {}
+        for chain, asset in assets:
+            if asset != NATIVE_ASSET:
+                tokens.setdefault(chain, []).append(asset)
+        for chain, contracts in tokens.items():
+            for start in range(0, len(contracts), self.TOKEN_CHUNK):
+                data = self.get(f"simple/token_price/{CHAINS[chain]['coingecko_platform']}", {
+                    'contract_addresses': ','.join(contracts[start:start + self.TOKEN_CHUNK]),
+                    'vs_currencies': 'usd'
+                })
+                for contract, quote in data.items():
+                    if 'usd' in quote:
+                        prices[(chain, contract.lower())] = float(quote['usd'])
+        return prices
+
+PRICE_SOURCES = {'coingecko': CoinGeckoPriceSource, 'static': StaticPriceSource}
+
+def price_source_from_config(name: str = PRICE_SOURCE) -> PriceSource:
+    """Build the configured price source; 'package.module:factory' plugs in a custom one"""
+    if name in PRICE_SOURCES:
+        return PRICE_SOURCES[name]()
+    module_name, _, factory = name.partition(':')
+    if not factory:
+        raise ValueError(f"Unknown PRICE_SOURCE {name!r}")
+    return getattr(importlib.import_module(module_name), factory)()
+
+class PriceCache:
+    """USD prices kept for a TTL; everything missing or expired is fetched in one call to the source"""
+    def __init__(self, source: PriceSource, ttl: float = PRICE_TTL):
+        self.source = source
+        self.ttl = ttl
+        self.entries: Dict[Tuple[str, str], Tuple[float, Optional[float]]] = {}  # asset -> (fetched at, price)
+        self.fetch_lock = threading.Lock()
+        self.retry_at = 0.0  # after a failed fetch, serve what we have until then
+    
+    def prices(self, assets: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[float]]:
+        assets = list(assets)
+        with self.fetch_lock:
+            now = time.monotonic()
+            expired = [asset for asset in assets if asset not in self.entries or now - self.entries[asset][0] > self.ttl]
+            if expired and now >= self.retry_at:
+                try:
+                    fetched = self.source.fetch(expired)
+                except Exception as e:
+                    logger.error(f"Error fetching prices: {e}")
+                    self.retry_at = now + min(self.ttl, 60)
+                else:
+                    for asset in expired:
+                        self.entries[asset] = (now, fetched.get(asset))
+            return {asset: self.entries[asset][1] if asset in self.entries else None for asset in assets}
+
+class PortfolioValuation:
+    """USD value of cached native and token balances, totalled per chain and per label"""
+    def __init__(self, state_cache: WalletStateCache, reader: PortfolioReader, prices: PriceCache):
+        self.state_cache = state_cache
+        self.reader = reader
+        self.prices = prices
+    
+    def totals(self, wallets: Iterable[WalletInfo]) -> Dict:
+        # Flatten cached holdings into parallel columns: raw amount, asset and owning wallet
+        asset_index: Dict[Tuple[str, str], int] = {}
+        amounts: List[float] = []
+        asset_ids: List[int] = []
+        owners: List[WalletInfo] = []
+        uncached = 0
+        for wallet in wallets:
+            entry = self.state_cache.get(wallet)
+            if entry is None:
+                uncached += 1
+                continue
+            holdings = list(entry['tokens'].items())
+            if entry['balance_wei'] is not None:
+                holdings.append((NATIVE_ASSET, entry['balance_wei']))
+            for asset, amount in holdings:
+                amounts.append(float(amount))
+                asset_ids.append(asset_index.setdefault((wallet.chain, asset), len(asset_index)))
+                owners.append(wallet)
+        
+        assets = list(asset_index)
+        prices = self.prices.prices(assets)
+        # Decimals come only from metadata already loaded; tokens still unresolved are left out of the totals
+        decimals = {(chain, NATIVE_ASSET): 18 for chain in CHAINS}
+        for chain, asset in assets:
+            metadata = self.reader.token_metadata.get((chain, asset))
+            if metadata is not None:
+                decimals[(chain, asset)] = metadata['decimals']
+        unresolved = [asset for asset in assets if asset not in decimals]
+        # USD per raw unit of each asset
+        unit_prices = [
+            prices[asset] / 10 ** decimals[asset] if prices[asset] is not None and asset in decimals else None
+            for asset in assets
+        ]
+        chain_names = list(CHAINS)
+        chain_index = {chain: i for i, chain in enumerate(chain_names)}
+        labels = sorted({wallet.label for wallet in owners})
+        label_index = {label: i for i, label in enumerate(labels)}
+        chain_ids = [chain_index[wallet.chain] for wallet in owners]
+        label_ids = [label_index[wallet.label] for wallet in owners]
+        
+        if np is not None and amounts:
+            unit_price_column = np.array([price if price is not None else np.nan for price in unit_prices])
+            values = np.asarray(amounts) * unit_price_column[np.asarray(asset_ids, dtype=np.int64)]
+            priced = ~np.isnan(values)
+            by_chain = np.bincount(np.asarray(chain_ids)[priced], values[priced], len(chain_names)).tolist()
+            by_label = np.bincount(np.asarray(label_ids)[priced], values[priced], len(labels)).tolist()
+        else:
+            by_chain, by_label = [0.0] * len(chain_names), [0.0] * len(labels)
+            for amount, asset_id, chain_id, label_id in zip(amounts, asset_ids, chain_ids, label_ids):
+                if unit_prices[asset_id] is not None:
+                    by_chain[chain_id] += amount * unit_prices[asset_id]
+                    by_label[label_id] += amount * unit_prices[asset_id]
+        return {
+            'currency': 'usd',
+            'total': sum(by_chain),
+            'by_chain': dict(zip(chain_names, by_chain)),
+            'by_label': dict(zip(labels, by_label)),
+            'prices': {f"{chain}:{asset}": price for (chain, asset), price in prices.items()},
+            'unpriced': [f"{chain}:{asset}" for (chain, asset), price in prices.items() if price is None],
+            'unresolved_tokens': [f"{chain}:{asset}" for chain, asset in unresolved],
+            'uncached_wallets': uncached
+        }
+
+def downsample(ts: Any, gwei: Any, start: float, end: float, points: int) -> List[Dict]:
+    """Min, max and last balance per time bucket over [start, end] of sorted timestamp/gwei columns"""
+    width = max(end - start, 1e-9) / points
+    if np is not None:
+        lo, hi = np.searchsorted(ts, start, 'left'), np.searchsorted(ts, end, 'right')
+        ts, gwei = np.asarray(ts[lo:hi]), np.asarray(gwei[lo:hi])
+        if not len(ts):
+            return []
+        buckets = np.minimum(((ts - start) // width).astype(np.int64), points - 1)
+        firsts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        lasts = np.r_[firsts[1:], len(ts)] - 1
+        columns = zip(
+            (start + buckets[firsts] * width).tolist(),
+            (np.minimum.reduceat(gwei, firsts) / GWEI).tolist(),
+            (np.maximum.reduceat(gwei, firsts) / GWEI).tolist(),
+            (gwei[lasts] / GWEI).tolist()
+        )
+    else:
+        lo, hi = bisect.bisect_left(ts, start), bisect.bisect_right(ts, end)
+        rows: List[List[float]] = []
+        current = None
+        for t, value in zip(ts[lo:hi], gwei[lo:hi]):
+            bucket = min(int((t - start) // width), points - 1)
+            if bucket != current:
+                current = bucket
+                rows.append([start + bucket * width, value, value, value])
+            else:
+                row = rows[-1]
+                row[1], row[2], row[3] = min(row[1], value), max(row[2], value), value
+        columns = ((t, low / GWEI, high / GWEI, last / GWEI) for t, low, high, last in rows)
+    return [{'t': t, 'min': low, 'max': high, 'last': last} for t, low, high, last in columns]
+
+class BalanceHistory:
+    """Append-only balance samples per wallet in float64 timestamp and int64 gwei column files, read back memory-mapped
+    
+    Balances are kept in whole gwei rather than float wei, which rounds above 2**53 wei (~0.009 of a coin).
+    """
+    def __init__(self, directory: str = HISTORY_DIR, min_interval: float = HISTORY_MIN_INTERVAL,
+                 flush_interval: float = HISTORY_FLUSH_INTERVAL):
+        self.directory = directory
+        self.min_interval = min_interval
+        self.flush_interval = flush_interval
+        self.pending: Dict[Tuple[str, str], List[Tuple[float, int]]] = {}
+        self.last: Dict[Tuple[str, str], Tuple[float, int]] = {}  # last sample kept per wallet, in gwei
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # one flush at a time, so the writer thread and atexit don't interleave
+        self.writer_thread: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+        self.migrate()
+    
+    def paths(self, chain: str, address: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, f"{chain}_{address.lower()}")
+        return base + '.ts', base + '.gwei'
+    
+    def migrate(self):
+        """Convert balance columns left in the old float64 wei format to int64 gwei"""
+        for name in os.listdir(self.directory):
+            if not name.endswith('.wei'):
+                continue
+            legacy = os.path.join(self.directory, name)
+            target = legacy[:-len('.wei')] + '.gwei'
+            if not os.path.exists(target):
+                wei = array('d')
+                with open(legacy, 'rb') as legacy_file:
+                    data = legacy_file.read()
+                wei.frombytes(data[:len(data) // 8 * 8])
+                temporary = f"{target}.{os.getpid()}.tmp"
+                with open(temporary, 'wb') as target_file:
+                    target_file.write(array('q', [round(value / GWEI) for value in wei]).tobytes())
+                os.replace(temporary, target)
+            try:
+                os.remove(legacy)
+            except FileNotFoundError:
+                pass  # another worker migrated it first
+            logger.info(f"Converted balance history {name} to gwei")
+    
+    def record(self, wallet: WalletInfo, balance_wei: int, now: Optional[float] = None):
+        """Buffer a sample if the balance in gwei changed or the last one is older than min_interval"""
+        now = time.time() if now is None else now
+        key = WalletRegistry.key(wallet.chain, wallet.address)
+        balance_gwei = balance_wei // GWEI
+        with self.lock:
+            last = self.last.get(key)
+            if last is not None and last[1] == balance_gwei and now - last[0] < self.min_interval:
+                return
+            self.last[key] = (now, balance_gwei)
+            self.pending.setdefault(key, []).append((now, balance_gwei))
+    
+    def start(self):
+        """Start the background writer and flush remaining samples at exit"""
+        if self.writer_thread is None:
+            self.writer_thread = threading.Thread(target=self.writer_loop, daemon=True)
+            self.writer_thread.start()
+            atexit.register(self.flush)
+    
+    def writer_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing balance history: {e}")
+    
+    def flush(self) -> int:
+        """Append buffered samples to their column files; returns the number written"""
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            return sum(self.append(chain, address, samples) for (chain, address), samples in pending.items())
+    
+    def append(self, chain: str, address: str, samples: List[Tuple[float, int]]) -> int:
+        """Append the samples newer than a wallet's last stored one, returning how many were written
+        
+        The timestamp file is flock'ed so that other processes, such as the previous owner of a
+        sharded wallet, can't interleave rows or write them out of order.
+        """
+        ts_path, gwei_path = self.paths(chain, address)
+        with open(ts_path, 'a+b') as ts_file, open(gwei_path, 'a+b') as gwei_file:
+            fcntl.flock(ts_file, fcntl.LOCK_EX)
+            kept = []
+            try:
+                rows = min(os.fstat(ts_file.fileno()).st_size, os.fstat(gwei_file.fileno()).st_size) // 8
+                # Cut a row one column got without the other (e.g. a crash mid-append) so both line up again
+                ts_file.truncate(rows * 8)
+                gwei_file.truncate(rows * 8)
+                last = float('-inf')
+                if rows:
+                    ts_file.seek((rows - 1) * 8)
+                    last = array('d', ts_file.read(8))[0]
+                for t, gwei in samples:
+                    if t > last:
+                        kept.append((t, gwei))
+                        last = t
+                if kept:
+                    ts_file.write(array('d', [t for t, _ in kept]).tobytes())
+                    gwei_file.write(array('q', [gwei for _, gwei in kept]).tobytes())
+            finally:
+                fcntl.flock(ts_file, fcntl.LOCK_UN)
+        return len(kept)
+    
+    def columns(self, chain: str, address: str) -> Tuple[Any, Any]:
+        """Timestamp and gwei columns of a wallet, memory-mapped when numpy is available"""
+        ts_path, gwei_path = self.paths(chain, address)
+        if not os.path.exists(ts_path) or not os.path.exists(gwei_path):
+            return [], []
+        # A writer may be mid-append; only read whole rows present in both files
+        rows = min(os.path.getsize(ts_path), os.path.getsize(gwei_path)) // 8
+        if rows == 0:
+            return [], []
+        if np is not None:
+            return (np.memmap(ts_path, dtype='<f8', mode='r', shape=(rows,)),
+                    np.memmap(gwei_path, dtype='<i8', mode='r', shape=(rows,)))
+        ts, gwei = array('d'), array('q')
+        with open(ts_path, 'rb') as ts_file, open(gwei_path, 'rb') as gwei_file:
+            ts.frombytes(ts_file.read(rows * 8))
+            gwei.frombytes(gwei_file.read(rows * 8))
+        return ts, gwei
+    
+    def series(self, chain: str, address: str, start: Optional[float] = None, end: Optional[float] = None,
+               points: int = 500) -> Dict:
+        """Downsampled balance history of a wallet between start and end (unix seconds)"""
+        ts, gwei = self.columns(chain, address)
+        end = end if end is not None else time.time()
+        start = start if start is not None else (float(ts[0]) if len(ts) else end)
+        return {
+            'chain': chain,
+            'symbol': CHAINS[chain]['symbol'],
+            'start': start,
+            'end': end,
+            'samples': len(ts),
+            'points': downsample(ts, gwei, start, end, points) if len(ts) and end > start else []
+        }
+
+class MultiChainWalletTracker:
+    def __init__(self):
+        self.endpoint_pools: Dict[str, EndpointPool] = {}
+        self.rpc_clients: Dict[str, BatchRpcClient] = {}
+        self.portfolio_reader = PortfolioReader(self.rpc_clients)
+        self.alert_dispatcher = AlertDispatcher()
+        self.alert_rules = AlertRuleEngine()
+        self.state_cache = WalletStateCache()
+        self.prices = PriceCache(price_source_from_config())
+        self.valuation = PortfolioValuation(self.state_cache, self.portfolio_reader, self.prices)
+        self.prober_thread: Optional[threading.Thread] = None
+        self.metadata_thread: Optional[threading.Thread] = None
+        self.initialize_connections()
+    
+    def initialize_connections(self):
+        """Build an endpoint pool per chain; no network I/O until first use or probe"""
+        for chain_id, config in CHAINS.items():
+            pool = EndpointPool(chain_id, config['rpc_urls'])
+            self.endpoint_pools[chain_id] = pool
+            self.rpc_clients[chain_id] = BatchRpcClient(pool)
+    
+    def probe_all(self) -> Dict[str, bool]:
+        """Probe every chain's endpoints in parallel and log which chains changed state"""
+        pools = dict(self.endpoint_pools)
+        was_healthy = {chain_id: pool.healthy() for chain_id, pool in pools.items()}
+        with ThreadPoolExecutor(max_workers=max(1, len(pools))) as executor:
+            futures = {chain_id: executor.submit(pool.probe) for chain_id, pool in pools.items()}
+        results = {}
+        for chain_id, future in futures.items():
+            try:
+                results[chain_id] = future.result()
+            except Exception as e:
+                logger.error(f"Error probing {chain_id} endpoints: {e}")
+                results[chain_id] = False
+            name = CHAINS[chain_id]['name']
+            if results[chain_id] and not was_healthy[chain_id]:
+                logger.info(f"Connected to {name}")
+            elif not results[chain_id] and (was_healthy[chain_id] or self.prober_thread is None):
+                logger.error(f"Failed to connect to {name}, will keep retrying")
+        return results
+    
+    def start_prober(self):
+        """Probe endpoints in the background now and every RPC_PROBE_INTERVAL seconds"""
+        if self.prober_thread is None:
+            self.prober_thread = threading.Thread(target=self.probe_loop, daemon=True)
+            self.prober_thread.start()
+    
+    def probe_loop(self):
+        """Periodically re-probe every endpoint so tripped circuits can recover"""
+        while True:
+            self.probe_all()
+            time.sleep(RPC_PROBE_INTERVAL)
+    
+    def start_token_metadata_loader(self):
+        """Resolve the TOKENS_<CHAIN> contracts' symbol and decimals in the background, so valuations need no RPC"""
+        if self.metadata_thread is None and any(config['tokens'] for config in CHAINS.values()):
+            self.metadata_thread = threading.Thread(target=self.token_metadata_loop, daemon=True)
+            self.metadata_thread.start()
+    
+    def token_metadata_loop(self):
+        """Retry every RPC_PROBE_INTERVAL seconds until the metadata of every configured token is known"""
+        while True:
+            unresolved = 0
+            for chain_id, config in CHAINS.items():
+                missing = [token for token in config['tokens'] if (chain_id, token) not in self.portfolio_reader.token_metadata]
+                if not missing:
+                    continue
+                try:
+                    self.portfolio_reader.load_token_metadata(chain_id, missing)
+                except Exception as e:
+                    logger.error(f"Error loading token metadata on {chain_id}: {e}")
+                unresolved += sum((chain_id, token) not in self.portfolio_reader.token_metadata for token in missing)
+            if not unresolved:
+                logger.info("Loaded metadata of all configured tokens")
+                return
+            time.sleep(RPC_PROBE_INTERVAL)
+    
+    def connected_chains(self) -> List[str]:
+        return [chain_id for chain_id, pool in self.endpoint_pools.items() if pool.healthy()]
+    
+    def get_wallet_balance(self, address: str, chain: str) -> Optional[str]:
+        """Get wallet balance"""
+        try:
+            if chain not in self.rpc_clients:
+                return None
+            
+            return format_balance(int(self.rpc_clients[chain].call('eth_getBalance', [address, 'latest']), 16))
+        except Exception as e:
+            logger.error(f"Error getting balance for {address} on {chain}: {e}")
+            return None
+    
+    def get_transaction_count(self, address: str, chain: str) -> Optional[int]:
+        """Get transaction count for address"""
+        try:
+            if chain not in self.rpc_clients:
+                return None
+            
+            return int(self.rpc_clients[chain].call('eth_getTransactionCount', [address, 'latest']), 16)
+        except Exception as e:
+            logger.error(f"Error getting transaction count for {address} on {chain}: {e}")
+            return None
+    
+    def confirmed_block_tag(self, chain: str) -> str:
+        """Block to read nonces at so only changes with CONFIRMATIONS_<CHAIN> blocks on top are seen"""
+        confirmations = CHAINS[chain]['confirmations']
+        if confirmations == 0:
+            return 'latest'
+        head = int(self.rpc_clients[chain].call('eth_blockNumber', []), 16)
+        return hex(max(0, head - confirmations))
+    
+    def send_telegram_alert(self, message: str, detected_at: Optional[float] = None, chat_id: str = TELEGRAM_CHAT_ID):
+        """Queue alert for delivery to Telegram; detected_at (monotonic) feeds the alert latency metric"""
+        if not TELEGRAM_BOT_TOKEN or not chat_id:
+            logger.warning("Telegram credentials not configured")
+            return
+        
+        self.alert_dispatcher.submit(message, chat_id, detected_at)
+    
+    def alert_on(self, record: Dict, message: str, detected_at: Optional[float] = None):
+        """Send an activity alert to the chats the alert rules pick for its record, noting them on the record"""
+        record['alerted_chats'] = self.alert_rules.route(record)
+        for chat_id in record['alerted_chats']:
+            self.send_telegram_alert(message, detected_at, chat_id)
+    
+    def monitor_wallet(self, wallet: WalletInfo):
+        """Monitor a single wallet for changes"""
+        try:
+            # Get current transaction count
+            current_tx_count = self.get_transaction_count(wallet.address, wallet.chain)
+            
+            if current_tx_count is not None:
+                self.process_wallet_state(wallet, current_tx_count)
+            
+            wallet.last_checked = datetime.now()
+            
+        except Exception as e:
+            logger.error(f"Error monitoring wallet {wallet.address}: {e}")
+    
+    def process_wallet_state(self, wallet: WalletInfo, current_tx_count: int, balance_wei: Optional[int] = None):
+        """Compare a freshly fetched nonce against the stored baseline and report changes"""
+        # Check if transaction count changed (new transaction)
+        if wallet.last_tx_hash is None:
+            wallet.last_tx_hash = str(current_tx_count)
+            store.save_wallet_cursor(wallet)
+        elif str(current_tx_count) != wallet.last_tx_hash:
+            # New transaction detected
+            detected_at = time.monotonic()
+            wallet.last_tx_hash = str(current_tx_count)
+            store.save_wallet_cursor(wallet)
+            
+            # Get current balance unless the caller already fetched it
+            if balance_wei is not None:
+                balance = format_balance(balance_wei)
+            else:
+                balance = self.get_wallet_balance(wallet.address, wallet.chain)
+            
+            self.report_activity(wallet, current_tx_count, balance, detected_at)
+    
+    def apply_sweep_results(self, wallets: List[WalletInfo], states: List[Tuple[Optional[int], Optional[int], Dict[str, int]]]):
+        """Process the decode_sweep_results output for the given wallets"""
+        now = datetime.now()
+        for wallet, (tx_count, balance_wei, token_balances) in zip(wallets, states):
+            if tx_count is None:
+                continue
+            self.cache_state(wallet, balance_wei, tx_count, token_balances)
+            if balance_wei is not None:
+                balance_history.record(wallet, balance_wei)
+            try:
+                self.process_wallet_state(wallet, tx_count, balance_wei)
+                wallet.last_checked = now
+            except Exception as e:
+                logger.error(f"Error monitoring wallet {wallet.address}: {e}")
+    
+    def refresh_wallet_states(self, wallets: List[WalletInfo]):
+        """Fetch nonce and balance for the given wallets at the confirmed depth in batches and update the cache"""
+        by_chain: Dict[str, List[WalletInfo]] = {}
+        for wallet in wallets:
+            by_chain.setdefault(wallet.chain, []).append(wallet)
+        for chain, chain_wallets in by_chain.items():
+            client = self.rpc_clients.get(chain)
+            if client is None:
+                continue
+            try:
+                # Same confirmed depth as the sweeps, so cached values don't flip between the two
+                calls = build_sweep_calls(chain, chain_wallets, self.confirmed_block_tag(chain))
+                states = decode_sweep_results(chain, chain_wallets, client.batch(calls))
+            except RpcError as e:
+                # Callers serve what the cache already holds for this chain
+                logger.error(f"Error refreshing {len(chain_wallets)} wallet states on {chain}: {e}")
+                continue
+            for wallet, (tx_count, balance_wei, token_balances) in zip(chain_wallets, states):
+                if tx_count is not None or balance_wei is not None:
+                    self.cache_state(wallet, balance_wei, tx_count, token_balances)
+    
+    def cache_state(self, wallet: WalletInfo, balance_wei: Optional[int], tx_count: Optional[int],
+                    token_balances: Dict[str, int]):
+        """Put fresh state in the cache and, when it changed, in the store for web workers in other processes"""
+        if self.state_cache.put(wallet, balance_wei, tx_count, token_balances):
+            store.save_wallet_state(wallet, balance_wei, tx_count, token_balances)
+    
+    def add_recent_transaction(self, record: Dict):
+        """Append an activity record to the ring buffer, the store and live subscribers"""
+        if shard is not None:
+            # Several workers write activity, so the store assigns ids and the sync loop brings it back here
+            store.record_activity(ActivityEvent(record))
+            return
+        event = activity_log.append(record)
+        store.record_activity(event)
+        event_broker.publish('activity', event.to_dict())
+    
+    def report_activity(self, wallet: WalletInfo, current_tx_count: int, balance: Optional[str],
+                        detected_at: Optional[float] = None):
+        """Record detected activity and send the Telegram alert"""
+        record = {
+            'wallet_label': wallet.label,
+            'address': wallet.address,
+            'chain': wallet.chain,
+            'tx_count': current_tx_count,
+            'balance': balance,
+            'timestamp': datetime.now(),
+            'explorer_url': f"{CHAINS[wallet.chain]['explorer']}/address/{wallet.address}"
+        }
+        self.add_recent_transaction(record)
+        
+        # Send Telegram alert
+        chain_name = CHAINS[wallet.chain]['name']
+        message = f"""
+🔔 <b>Wallet Activity Alert</b>
+
+💼 Wallet: {wallet.label}
+🌐 Chain: {chain_name}
+📍 Address: {wallet.address[:10]}...{wallet.address[-10:]}
+📊 Total Transactions: {current_tx_count}
+💰 Current Balance: {balance} {CHAINS[wallet.chain]['symbol']}
+🔗 <a href="{CHAINS[wallet.chain]['explorer']}/address/{wallet.address}">View on Explorer</a>
+"""
+        self.alert_on(record, message, detected_at)
+        logger.info(f"Activity detected for {wallet.label}")
+    
+    def report_transfer(self, wallet: WalletInfo, tx: Dict, direction: str, detected_at: Optional[float] = None) -> Dict:
+        """Record an incoming or outgoing transaction found in a block and alert on it"""
+        explorer = CHAINS[wallet.chain]['explorer']
+        value = format_balance(int(tx.get('value') or '0x0', 16))
+        counterparty = tx.get('to') if direction == 'out' else tx.get('from')
+        record = {
+            'wallet_label': wallet.label,
+            'address': wallet.address,
+            'chain': wallet.chain,
+            'tx_hash': tx['hash'],
+            'block_number': int(tx['blockNumber'], 16),
+            'direction': direction,
+            'counterparty': counterparty,
+            'value': value,
+            'timestamp': datetime.now(),
+            'explorer_url': f"{explorer}/tx/{tx['hash']}"
+        }
+        self.add_recent_transaction(record)
+        
+        chain_name = CHAINS[wallet.chain]['name']
+        heading = 'Incoming Transfer' if direction == 'in' else 'Outgoing Transaction'
+        message = f"""
+🔔 <b>{heading}</b>
+
+💼 Wallet: {wallet.label}
+🌐 Chain: {chain_name}
+📍 Address: {wallet.address[:10]}...{wallet.address[-10:]}
+🔁 {'From' if direction == 'in' else 'To'}: {counterparty or 'contract creation'}
+💰 Value: {value} {CHAINS[wallet.chain]['symbol']}
+🔗 <a href="{explorer}/tx/{tx['hash']}">View on Explorer</a>
+"""
+        self.alert_on(record, message, detected_at)
+        logger.info(f"{heading} detected for {wallet.label}")
+        return record
+    
+    def report_token_transfer(self, wallet: WalletInfo, log: Dict, direction: str, token: Dict,
+                              detected_at: Optional[float] = None) -> Dict:
+        """Record an ERC-20 Transfer event involving a tracked wallet and alert on it"""
+        explorer = CHAINS[wallet.chain]['explorer']
+        data = log.get('data') or '0x'
+        amount = int(data, 16) if data != '0x' else 0
+        value = format_token_amount(amount, token['decimals'])
+        counterparty = topic_to_address(log['topics'][2] if direction == 'out' else log['topics'][1])
+        record = {
+            'wallet_label': wallet.label,
+            'address': wallet.address,
+            'chain': wallet.chain,
+            'tx_hash': log['transactionHash'],
+            'block_number': int(log['blockNumber'], 16),
+            'direction': direction,
+            'counterparty': counterparty,
+            'value': value,
+            'token': token['symbol'],
+            'token_address': log['address'],
+            'timestamp': datetime.now(),
+            'explorer_url': f"{explorer}/tx/{log['transactionHash']}"
+        }
+        self.add_recent_transaction(record)
+        
+        chain_name = CHAINS[wallet.chain]['name']
+        heading = 'Incoming Token Transfer' if direction == 'in' else 'Outgoing Token Transfer'
+        message = f"""
+🪙 <b>{heading}</b>
+
+💼 Wallet: {wallet.label}
+🌐 Chain: {chain_name}
+📍 Address: {wallet.address[:10]}...{wallet.address[-10:]}
+🔁 {'From' if direction == 'in' else 'To'}: {counterparty}
+💰 Amount: {value} {token['symbol']}
+🔗 <a href="{explorer}/tx/{log['transactionHash']}">View on Explorer</a>
+"""
+        self.alert_on(record, message, detected_at)
+        logger.info(f"{heading} detected for {wallet.label}")
+        return record
+    
+    def retract_transfer(self, record: Dict):
+        """Record that a reported transfer's block was replaced by a reorg and alert the chats that heard about it"""
+        self.add_recent_transaction(dict(record, direction='retracted', timestamp=datetime.now()))
+        
+        chain_name = CHAINS[record['chain']]['name']
+        message = f"""
+↩️ <b>Transfer Dropped by Reorg</b>
+
+💼 Wallet: {record['wallet_label']}
+🌐 Chain: {chain_name}
+📦 Block: {record['block_number']}
+💰 Value: {record['value']} {record.get('token') or CHAINS[record['chain']]['symbol']}
+🔗 <a href="{record['explorer_url']}">Check on Explorer</a>
+"""
+        for chat_id in record.get('alerted_chats', []):
+            self.send_telegram_alert(message, chat_id=chat_id)
+        logger.warning(f"Retracted transfer {record['tx_hash']} for {record['wallet_label']} after a reorg on {chain_name}")
 
-# In-memory storage (replace with database in production)
-tracked_wallets: List[WalletInfo] = []
-recent_transactions: List[Dict] = []
-templates_created = False
+def build_sweep_calls(chain: str, wallets: List[WalletInfo], block: str = 'latest') -> List[Tuple[str, list]]:
+    """Build the lookups for a sweep at a block: one nonce call per wallet, then native and TOKENS_<CHAIN> balances"""
+    assets: List[Optional[str]] = [None] + CHAINS[chain]['tokens']
+    calls = [('eth_getTransactionCount', [wallet.address, block]) for wallet in wallets]
+    calls.extend(balance_calls(chain, [(wallet.address, token) for wallet in wallets for token in assets], block))
+    return calls
 
-class MultiChainWalletTracker:
-    def __init__(self):
-        self.web3_connections = {}
-        self.initialize_connections()
+def decode_sweep_results(chain: str, wallets: List[WalletInfo],
+                         results: List[Any]) -> List[Tuple[Optional[int], Optional[int], Dict[str, int]]]:
+    """(nonce, balance wei, token balances) per wallet from the results of build_sweep_calls, None where a lookup failed"""
+    tokens = CHAINS[chain]['tokens']
+    per_wallet = 1 + len(tokens)
+    tx_counts = [int(result, 16) if result is not None else None for result in results[:len(wallets)]]
+    balances = decode_balances(chain, results[len(wallets):], len(wallets) * per_wallet)
+    states = []
+    for i, tx_count in enumerate(tx_counts):
+        row = balances[i * per_wallet:(i + 1) * per_wallet]
+        states.append((tx_count, row[0], {token: amount for token, amount in zip(tokens, row[1:]) if amount is not None}))
+    return states
+
+class BatchPollingEngine:
+    """Polls tracked wallets per chain with batched nonce and balance lookups"""
+    def __init__(self, tracker: MultiChainWalletTracker):
+        self.tracker = tracker
+        self.next_sweep: Dict[str, float] = {}
     
-    def initialize_connections(self):
-        """Initialize Web3 connections for each chain"""
-        for chain_id, config in CHAINS.items():
+    def sweep_chain(self, chain: str, wallets: List[WalletInfo]):
+        """Fetch nonce and balance for every wallet on a chain in batched POSTs"""
+        client = self.tracker.rpc_clients.get(chain)
+        if client is None or not wallets:
+            return
+        
+        results = client.batch(build_sweep_calls(chain, wallets, self.tracker.confirmed_block_tag(chain)))
+        self.tracker.apply_sweep_results(wallets, decode_sweep_results(chain, wallets, results))
+    
+    def run_once(self) -> float:
+        """Sweep every chain that is due and return seconds until the next one is"""
+        for chain in self.tracker.rpc_clients:
+            if time.monotonic() < self.next_sweep.get(chain, 0):
+                continue
+            started = time.monotonic()
             try:
-                w3 = Web3(Web3.HTTPProvider(config['rpc_url']))
-                if w3.is_connected():
-                    self.web3_connections[chain_id] = w3
-                    logger.info(f"Connected to {config['name']}")
-                else:
-                    logger.error(f"Failed to connect to {config['name']}")
+                self.sweep_chain(chain, list(monitored_wallets(chain)))
+                event_broker.publish('sweep', {'chain': chain, 'checked_at': datetime.now().isoformat()})
             except Exception as e:
-                logger.error(f"Error connecting to {config['name']}: {e}")
+                logger.error(f"Error sweeping {chain}: {e}")
+            sweep_duration.observe(time.monotonic() - started, chain, 'batch')
+            self.next_sweep[chain] = started + CHAINS[chain]['sweep_interval']
+        
+        if not self.next_sweep:
+            return 5.0
+        return max(0.0, min(self.next_sweep.values()) - time.monotonic())
     
-    def get_wallet_balance(self, address: str, chain: str) -> Optional[str]:
-        """Get wallet balance"""
-        try:
-            if chain not in self.web3_connections:
-                return None
-            
-            w3 = self.web3_connections[chain]
-            balance_wei = w3.eth.get_balance(address)
-            balance_eth = w3.from_wei(balance_wei, 'ether')
-            return f"{balance_eth:.6f}"
-        except Exception as e:
-            logger.error(f"Error getting balance for {address} on {chain}: {e}")
-            return None
+    def run_forever(self):
+        """Keep sweeping chains on their configured intervals"""
+        while True:
+            time.sleep(self.run_once())
+
+class ScheduleEntry:
+    """A wallet's current poll interval and when it is next due"""
+    __slots__ = ('wallet', 'interval', 'due')
     
-    def get_transaction_count(self, address: str, chain: str) -> Optional[int]:
-        """Get transaction count for address"""
-        try:
-            if chain not in self.web3_connections:
-                return None
-            
-            w3 = self.web3_connections[chain]
-            return w3.eth.get_transaction_count(address)
-        except Exception as e:
-            logger.error(f"Error getting transaction count for {address} on {chain}: {e}")
-            return None
+    def __init__(self, wallet: WalletInfo, interval: float, due: float):
+        self.wallet = wallet
+        self.interval = interval
+        self.due = due
+
+class AdaptiveScheduler:
+    """Polls wallets from a due-time heap, backing off quiet wallets and speeding up active ones"""
+    def __init__(self, tracker: MultiChainWalletTracker, max_interval: float = SCHEDULER_MAX_INTERVAL,
+                 backoff: float = SCHEDULER_BACKOFF, speedup: float = SCHEDULER_SPEEDUP):
+        self.tracker = tracker
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.speedup = speedup
+        self.entries: Dict[Tuple[str, str], ScheduleEntry] = {}
+        self.heap: List[Tuple[float, int, ScheduleEntry]] = []
+        self.counter = itertools.count()  # tie-breaker so the heap never compares entries
+        self.registry_version: Tuple[int, int] = (-1, -1)
+        self.last_lag = 0.0
+        self.polls = 0
+        self.lock = threading.Lock()
     
-    def send_telegram_alert(self, message: str):
-        """Send alert to Telegram"""
-        if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-            logger.warning("Telegram credentials not configured")
+    def bounds(self, wallet: WalletInfo) -> Tuple[float, float]:
+        """(min, max) poll interval: the wallet's overrides, else the chain's sweep interval and the global cap"""
+        low = wallet.min_interval or CHAINS[wallet.chain]['sweep_interval']
+        if wallet.max_interval:
+            return min(low, wallet.max_interval), wallet.max_interval  # an explicit cap beats the chain default
+        return low, max(low, self.max_interval)
+    
+    def push(self, entry: ScheduleEntry):
+        heapq.heappush(self.heap, (entry.due, next(self.counter), entry))
+    
+    def sync_wallets(self):
+        """Schedule newly tracked (or removed and re-added) wallets immediately and forget removed ones"""
+        if self.registry_version == monitored_version():
             return
-        
+        self.registry_version = monitored_version()
+        now = time.monotonic()
+        with self.lock:
+            current = {WalletRegistry.key(wallet.chain, wallet.address): wallet for wallet in monitored_wallets()}
+            for key in self.entries.keys() - current.keys():
+                del self.entries[key]  # its heap items are skipped when they surface
+            for key, wallet in current.items():
+                entry = self.entries.get(key)
+                if entry is None or entry.wallet is not wallet:
+                    entry = ScheduleEntry(wallet, self.bounds(wallet)[0], now)
+                    self.entries[key] = entry
+                    self.push(entry)
+    
+    def update_wallet(self, wallet: WalletInfo):
+        """Apply changed interval overrides without waiting for the current interval to run out"""
+        with self.lock:
+            entry = self.entries.get(WalletRegistry.key(wallet.chain, wallet.address))
+            if entry is None:
+                return
+            low, high = self.bounds(wallet)
+            entry.interval = min(max(entry.interval, low), high)
+            due = min(entry.due, time.monotonic() + entry.interval)
+            if due != entry.due:
+                entry.due = due
+                self.push(entry)
+    
+    def is_current(self, due: float, entry: ScheduleEntry) -> bool:
+        """Whether a heap item still reflects its entry; stale ones are left behind by reschedules and removals"""
+        return entry.due == due and self.entries.get(WalletRegistry.key(entry.wallet.chain, entry.wallet.address)) is entry
+    
+    def pop_due(self, now: float) -> List[ScheduleEntry]:
+        due_entries = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                due, _, entry = heapq.heappop(self.heap)
+                if self.is_current(due, entry):
+                    due_entries.append(entry)
+        return due_entries
+    
+    def reschedule(self, entry: ScheduleEntry, active: Optional[bool], now: float):
+        """Speed up after activity, back off after a quiet poll, keep the interval when the poll failed"""
+        low, high = self.bounds(entry.wallet)
+        with self.lock:
+            # update_wallet and stats read the interval from other threads
+            if active:
+                entry.interval /= self.speedup
+            elif active is not None:
+                entry.interval *= self.backoff
+            entry.interval = min(max(entry.interval, low), high)
+            entry.due = now + entry.interval
+            self.push(entry)
+    
+    def poll_chain(self, chain: str, entries: List[ScheduleEntry]):
+        """Fetch nonce and balance for the due wallets of one chain in batched POSTs"""
+        wallets = [entry.wallet for entry in entries]
+        baselines = [wallet.last_tx_hash for wallet in wallets]
+        client = self.tracker.rpc_clients.get(chain)
         try:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-            data = {
-                'chat_id': TELEGRAM_CHAT_ID,
-                'text': message,
-                'parse_mode': 'HTML'
-            }
-            response = requests.post(url, data=data, timeout=10)
-            if response.status_code == 200:
-                logger.info("Telegram alert sent successfully")
+            if client is not None:
+                results = client.batch(build_sweep_calls(chain, wallets, self.tracker.confirmed_block_tag(chain)))
             else:
-                logger.error(f"Failed to send Telegram alert: {response.text}")
+                results = None
         except Exception as e:
-            logger.error(f"Error sending Telegram alert: {e}")
+            logger.error(f"Error polling {chain}: {e}")
+            results = None
+        states = decode_sweep_results(chain, wallets, results) if results is not None else None
+        if states is not None:
+            self.tracker.apply_sweep_results(wallets, states)
+        
+        now = time.monotonic()
+        for i, entry in enumerate(entries):
+            if states is None or states[i][0] is None:
+                active = None
+            else:
+                active = baselines[i] is not None and entry.wallet.last_tx_hash != baselines[i]
+            self.reschedule(entry, active, now)
     
-    def monitor_wallet(self, wallet: WalletInfo):
-        """Monitor a single wallet for changes"""
-        try:
-            # Get current transaction count
-            current_tx_count = self.get_transaction_count(wallet.address, wallet.chain)
-            
-            if current_tx_count is not None:
-                # Check if transaction count changed (new transaction)
-                if wallet.last_tx_hash is None:
-                    wallet.last_tx_hash = str(current_tx_count)
-                elif str(current_tx_count) != wallet.last_tx_hash:
-                    # New transaction detected
-                    wallet.last_tx_hash = str(current_tx_count)
-                    
-                    # Get current balance
-                    balance = self.get_wallet_balance(wallet.address, wallet.chain)
-                    
-                    # Add to recent transactions
-                    recent_transactions.append({
-                        'wallet_label': wallet.label,
-                        'address': wallet.address,
-                        'chain': wallet.chain,
-                        'tx_count': current_tx_count,
-                        'balance': balance,
-                        'timestamp': datetime.now(),
-                        'explorer_url': f"{CHAINS[wallet.chain]['explorer']}/address/{wallet.address}"
-                    })
-                    
-                    # Keep only last 50 transactions
-                    if len(recent_transactions) > 50:
-                        recent_transactions.pop(0)
-                    
-                    # Send Telegram alert
-                    chain_name = CHAINS[wallet.chain]['name']
-                    message = f"""
-🔔 <b>Wallet Activity Alert</b>
+    def run_once(self) -> float:
+        """Poll every wallet that is due and return seconds until the next one is"""
+        self.sync_wallets()
+        now = time.monotonic()
+        due_entries = self.pop_due(now)
+        if due_entries:
+            self.last_lag = max(now - entry.due for entry in due_entries)
+            self.polls += len(due_entries)
+            by_chain: Dict[str, List[ScheduleEntry]] = {}
+            for entry in due_entries:
+                by_chain.setdefault(entry.wallet.chain, []).append(entry)
+            for chain, entries in by_chain.items():
+                started = time.monotonic()
+                self.poll_chain(chain, entries)
+                sweep_duration.observe(time.monotonic() - started, chain, 'adaptive')
+        
+        with self.lock:
+            next_due = self.heap[0][0] if self.heap else None
+        if next_due is None:
+            return 1.0
+        return min(1.0, max(0.0, next_due - time.monotonic()))  # wake regularly to pick up new wallets
+    
+    def run_forever(self):
+        """Keep polling wallets as they come due"""
+        while True:
+            try:
+                time.sleep(self.run_once())
+            except Exception as e:
+                logger.error(f"Error in adaptive scheduler: {e}")
+                time.sleep(5)
+    
+    def stats(self) -> Dict:
+        """Queue depth, how far behind schedule polling is, and the spread of poll intervals"""
+        now = time.monotonic()
+        with self.lock:
+            intervals = sorted(entry.interval for entry in self.entries.values())
+            overdue = sum(1 for entry in self.entries.values() if entry.due <= now)
+            oldest_due = min((entry.due for entry in self.entries.values()), default=now)
+        return {
+            'queue_depth': len(intervals),
+            'overdue': overdue,
+            'lag_seconds': round(max(0.0, now - oldest_due), 3),
+            'last_poll_lag_seconds': round(self.last_lag, 3),
+            'polls': self.polls,
+            'interval_min': intervals[0] if intervals else None,
+            'interval_median': intervals[len(intervals) // 2] if intervals else None,
+            'interval_max': intervals[-1] if intervals else None
+        }
 
-💼 Wallet: {wallet.label}
-🌐 Chain: {chain_name}
-📍 Address: {wallet.address[:10]}...{wallet.address[-10:]}
-📊 Total Transactions: {current_tx_count}
-💰 Current Balance: {balance} ETH
-🔗 <a href="{CHAINS[wallet.chain]['explorer']}/address/{wallet.address}">View on Explorer</a>
-"""
-                    self.send_telegram_alert(message)
-                    logger.info(f"Activity detected for {wallet.label}")
+class AsyncChainMonitor:
+    """Polls one chain from its own asyncio task so slow chains don't block others"""
+    def __init__(self, tracker: MultiChainWalletTracker, chain: str, pool: EndpointPool,
+                 session: aiohttp.ClientSession, max_in_flight: int = RPC_MAX_IN_FLIGHT,
+                 timeout: float = RPC_TIMEOUT, batch_size: int = RPC_BATCH_SIZE):
+        self.tracker = tracker
+        self.chain = chain
+        self.pool = pool
+        self.session = session
+        self.semaphore = asyncio.Semaphore(max(1, max_in_flight))
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+    
+    async def post_batch(self, chunk: List[Tuple[str, list]]) -> List[Any]:
+        """Send one batch POST, bounded by the in-flight cap and its own timeout"""
+        payload = [
+            {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+            for i, (method, params) in enumerate(chunk)
+        ]
+        methods = [method for method, _ in chunk]
+        body = None
+        async with self.semaphore:
+            request_started = time.monotonic()
+            # Fail over through the pool, each attempt with its own timeout
+            for endpoint in self.pool.ranked():
+                started = time.monotonic()
+                try:
+                    body = await asyncio.wait_for(self._post(endpoint.url, payload), self.timeout)
+                    if not isinstance(body, list):
+                        raise RpcError(f"Batch request rejected: {body}")
+                except Exception as e:
+                    endpoint.record_failure()
+                    rpc_endpoint_failures.inc(self.chain)
+                    logger.error(f"Batch request to {self.chain} failed: {e!r}")
+                    body = None
+                    continue
+                endpoint.record_success(time.monotonic() - started)
+                break
+        if body is None:
+            record_rpc(self.chain, methods, request_started, methods)
+            return [None] * len(chunk)
+        by_id = {item.get('id'): item for item in body}
+        results = [
+            None if by_id.get(i) is None or 'error' in by_id[i] else by_id[i].get('result')
+            for i in range(len(chunk))
+        ]
+        record_rpc(self.chain, methods, request_started,
+                   [method for method, result in zip(methods, results) if result is None])
+        return results
+    
+    async def _post(self, url: str, payload: list) -> Any:
+        async with self.session.post(url, json=payload) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+    
+    async def sweep(self):
+        """Fetch nonce and balance for all wallets on this chain concurrently"""
+        wallets = list(monitored_wallets(self.chain))
+        if not wallets:
+            return
+        block = 'latest'
+        if CHAINS[self.chain]['confirmations']:
+            head = (await self.post_batch([('eth_blockNumber', [])]))[0]
+            if head is None:
+                raise RpcError(f"eth_blockNumber failed on {self.chain}")
+            block = hex(max(0, int(head, 16) - CHAINS[self.chain]['confirmations']))
+        calls = build_sweep_calls(self.chain, wallets, block)
+        chunks = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        results: List[Any] = []
+        for chunk_results in await asyncio.gather(*(self.post_batch(chunk) for chunk in chunks)):
+            results.extend(chunk_results)
+        # Alert delivery is blocking, keep it off the event loop
+        states = decode_sweep_results(self.chain, wallets, results)
+        await asyncio.to_thread(self.tracker.apply_sweep_results, wallets, states)
+        event_broker.publish('sweep', {'chain': self.chain, 'checked_at': datetime.now().isoformat()})
+    
+    async def run(self):
+        """Sweep this chain forever on its configured interval"""
+        interval = CHAINS[self.chain]['sweep_interval']
+        while True:
+            started = time.monotonic()
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping {self.chain}: {e!r}")
+            sweep_duration.observe(time.monotonic() - started, self.chain, 'async')
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+class TokenTransferScanner:
+    """Finds ERC-20 Transfer logs for tracked wallets, skipping blocks ruled out by logsBloom"""
+    def __init__(self, tracker: MultiChainWalletTracker, topic_chunk: int = LOG_TOPIC_CHUNK):
+        self.tracker = tracker
+        self.topic_chunk = max(1, topic_chunk)
+        self.address_masks: Dict[str, int] = {}  # lowercase address -> bloom mask of its topic
+    
+    def mask_for(self, address: str) -> int:
+        """Cached bloom mask of an address as an indexed topic"""
+        mask = self.address_masks.get(address)
+        if mask is None:
+            mask = bloom_mask(bytes.fromhex(address_to_topic(address)[2:]))
+            self.address_masks[address] = mask
+        return mask
+    
+    def candidate_addresses(self, block: Dict, addresses: List[str]) -> List[str]:
+        """Tracked addresses that may appear in a Transfer log of this block"""
+        bloom = int(block.get('logsBloom') or '0x0', 16)
+        if bloom & TRANSFER_BLOOM_MASK != TRANSFER_BLOOM_MASK:
+            return []
+        return [address for address in addresses if bloom & self.mask_for(address) == self.mask_for(address)]
+    
+    def scan_blocks(self, chain: str, blocks: List[Dict],
+                    wallets_by_address: Dict[str, WalletInfo]) -> List[Tuple[WalletInfo, Dict, str, Dict]]:
+        """Fetch Transfer logs for the blocks whose bloom may match, as (wallet, log, direction, token)"""
+        addresses = list(wallets_by_address)
+        ranges: List[Tuple[int, int, set]] = []
+        for block in blocks:
+            candidates = self.candidate_addresses(block, addresses)
+            if not candidates:
+                continue
+            number = int(block['number'], 16)
+            if ranges and ranges[-1][1] == number - 1:
+                start, _, merged = ranges[-1]
+                ranges[-1] = (start, number, merged | set(candidates))
+            else:
+                ranges.append((number, number, set(candidates)))
+        if not ranges:
+            return []
+        
+        calls = []
+        for start, end, candidates in ranges:
+            topics = [address_to_topic(address) for address in sorted(candidates)]
+            for i in range(0, len(topics), self.topic_chunk):
+                chunk = topics[i:i + self.topic_chunk]
+                block_range = {'fromBlock': hex(start), 'toBlock': hex(end)}
+                calls.append(('eth_getLogs', [dict(block_range, topics=[TRANSFER_TOPIC, chunk])]))
+                calls.append(('eth_getLogs', [dict(block_range, topics=[TRANSFER_TOPIC, None, chunk])]))
+        
+        client = self.tracker.rpc_clients[chain]
+        seen = set()
+        logs = []
+        for result in client.batch(calls):
+            if result is None:
+                raise RpcError(f"eth_getLogs failed on {chain}")
+            for log in result:
+                # ERC-721 shares the Transfer signature but indexes the token id
+                if len(log.get('topics', [])) != 3:
+                    continue
+                key = (log['transactionHash'], log['logIndex'])
+                if key not in seen:
+                    seen.add(key)
+                    logs.append(log)
+        
+        tokens = self.tracker.portfolio_reader.load_token_metadata(chain, {log['address'].lower() for log in logs})
+        matches = []
+        for log in logs:
+            token = tokens[log['address'].lower()]
+            sender = '0x' + log['topics'][1][-40:].lower()
+            recipient = '0x' + log['topics'][2][-40:].lower()
+            if sender in wallets_by_address:
+                matches.append((wallets_by_address[sender], log, 'out', token))
+            if recipient in wallets_by_address and recipient != sender:
+                matches.append((wallets_by_address[recipient], log, 'in', token))
+        return matches
+
+class ScannedBlock:
+    """A recent block kept for reorg detection, with the wallet events found in it"""
+    __slots__ = ('number', 'hash', 'events', 'records', 'fetched_at')
+    
+    def __init__(self, number: int, block_hash: Optional[str], events: List[Tuple],
+                 records: Optional[List[Dict]] = None, fetched_at: Optional[float] = None):
+        self.number = number
+        self.hash = block_hash
+        self.events = events  # (wallet, tx or log, direction, token or None), reported once confirmed
+        self.records = records  # activity records, set once reported
+        self.fetched_at = fetched_at  # monotonic time the block was fetched, feeds the alert latency metric
+    
+    @property
+    def reported(self) -> bool:
+        return self.records is not None
+
+class BlockScanner:
+    """Detects wallet activity by fetching each new block once per chain, reporting it once confirmed
+    
+    When sharding, only the leader worker scans, for every tracked wallet, so blocks are fetched once
+    and the per-chain cursors have a single writer. A worker that becomes leader resumes from them.
+    """
+    def __init__(self, tracker: MultiChainWalletTracker, max_blocks: int = BLOCK_SCAN_MAX_BLOCKS,
+                 track_tokens: bool = TRACK_TOKEN_TRANSFERS, reorg_window: int = REORG_WINDOW):
+        self.tracker = tracker
+        self.max_blocks = max(1, max_blocks)
+        self.token_scanner = TokenTransferScanner(tracker) if track_tokens else None
+        self.reorg_window = max(1, reorg_window)
+        self.cursors: Dict[str, int] = {}  # last reported block per chain
+        self.windows: Dict[str, deque] = {}  # recent ScannedBlocks per chain, oldest first
+        self.next_scan: Dict[str, float] = {}
+        self.index: Dict[str, Dict[str, WalletInfo]] = {}
+        self.index_version = -1
+        self.leading = shard is None  # whether cursors and windows are ours to advance
+    
+    def resume(self, cursors: Dict[str, Tuple[int, Optional[str]]]):
+        """Continue from stored cursors; their hashes catch reorgs that happened while we were down"""
+        for chain, (block_number, block_hash) in cursors.items():
+            self.cursors[chain] = block_number
+            if block_hash is not None:
+                self.windows[chain] = deque([ScannedBlock(block_number, block_hash, [], records=[])])
+    
+    def build_address_index(self) -> Dict[str, Dict[str, WalletInfo]]:
+        """Index tracked wallets by chain and lowercase address, rebuilt only when the registry changes"""
+        if self.index_version != tracked_wallets.version:
+            index: Dict[str, Dict[str, WalletInfo]] = {}
+            for wallet in tracked_wallets.snapshot():
+                index.setdefault(wallet.chain, {})[wallet.address.lower()] = wallet
+            self.index = index
+            self.index_version = tracked_wallets.version
+        return self.index
+    
+    def check_leadership(self) -> bool:
+        """Take over the stored cursors on becoming the shard leader and drop our state on losing it"""
+        leading = shard is None or shard.is_leader()
+        if leading and not self.leading:
+            store.flush()
+            self.cursors.clear()
+            self.windows.clear()
+            self.resume(store.load_chain_cursors())
+            logger.info("Leading the block scan, resuming from the stored cursors")
+        elif self.leading and not leading:
+            self.cursors.clear()
+            self.windows.clear()
+            self.next_scan.clear()
+            logger.info("Another worker leads the block scan now")
+        self.leading = leading
+        return leading
+    
+    def find_events(self, chain: str, blocks: List[Dict], wallets_by_address: Dict[str, WalletInfo]) -> Dict[int, List[Tuple]]:
+        """Native and token transfers involving tracked wallets, by block number"""
+        events: Dict[int, List[Tuple]] = {}
+        for block in blocks:
+            number = int(block['number'], 16)
+            for tx in block.get('transactions', []):
+                sender = (tx.get('from') or '').lower()
+                recipient = (tx.get('to') or '').lower()
+                if sender in wallets_by_address:
+                    events.setdefault(number, []).append((wallets_by_address[sender], tx, 'out', None))
+                if recipient in wallets_by_address and recipient != sender:
+                    events.setdefault(number, []).append((wallets_by_address[recipient], tx, 'in', None))
+        if self.token_scanner is not None and blocks:
+            for wallet, log, direction, token in self.token_scanner.scan_blocks(chain, blocks, wallets_by_address):
+                events.setdefault(int(log['blockNumber'], 16), []).append((wallet, log, direction, token))
+        return events
+    
+    def scan_chain(self, chain: str, wallets_by_address: Dict[str, WalletInfo]) -> bool:
+        """Scan new blocks on a chain; returns True while the chain is still catching up"""
+        client = self.tracker.rpc_clients[chain]
+        head = int(client.call('eth_blockNumber', []), 16)
+        cursor = self.cursors.get(chain)
+        if cursor is None:
+            # Start from the current head on first scan
+            header = client.call('eth_getBlockByNumber', [hex(head), False]) or {}
+            self.resume({chain: (head, header.get('hash'))})
+            store.save_chain_cursor(chain, head, header.get('hash'))
+            return False
+        
+        window = self.windows.setdefault(chain, deque())
+        scanned = window[-1].number if window else cursor
+        if head > scanned:
+            numbers = list(range(scanned + 1, min(head, scanned + self.max_blocks) + 1))
+            blocks = client.batch([('eth_getBlockByNumber', [hex(number), True]) for number in numbers])
+            fetched_at = time.monotonic()
             
-            wallet.last_checked = datetime.now()
+            fetched = []
+            parent = window[-1].hash if window else None
+            for block in blocks:
+                if block is None:
+                    # Retry from this block on the next scan
+                    break
+                if parent is not None and block.get('parentHash') != parent:
+                    self.rewind(chain)
+                    return True
+                parent = block.get('hash')
+                fetched.append(block)
             
+            events = self.find_events(chain, fetched, wallets_by_address)
+            for block in fetched:
+                number = int(block['number'], 16)
+                window.append(ScannedBlock(number, block.get('hash'), events.get(number, []), fetched_at=fetched_at))
+        
+        self.report_confirmed(chain, head - CHAINS[chain]['confirmations'])
+        while len(window) > self.reorg_window and window[0].reported:
+            window.popleft()
+        
+        now = datetime.now()
+        for wallet in wallets_by_address.values():
+            wallet.last_checked = now
+        event_broker.publish('sweep', {'chain': chain, 'checked_at': now.isoformat()})
+        return (window[-1].number if window else self.cursors[chain]) < head
+    
+    def report_confirmed(self, chain: str, confirmed: int):
+        """Report the events of scanned blocks at or below the confirmed height and advance the cursor"""
+        for block in self.windows[chain]:
+            if block.reported:
+                continue
+            if block.number > confirmed:
+                break
+            block.records = [
+                self.tracker.report_token_transfer(wallet, item, direction, token, block.fetched_at) if token is not None
+                else self.tracker.report_transfer(wallet, item, direction, block.fetched_at)
+                for wallet, item, direction, token in block.events
+            ]
+            self.cursors[chain] = block.number
+            store.save_chain_cursor(chain, block.number, block.hash)
+    
+    def rewind(self, chain: str):
+        """Drop scanned blocks the canonical chain no longer contains, retracting any already reported"""
+        window = self.windows[chain]
+        numbers = [block.number for block in window]
+        headers = self.tracker.rpc_clients[chain].batch([('eth_getBlockByNumber', [hex(number), False]) for number in numbers])
+        if any(header is None for header in headers):
+            raise RpcError(f"Could not fetch block headers to resolve a reorg on {chain}")
+        canonical = {number: header.get('hash') for number, header in zip(numbers, headers)}
+        
+        dropped = []
+        while window and canonical[window[-1].number] != window[-1].hash:
+            dropped.append(window.pop())
+        chain_reorgs.inc(chain)
+        if not window:
+            logger.warning(f"Reorg on {chain} is deeper than the {len(dropped)} blocks kept, resuming below them")
+        
+        retracted = 0
+        for block in reversed(dropped):
+            for record in block.records or []:
+                self.tracker.retract_transfer(record)
+                retracted += 1
+        fork = window[-1].number if window else dropped[-1].number - 1
+        if fork < self.cursors[chain]:
+            self.cursors[chain] = fork
+            store.save_chain_cursor(chain, fork, window[-1].hash if window else None)
+        logger.warning(f"Reorg on {chain}: {len(dropped)} blocks above {fork} replaced, {retracted} reported transfers retracted")
+    
+    def run_once(self) -> float:
+        """Scan every chain that is due and return seconds until the next one is"""
+        if not self.check_leadership():
+            return SHARD_HEARTBEAT_INTERVAL
+        index = self.build_address_index()
+        for chain in self.tracker.rpc_clients:
+            if time.monotonic() < self.next_scan.get(chain, 0):
+                continue
+            started = time.monotonic()
+            behind = False
+            try:
+                behind = self.scan_chain(chain, index.get(chain, {}))
+            except Exception as e:
+                logger.error(f"Error scanning blocks on {chain}: {e}")
+            sweep_duration.observe(time.monotonic() - started, chain, 'blocks')
+            # Keep going immediately while catching up
+            self.next_scan[chain] = started if behind else started + CHAINS[chain]['sweep_interval']
+        
+        if not self.next_scan:
+            return 5.0
+        return max(0.0, min(self.next_scan.values()) - time.monotonic())
+    
+    def run_forever(self):
+        """Keep scanning chains on their configured intervals"""
+        while True:
+            time.sleep(self.run_once())
+
+async def async_monitor_main(tracker: MultiChainWalletTracker):
+    """Run one independent polling task per connected chain"""
+    async with aiohttp.ClientSession() as session:
+        monitors = [
+            AsyncChainMonitor(tracker, chain, pool, session)
+            for chain, pool in tracker.endpoint_pools.items()
+        ]
+        await asyncio.gather(*(monitor.run() for monitor in monitors))
+
+def run_async_monitor():
+    """Entry point for MONITOR_MODE=async"""
+    asyncio.run(async_monitor_main(tracker))
+
+# Shared state, created by init_state() so importing the module does no I/O
+store: Optional[WalletStore] = None
+tracker: Optional[MultiChainWalletTracker] = None
+polling_engine: Optional[BatchPollingEngine] = None
+adaptive_scheduler: Optional[AdaptiveScheduler] = None
+block_scanner: Optional[BlockScanner] = None
+balance_history: Optional[BalanceHistory] = None
+monitor_thread: Optional[threading.Thread] = None
+monitor_lock_file = None  # held while this process runs the monitor
+sync_thread: Optional[threading.Thread] = None
+shard: Optional[ShardCoordinator] = None  # set when MONITOR_SHARDING is on
+state_lock = threading.Lock()
+
+def monitored_wallets(chain: Optional[str] = None) -> Tuple[WalletInfo, ...]:
+    """Wallets this process polls: every tracked wallet, or its share when sharding"""
+    if shard is not None:
+        return shard.owned(chain)
+    return tracked_wallets.for_chain(chain) if chain is not None else tracked_wallets.snapshot()
+
+def monitored_version() -> Tuple[int, int]:
+    """Changes whenever monitored_wallets() may return something different"""
+    return tracked_wallets.version, shard.version if shard is not None else 0
+
+def collect_queue_depths() -> Dict[Tuple[str, ...], int]:
+    if tracker is None:
+        return {}
+    depths = {
+        ('alerts',): tracker.alert_dispatcher.queue_depth(),
+        ('store_writes',): store.pending.qsize(),
+        ('cache_revalidation',): len(tracker.state_cache.revalidate_queue)
+    }
+    if MONITOR_MODE == 'adaptive':
+        depths[('scheduler',)] = len(adaptive_scheduler.entries)
+    return depths
+
+def collect_shard_wallets() -> Dict[Tuple[str, ...], int]:
+    if shard is None or not shard.joined:
+        return {}
+    return {(chain_id,): len(shard.owned(chain_id)) for chain_id in CHAINS}
+
+def collect_scheduler_lag() -> Dict[Tuple[str, ...], float]:
+    if MONITOR_MODE != 'adaptive' or adaptive_scheduler is None:
+        return {}
+    return {(): adaptive_scheduler.stats()['lag_seconds']}
+
+def collect_cache_requests() -> Dict[Tuple[str, ...], int]:
+    if tracker is None:
+        return {}
+    cache = tracker.state_cache
+    return {('hit',): cache.hits, ('stale',): cache.stale_hits, ('miss',): cache.misses}
+
+def collect_cache_hit_ratio() -> Dict[Tuple[str, ...], Optional[float]]:
+    requests_by_result = collect_cache_requests()
+    total = sum(requests_by_result.values())
+    if not total:
+        return {}
+    return {(): (requests_by_result[('hit',)] + requests_by_result[('stale',)]) / total}
+
+def collect_endpoint_status(field: str) -> Dict[Tuple[str, ...], Optional[float]]:
+    if tracker is None:
+        return {}
+    values = {}
+    for chain_id, pool in tracker.endpoint_pools.items():
+        for endpoint in pool.endpoints:
+            url = endpoint.status()['url']
+            values[(chain_id, url)] = int(endpoint.available()) if field == 'up' else endpoint.latency
+    return values
+
+def collect_alert_outcomes() -> Dict[Tuple[str, ...], int]:
+    if tracker is None:
+        return {}
+    return {('sent',): tracker.alert_dispatcher.sent, ('dropped',): tracker.alert_dispatcher.dropped}
+
+metrics.callback('wallet_tracker_tracked_wallets', 'Wallets being tracked', labels=('chain',),
+                 collect=lambda: {(chain_id,): len(tracked_wallets.for_chain(chain_id)) for chain_id in CHAINS})
+metrics.callback('wallet_tracker_shard_workers', 'Live monitor workers sharing the wallet set',
+                 collect=lambda: {(): len(shard.members)} if shard is not None and shard.joined else {})
+metrics.callback('wallet_tracker_shard_owned_wallets', 'Wallets this monitor worker owns', labels=('chain',),
+                 collect=collect_shard_wallets)
+metrics.callback('wallet_tracker_activity_events', 'Activity events held in the in-memory log',
+                 collect=lambda: {(): len(activity_log)})
+metrics.callback('wallet_tracker_queue_depth', 'Items waiting in internal queues', labels=('queue',),
+                 collect=collect_queue_depths)
+metrics.callback('wallet_tracker_scheduler_lag_seconds', 'How far the most overdue wallet is behind its poll time',
+                 collect=collect_scheduler_lag)
+metrics.callback('wallet_tracker_alerts_total', 'Telegram alerts by outcome', 'counter', ('outcome',),
+                 collect=collect_alert_outcomes)
+metrics.callback('wallet_tracker_wallet_cache_requests_total', 'Wallet state cache lookups by result', 'counter',
+                 ('result',), collect=collect_cache_requests)
+metrics.callback('wallet_tracker_wallet_cache_hit_ratio', 'Share of cache lookups served fresh or stale',
+                 collect=collect_cache_hit_ratio)
+metrics.callback('wallet_tracker_stream_subscribers', 'Open dashboard event streams',
+                 collect=lambda: {(): event_broker.subscriber_count()})
+metrics.callback('wallet_tracker_rpc_endpoint_up', "Whether an endpoint's circuit breaker is closed",
+                 labels=('chain', 'endpoint'), collect=lambda: collect_endpoint_status('up'))
+metrics.callback('wallet_tracker_rpc_endpoint_latency_seconds', 'Rolling average latency of an endpoint',
+                 labels=('chain', 'endpoint'), collect=lambda: collect_endpoint_status('latency'))
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves /metrics for a monitor process that runs without the web app"""
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int = METRICS_PORT):
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on port {port}")
+
+def init_state():
+    """Open the store, load persisted state and build the tracker; safe to call repeatedly"""
+    global store, tracker, polling_engine, adaptive_scheduler, block_scanner, shard, balance_history
+    with state_lock:
+        if tracker is not None:
+            return
+        
+        # Load persisted state
+        store = WalletStore()
+        tracked_wallets.bulk_import(store.load_wallets())
+        activity_log.load(store.load_recent_activity(activity_log.capacity))
+        activity_log.next_id = max(activity_log.next_id, store.last_activity_id() + 1)
+        store.start()
+        balance_history = BalanceHistory()
+        balance_history.start()
+        if MONITOR_SHARDING:
+            shard = ShardCoordinator(store)
+        
+        # Initialize tracker
+        tracker = MultiChainWalletTracker()
+        load_wallet_states()
+        polling_engine = BatchPollingEngine(tracker)
+        adaptive_scheduler = AdaptiveScheduler(tracker)
+        block_scanner = BlockScanner(tracker)
+        block_scanner.resume(store.load_chain_cursors())
+
+def acquire_monitor_lock() -> bool:
+    """Take the host-wide monitor lock so only one monitor runs against the database"""
+    global monitor_lock_file
+    if monitor_lock_file is not None:
+        return True
+    lock_file = open(MONITOR_LOCK_PATH, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    monitor_lock_file = lock_file
+    return True
+
+wallet_states_seen = 0.0  # newest updated_at loaded from the wallet_states table
+
+def load_wallet_states():
+    """Fill the wallet state cache with balances other processes stored since the last call"""
+    global wallet_states_seen
+    # Rows are timestamped when their batch commits; overlap a little so a slow commit isn't skipped
+    rows = store.load_wallet_states(max(0.0, wallet_states_seen - 2 * STORE_FLUSH_INTERVAL_MS / 1000 - 1))
+    for chain, address, balance_wei, tx_count, token_balances, updated_at in rows:
+        wallet = tracked_wallets.get(chain, address)
+        if wallet is not None:
+            tracker.state_cache.put(wallet, balance_wei, tx_count, token_balances, updated_at)
+        wallet_states_seen = max(wallet_states_seen, updated_at)
+
+def sync_from_store(owns_monitor: bool):
+    """Pick up changes made by other processes sharing the database"""
+    store.flush()  # don't mistake our own queued writes for deletions
+    rows = {WalletRegistry.key(row[1], row[0]): row for row in store.load_wallet_rows()}
+    current = {WalletRegistry.key(wallet.chain, wallet.address): wallet for wallet in tracked_wallets.snapshot()}
+    
+    removed = [tracked_wallets.remove(*key) for key in current.keys() - rows.keys()]
+    added = tracked_wallets.bulk_import([WalletStore.wallet_from_row(rows[key]) for key in rows.keys() - current.keys()])
+    publish_wallet_changes(added, [wallet for wallet in removed if wallet is not None])
+    
+    for key in rows.keys() & current.keys():
+        _, _, label, last_checked, last_tx_hash, min_interval, max_interval = rows[key]
+        wallet = current[key]
+        if (wallet.min_interval, wallet.max_interval) != (min_interval, max_interval):
+            wallet.min_interval, wallet.max_interval = min_interval, max_interval
+            adaptive_scheduler.update_wallet(wallet)
+        if not owns_monitor and (shard is None or not shard.owns(*key)):
+            # The monitor owns cursors; mirror them for the dashboard
+            wallet.label = label
+            wallet.last_checked = datetime.fromisoformat(last_checked)
+            wallet.last_tx_hash = last_tx_hash
+    
+    if not owns_monitor:
+        load_wallet_states()
+        events = store.load_activity_since(activity_log.last_id())
+        activity_log.load(events)
+        for event in events:
+            event_broker.publish('activity', event.to_dict())
+
+def sync_loop():
+    while True:
+        time.sleep(STORE_SYNC_INTERVAL)
+        try:
+            sync_from_store(owns_monitor=monitor_lock_file is not None)
         except Exception as e:
-            logger.error(f"Error monitoring wallet {wallet.address}: {e}")
+            logger.error(f"Error syncing from wallet store: {e}")
 
-# Initialize tracker
-tracker = MultiChainWalletTracker()
+def start_sync_thread():
+    global sync_thread
+    with state_lock:
+        if sync_thread is None:
+            sync_thread = threading.Thread(target=sync_loop, daemon=True)
+            sync_thread.start()
 
 def background_monitor():
     """Background monitoring function"""
+    if MONITOR_MODE == 'batch':
+        polling_engine.run_forever()
+        return
+    if MONITOR_MODE == 'async':
+        run_async_monitor()
+        return
+    if MONITOR_MODE == 'blocks':
+        block_scanner.run_forever()
+        return
+    if MONITOR_MODE == 'adaptive':
+        adaptive_scheduler.run_forever()
+        return
+    
     while True:
         try:
-            for wallet in tracked_wallets:
+            for wallet in monitored_wallets():
                 tracker.monitor_wallet(wallet)
                 time.sleep(5)  # Small delay between wallets
             time.sleep(30)  # Check every 30 seconds
@@ -189,244 +3407,86 @@ def background_monitor():
             logger.error(f"Error in background monitor: {e}")
             time.sleep(60)  # Wait longer on error
 
-# Start background monitoring
-monitor_thread = threading.Thread(target=background_monitor, daemon=True)
-monitor_thread.start()
+def start_monitor_thread() -> bool:
+    """Run the monitor in a background thread of this process, unless another process already does"""
+    global monitor_thread
+    init_state()
+    if monitor_thread is not None:
+        return True
+    if shard is not None:
+        shard.join()
+    elif not acquire_monitor_lock():
+        logger.info("Monitor already running in another process, not starting one here")
+        return False
+    tracker.start_prober()
+    tracker.state_cache.refresh = tracker.refresh_wallet_states
+    monitor_thread = threading.Thread(target=background_monitor, daemon=True)
+    monitor_thread.start()
+    return True
 
-def create_templates():
-    """Create templates directory and basic HTML template"""
-    global templates_created
-    if templates_created:
-        return
+def run_monitor():
+    """Entry point for a dedicated monitor process: `python wallet_tracker_multichain.py monitor`"""
+    init_state()
+    if shard is not None:
+        shard.join()
+    elif not acquire_monitor_lock():
+        logger.error(f"Another monitor holds {MONITOR_LOCK_PATH}, exiting")
+        sys.exit(1)
+    logger.info(f"Starting monitor ({MONITOR_MODE} mode)")
+    if METRICS_PORT:
+        start_metrics_server()
+    results = tracker.probe_all()
+    logger.info(f"Connected chains: {[chain_id for chain_id, healthy in results.items() if healthy]}")
+    tracker.start_prober()
+    tracker.state_cache.refresh = tracker.refresh_wallet_states
+    start_sync_thread()
+    background_monitor()
+
+def create_app() -> Flask:
+    """Build the Flask app; only starts the monitor when RUN_MONITOR_IN_WEB is set"""
+    init_state()
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-production')
+    app.register_blueprint(bp)
+    # Token decimals for /api/portfolio/value, resolved off the request path
+    tracker.start_token_metadata_loader()
     
-    try:
-        # Create templates directory
-        templates_dir = os.path.join(os.path.dirname(__file__), 'templates')
-        os.makedirs(templates_dir, exist_ok=True)
-        
-        # Create basic HTML template
-        html_template = '''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Multi-Chain Wallet Tracker</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <style>
-        .fade-in { animation: fadeIn 0.5s ease-in; }
-        @keyframes fadeIn { from { opacity: 0; } to { opacity: 1; } }
-    </style>
-</head>
-<body class="bg-gray-100 min-h-screen">
-    <div class="container mx-auto px-4 py-8">
-        <h1 class="text-4xl font-bold text-center mb-8 text-gray-800">🔍 Multi-Chain Wallet Tracker</h1>
-        
-        <!-- Status Bar -->
-        <div class="bg-white rounded-lg shadow-md p-4 mb-6">
-            <div class="flex justify-between items-center">
-                <div class="text-sm text-gray-600">
-                    Connected Chains: 
-                    {% for chain_id, chain in chains.items() %}
-                        <span class="inline-block bg-green-100 text-green-800 px-2 py-1 rounded-full text-xs mr-2">{{ chain.name }}</span>
-                    {% endfor %}
-                </div>
-                <div class="text-sm text-gray-600">
-                    Last Updated: <span id="lastUpdate">{{ moment().format('HH:mm:ss') }}</span>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Add Wallet Form -->
-        <div class="bg-white rounded-lg shadow-md p-6 mb-8">
-            <h2 class="text-2xl font-semibold mb-4">➕ Add New Wallet</h2>
-            <form id="addWalletForm" class="grid grid-cols-1 md:grid-cols-4 gap-4">
-                <input type="text" id="address" placeholder="Wallet Address (0x...)" class="px-4 py-2 border rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500" required>
-                <select id="chain" class="px-4 py-2 border rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500" required>
-                    <option value="">Select Chain</option>
-                    <option value="ethereum">Ethereum</option>
-                    <option value="polygon">Polygon</option>
-                    <option value="bsc">BNB Chain</option>
-                </select>
-                <input type="text" id="label" placeholder="Wallet Label" class="px-4 py-2 border rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500" required>
-                <button type="submit" class="bg-blue-500 text-white px-6 py-2 rounded-lg hover:bg-blue-600 transition-colors">Add Wallet</button>
-            </form>
-        </div>
-        
-        <!-- Tracked Wallets -->
-        <div class="bg-white rounded-lg shadow-md p-6 mb-8">
-            <h2 class="text-2xl font-semibold mb-4">👁️ Tracked Wallets ({{ wallets|length }})</h2>
-            <div id="walletsList" class="space-y-4">
-                {% for wallet in wallets %}
-                <div class="border rounded-lg p-4 bg-gray-50 hover:bg-gray-100 transition-colors">
-                    <div class="flex justify-between items-center">
-                        <div class="flex-1">
-                            <h3 class="font-semibold text-lg">{{ wallet.label }}</h3>
-                            <p class="text-gray-600 text-sm font-mono">{{ wallet.address }}</p>
-                            <div class="flex items-center space-x-4 mt-2">
-                                <span class="text-gray-500 text-xs">{{ chains[wallet.chain]['name'] }}</span>
-                                <span class="text-gray-500 text-xs">Last checked: {{ wallet.last_checked.strftime('%H:%M:%S') }}</span>
-                                {% if wallet.last_tx_hash %}
-                                <span class="text-green-600 text-xs">✓ Active</span>
-                                {% endif %}
-                            </div>
-                        </div>
-                        <div class="flex space-x-2">
-                            <a href="{{ chains[wallet.chain]['explorer'] }}/address/{{ wallet.address }}" target="_blank" class="bg-green-500 text-white px-3 py-1 rounded text-sm hover:bg-green-600 transition-colors">View</a>
-                            <button onclick="removeWallet('{{ wallet.address }}', '{{ wallet.chain }}')" class="bg-red-500 text-white px-3 py-1 rounded text-sm hover:bg-red-600 transition-colors">Remove</button>
-                        </div>
-                    </div>
-                </div>
-                {% endfor %}
-                {% if not wallets %}
-                <div class="text-center py-12">
-                    <p class="text-gray-500 text-lg">No wallets being tracked yet</p>
-                    <p class="text-gray-400 text-sm">Add your first wallet above to get started!</p>
-                </div>
-                {% endif %}
-            </div>
-        </div>
-        
-        <!-- Recent Activity -->
-        <div class="bg-white rounded-lg shadow-md p-6">
-            <h2 class="text-2xl font-semibold mb-4">📊 Recent Activity</h2>
-            <div class="space-y-4">
-                {% for tx in recent_transactions %}
-                <div class="border-l-4 border-blue-500 pl-4 py-3 bg-blue-50 rounded-r-lg">
-                    <div class="flex justify-between items-start">
-                        <div class="flex-1">
-                            <h4 class="font-semibold text-lg">{{ tx.wallet_label }}</h4>
-                            <p class="text-sm text-gray-600 capitalize">{{ chains[tx.chain]['name'] }} Network</p>
-                            <div class="flex items-center space-x-4 mt-1">
-                                <span class="text-xs text-gray-500">{{ tx.timestamp.strftime('%Y-%m-%d %H:%M:%S') if tx.timestamp else 'N/A' }}</span>
-                                <span class="text-xs text-gray-500">Transactions: {{ tx.tx_count }}</span>
-                                {% if tx.balance %}
-                                <span class="text-xs text-gray-500">Balance: {{ tx.balance }} ETH</span>
-                                {% endif %}
-                            </div>
-                        </div>
-                        <a href="{{ tx.explorer_url }}" target="_blank" class="text-blue-500 hover:text-blue-700 text-sm font-medium">View Explorer →</a>
-                    </div>
-                </div>
-                {% endfor %}
-                {% if not recent_transactions %}
-                <div class="text-center py-8">
-                    <p class="text-gray-500">No activity detected yet</p>
-                    <p class="text-gray-400 text-sm">Activity will appear here when wallets have new transactions</p>
-                </div>
-                {% endif %}
-            </div>
-        </div>
-        
-        <!-- Footer -->
-        <div class="text-center mt-8 text-gray-500 text-sm">
-            <p>Multi-Chain Wallet Tracker • Monitoring Ethereum, Polygon & BNB Chain</p>
-        </div>
-    </div>
-    
-    <script>
-        // Add wallet form handler
-        document.getElementById('addWalletForm').addEventListener('submit', async function(e) {
-            e.preventDefault();
-            
-            const submitBtn = e.target.querySelector('button[type="submit"]');
-            const originalText = submitBtn.textContent;
-            submitBtn.textContent = 'Adding...';
-            submitBtn.disabled = true;
-            
-            const formData = new FormData();
-            formData.append('address', document.getElementById('address').value);
-            formData.append('chain', document.getElementById('chain').value);
-            formData.append('label', document.getElementById('label').value);
-            
-            try {
-                const response = await fetch('/add_wallet', {
-                    method: 'POST',
-                    body: formData
-                });
-                
-                const result = await response.json();
-                
-                if (result.success) {
-                    alert('✅ Wallet added successfully!');
-                    location.reload();
-                } else {
-                    alert('❌ Error: ' + result.error);
-                }
-            } catch (error) {
-                alert('❌ Error adding wallet: ' + error.message);
-            } finally {
-                submitBtn.textContent = originalText;
-                submitBtn.disabled = false;
-            }
-        });
-        
-        // Remove wallet function
-        async function removeWallet(address, chain) {
-            if (!confirm('Are you sure you want to remove this wallet from tracking?')) return;
-            
-            try {
-                const response = await fetch('/remove_wallet', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({ address, chain })
-                });
-                
-                const result = await response.json();
-                
-                if (result.success) {
-                    alert('✅ Wallet removed successfully!');
-                    location.reload();
-                } else {
-                    alert('❌ Error: ' + result.error);
-                }
-            } catch (error) {
-                alert('❌ Error removing wallet: ' + error.message);
-            }
-        }
-        
-        // Update last update time
-        function updateTime() {
-            const now = new Date();
-            document.getElementById('lastUpdate').textContent = now.toLocaleTimeString();
-        }
-        
-        // Auto-refresh every 60 seconds
-        setInterval(() => {
-            location.reload();
-        }, 60000);
-        
-        // Update time every second
-        setInterval(updateTime, 1000);
-    </script>
-</body>
-</html>'''
-        
-        # Write template file
-        template_path = os.path.join(templates_dir, 'index.html')
-        with open(template_path, 'w') as f:
-            f.write(html_template)
-        
-        templates_created = True
-        logger.info("Templates created successfully")
-        
-    except Exception as e:
-        logger.error(f"Error creating templates: {e}")
+    if RUN_MONITOR_IN_WEB:
+        start_monitor_thread()
+    # Wallets added here reach the monitor, and its activity reaches us, through the store
+    start_sync_thread()
+    return app
 
 # Routes
-@app.route('/')
+bp = Blueprint('wallet_tracker', __name__)
+
+@bp.route('/')
 def index():
-    """Main dashboard"""
-    # Ensure templates are created
-    create_templates()
+    """Main dashboard, one page of wallets matching the `q` search and `chain` filter at a time"""
+    chain = request.args.get('chain') if request.args.get('chain') in CHAINS else None
+    search = request.args.get('q', '').strip()
+    try:
+        after = parse_wallet_cursor(request.args.get('after'))
+        before = parse_wallet_cursor(request.args.get('before'))
+    except ValueError:
+        after = before = None
+    wallets, more = wallet_page(after, before, chain, wallet_matcher(None, search), DASHBOARD_PAGE_SIZE)
+    # Coming back from a later page means there is a next one, and vice versa
+    has_next = bool(wallets) and (more if before is None else True)
+    has_prev = bool(wallets) and (more if before is not None else after is not None)
     
     return render_template('index.html', 
-                         wallets=tracked_wallets, 
+                         wallets=wallets, 
+                         total_wallets=len(tracked_wallets),
+                         search=search,
+                         chain_filter=chain,
+                         next_cursor=wallet_cursor(wallets[-1]) if has_next else None,
+                         prev_cursor=wallet_cursor(wallets[0]) if has_prev else None,
+                         page_size=DASHBOARD_PAGE_SIZE,
                          chains=CHAINS,
-                         recent_transactions=recent_transactions[-10:])  # Show last 10 transactions
+                         recent_transactions=activity_log.query(limit=10)[::-1])  # Show last 10 transactions, newest first
 
-@app.route('/add_wallet', methods=['POST'])
+@bp.route('/add_wallet', methods=['POST'])
 def add_wallet():
     """Add a new wallet to track"""
     try:
@@ -444,19 +3504,17 @@ def add_wallet():
         if not Web3.is_address(address):
             return jsonify({'error': 'Invalid wallet address format'}), 400
         
-        # Check if wallet already exists
-        for wallet in tracked_wallets:
-            if wallet.address.lower() == address.lower() and wallet.chain == chain:
-                return jsonify({'error': 'Wallet already being tracked'}), 400
-        
-        # Add new wallet
+        # Add new wallet unless it already exists
         new_wallet = WalletInfo(
             address=Web3.to_checksum_address(address),
             chain=chain,
             label=label,
             last_checked=datetime.now()
         )
-        tracked_wallets.append(new_wallet)
+        if not tracked_wallets.add(new_wallet):
+            return jsonify({'error': 'Wallet already being tracked'}), 400
+        store.save_wallet(new_wallet)
+        event_broker.publish('wallet_added', wallet_event(new_wallet))
         
         # Send welcome message
         if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
@@ -473,13 +3531,13 @@ You'll receive alerts when this wallet has new activity!
             tracker.send_telegram_alert(welcome_message)
         
         logger.info(f"Added wallet: {label} ({address}) on {chain}")
-        return jsonify({'success': True, 'message': 'Wallet added successfully'})
+        return jsonify({'success': True, 'message': 'Wallet added successfully', 'wallet': wallet_event(new_wallet)})
         
     except Exception as e:
         logger.error(f"Error adding wallet: {e}")
         return jsonify({'error': 'Failed to add wallet'}), 500
 
-@app.route('/remove_wallet', methods=['POST'])
+@bp.route('/remove_wallet', methods=['POST'])
 def remove_wallet():
     """Remove a wallet from tracking"""
     try:
@@ -490,62 +3548,530 @@ def remove_wallet():
             return jsonify({'error': 'Address and chain are required'}), 400
         
         # Find and remove wallet
-        for i, wallet in enumerate(tracked_wallets):
-            if wallet.address.lower() == address.lower() and wallet.chain == chain:
-                removed_wallet = tracked_wallets.pop(i)
-                logger.info(f"Removed wallet: {removed_wallet.label}")
-                return jsonify({'success': True, 'message': 'Wallet removed successfully'})
+        removed_wallet = tracked_wallets.remove(chain, address)
+        if removed_wallet is None:
+            return jsonify({'error': 'Wallet not found'}), 404
         
-        return jsonify({'error': 'Wallet not found'}), 404
+        store.delete_wallet(removed_wallet.chain, removed_wallet.address)
+        event_broker.publish('wallet_removed', {'address': removed_wallet.address, 'chain': removed_wallet.chain})
+        logger.info(f"Removed wallet: {removed_wallet.label}")
+        return jsonify({'success': True, 'message': 'Wallet removed successfully'})
         
     except Exception as e:
         logger.error(f"Error removing wallet: {e}")
         return jsonify({'error': 'Failed to remove wallet'}), 500
 
-@app.route('/api/wallets')
-def get_wallets():
-    """API endpoint to get all tracked wallets"""
-    wallets_data = []
-    for wallet in tracked_wallets:
-        # Get current balance
-        balance = tracker.get_wallet_balance(wallet.address, wallet.chain)
-        tx_count = tracker.get_transaction_count(wallet.address, wallet.chain)
-        
-        wallets_data.append({
-            'address': wallet.address,
-            'chain': wallet.chain,
-            'label': wallet.label,
-            'last_checked': wallet.last_checked.isoformat(),
-            'last_tx_hash': wallet.last_tx_hash,
-            'balance': balance,
-            'tx_count': tx_count
+@bp.route('/api/wallets/schedule', methods=['POST'])
+def set_wallet_schedule():
+    """Set or clear a wallet's min/max poll interval in seconds for 'adaptive' mode"""
+    data = request.get_json(silent=True) or {}
+    wallet = tracked_wallets.get(str(data.get('chain', '')).strip(), str(data.get('address', '')).strip())
+    if wallet is None:
+        return jsonify({'error': 'Wallet not found'}), 404
+    
+    try:
+        min_interval = float(data['min_interval']) if data.get('min_interval') is not None else None
+        max_interval = float(data['max_interval']) if data.get('max_interval') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Intervals must be numbers of seconds'}), 400
+    if any(value is not None and value <= 0 for value in (min_interval, max_interval)):
+        return jsonify({'error': 'Intervals must be positive'}), 400
+    if min_interval is not None and max_interval is not None and min_interval > max_interval:
+        return jsonify({'error': 'min_interval must not exceed max_interval'}), 400
+    
+    wallet.min_interval, wallet.max_interval = min_interval, max_interval
+    store.save_wallet_schedule(wallet)
+    adaptive_scheduler.update_wallet(wallet)
+    return jsonify({'success': True, 'min_interval': min_interval, 'max_interval': max_interval})
+
+@bp.route('/api/alert_rules', methods=['GET', 'POST'])
+def alert_rules():
+    """Show the alert rules, or replace them with the `rules` list of a JSON body"""
+    engine = tracker.alert_rules
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        specs = data.get('rules') if isinstance(data, dict) else data
+        try:
+            engine.save(specs)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        engine.reload()
+    return jsonify({'rules': engine.specs, 'default_action': engine.default_action})
+
+def parse_wallet_rows(stream: Iterable[str], fmt: str) -> Iterator[Tuple[int, Optional[Dict]]]:
+    """Lazily yield (line number, row) pairs from a CSV or NDJSON upload; unparseable rows are None"""
+    if fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+        return
+    
+    reader = csv.reader(stream)
+    for line_number, values in enumerate(reader, start=1):
+        if not values:
+            continue
+        if line_number == 1 and values[0].strip().lower() == 'address':
+            continue  # header row
+        yield line_number, dict(zip(('address', 'chain', 'label'), values))
+
+def validate_wallet_rows(rows: List[Tuple[int, Optional[Dict]]]) -> Tuple[List[WalletInfo], List[Dict]]:
+    """Validate a chunk of rows, returning wallets and per-line errors
+    
+    Chain and address shape are checked for the whole chunk first. A keccak checksum is then only
+    computed once per address that isn't tracked yet, and only mixed-case addresses are verified
+    against it.
+    """
+    errors = []
+    shaped: List[Tuple[int, str, str, str]] = []
+    for line_number, row in rows:
+        if row is None:
+            errors.append({'line': line_number, 'error': 'Invalid JSON object'})
+            continue
+        address = str(row.get('address') or '').strip()
+        chain = str(row.get('chain') or '').strip().lower()
+        label = str(row.get('label') or '').strip() or f"{address[:10]}..."
+        if chain not in CHAINS:
+            errors.append({'line': line_number, 'error': 'Invalid chain'})
+        elif not ADDRESS_PATTERN.fullmatch(address):
+            errors.append({'line': line_number, 'error': 'Invalid wallet address format'})
+        else:
+            shaped.append((line_number, address, chain, label))
+    
+    wallets = []
+    checksummed: Dict[Tuple[str, str], str] = {}  # registry key -> checksummed address, for repeats
+    now = datetime.now()
+    for line_number, address, chain, label in shaped:
+        key = WalletRegistry.key(chain, address)
+        mixed_case = not (address[2:].islower() or address[2:].isupper())
+        if key not in checksummed:
+            tracked = tracked_wallets.get(chain, address)
+            checksummed[key] = tracked.address if tracked is not None else Web3.to_checksum_address(address)
+        if mixed_case and address != checksummed[key]:
+            errors.append({'line': line_number, 'error': 'Invalid address checksum'})
+            continue
+        wallets.append(WalletInfo(address=checksummed[key], chain=chain, label=label, last_checked=now))
+    errors.sort(key=lambda error: error['line'])
+    return wallets, errors
+
+@bp.route('/api/wallets/import', methods=['POST'])
+def import_wallets():
+    """Bulk-add wallets from a CSV or NDJSON upload of (address, chain, label)"""
+    try:
+        upload = request.files.get('file')
+        filename = (upload.filename if upload else '') or ''
+        fmt = request.args.get('format') or ('ndjson' if filename.endswith(('.ndjson', '.jsonl')) or
+                                             'ndjson' in (request.content_type or '') else 'csv')
+        if fmt not in ('csv', 'ndjson'):
+            return jsonify({'error': 'Format must be csv or ndjson'}), 400
+        
+        raw = upload.stream if upload else request.stream
+        stream = io.TextIOWrapper(raw, encoding='utf-8', errors='replace', newline='')
+        
+        imported = duplicates = invalid = 0
+        errors: List[Dict] = []
+        chunk: List[Tuple[int, Optional[Dict]]] = []
+        
+        def flush_chunk():
+            nonlocal imported, duplicates, invalid
+            wallets, chunk_errors = validate_wallet_rows(chunk)
+            added = tracked_wallets.bulk_import(wallets)
+            for wallet in added:
+                store.save_wallet(wallet)
+            publish_wallet_changes(added, [])
+            imported += len(added)
+            duplicates += len(wallets) - len(added)
+            invalid += len(chunk_errors)
+            errors.extend(chunk_errors[:max(0, 20 - len(errors))])
+            chunk.clear()
+        
+        for row in parse_wallet_rows(stream, fmt):
+            chunk.append(row)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                flush_chunk()
+        flush_chunk()
+        
+        # One summary notification per import
+        if imported and TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
+            tracker.send_telegram_alert(f"""
+📥 <b>Bulk Import Complete</b>
+
+✅ Added: {imported}
+♻️ Already tracked: {duplicates}
+⚠️ Invalid rows: {invalid}
+""")
+        
+        logger.info(f"Imported {imported} wallets ({duplicates} duplicates, {invalid} invalid)")
+        return jsonify({
+            'success': True,
+            'imported': imported,
+            'duplicates': duplicates,
+            'invalid': invalid,
+            'errors': errors
         })
-    return jsonify(wallets_data)
+        
+    except Exception as e:
+        logger.error(f"Error importing wallets: {e}")
+        return jsonify({'error': 'Failed to import wallets'}), 500
+
+@bp.route('/api/wallets/export')
+def export_wallets():
+    """Stream every tracked wallet as CSV or NDJSON"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+    wallets = tracked_wallets.snapshot()
+    
+    def generate_ndjson():
+        for wallet in wallets:
+            yield json.dumps({'address': wallet.address, 'chain': wallet.chain, 'label': wallet.label}) + '\n'
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('address', 'chain', 'label'))
+        for i, wallet in enumerate(wallets, start=1):
+            writer.writerow((wallet.address, wallet.chain, wallet.label))
+            if i % 1000 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    if fmt == 'ndjson':
+        return Response(generate_ndjson(), mimetype='application/x-ndjson',
+                        headers={'Content-Disposition': 'attachment; filename=wallets.ndjson'})
+    return Response(generate_csv(), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=wallets.csv'})
+
+WALLET_FIELDS = ('address', 'chain', 'label', 'last_checked', 'last_tx_hash', 'min_interval', 'max_interval',
+                 'balance', 'tx_count', 'cached_at')
+CACHED_WALLET_FIELDS = frozenset(('balance', 'tx_count', 'cached_at'))  # fields that need a wallet state cache lookup
+
+def wallet_cursor(wallet: WalletInfo) -> str:
+    return f"{wallet.chain}:{wallet.address.lower()}"
+
+def parse_wallet_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Registry key of an `after` or `before` cursor, raising ValueError if it is malformed"""
+    if not cursor:
+        return None
+    chain, _, address = cursor.partition(':')
+    if chain not in CHAINS or not ADDRESS_PATTERN.fullmatch(address):
+        raise ValueError('Cursors look like chain:address')
+    return WalletRegistry.key(chain, address)
+
+def wallet_matcher(label: Optional[str], search: Optional[str]) -> Optional[Callable[[WalletInfo], bool]]:
+    """Filter for an exact label and a case-insensitive search of label and address, None if neither is set"""
+    search = search.lower() if search else None
+    if not label and not search:
+        return None
+    
+    def match(wallet: WalletInfo) -> bool:
+        if label and wallet.label != label:
+            return False
+        return search is None or search in wallet.label.lower() or search in wallet.address.lower()
+    return match
+
+def wallet_page(after: Optional[Tuple[str, str]], before: Optional[Tuple[str, str]], chain: Optional[str],
+                match: Optional[Callable[[WalletInfo], bool]], limit: int) -> Tuple[List[WalletInfo], bool]:
+    """Up to limit wallets in key order next to a cursor, and whether more lie beyond them"""
+    page = list(itertools.islice(tracked_wallets.scan(after, before, chain, match), limit + 1))
+    more = len(page) > limit
+    del page[limit:]
+    if before is not None:
+        page.reverse()
+    return page, more
+
+def parse_fields(value: Optional[str], allowed: Optional[Tuple[str, ...]] = None) -> Optional[List[str]]:
+    """Names from a comma-separated `fields` argument, None for all fields"""
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if allowed is not None and field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def select_fields(row: Dict, fields: Optional[List[str]]) -> Dict:
+    return row if fields is None else {field: row[field] for field in fields if field in row}
+
+def wallet_rows(wallets: Iterable[WalletInfo], fields: Optional[List[str]], fresh: bool = False) -> Iterator[Dict]:
+    """API rows for wallets, taken STREAM_CHUNK_ROWS at a time and refreshed in batches first if fresh"""
+    cached = fields is None or not CACHED_WALLET_FIELDS.isdisjoint(fields)
+    wallets = iter(wallets)
+    while True:
+        chunk = list(itertools.islice(wallets, STREAM_CHUNK_ROWS))
+        if not chunk:
+            return
+        if fresh:
+            tracker.refresh_wallet_states(chunk)
+        for wallet in chunk:
+            entry = tracker.state_cache.get(wallet) if cached else None
+            balance_wei = entry['balance_wei'] if entry else None
+            yield select_fields({
+                'address': wallet.address,
+                'chain': wallet.chain,
+                'label': wallet.label,
+                'last_checked': wallet.last_checked.isoformat(),
+                'last_tx_hash': wallet.last_tx_hash,
+                'min_interval': wallet.min_interval,
+                'max_interval': wallet.max_interval,
+                'balance': format_balance(balance_wei) if balance_wei is not None else None,
+                'tx_count': entry['tx_count'] if entry else None,
+                'cached_at': entry['updated_at'].isoformat() if entry else None
+            }, fields)
+
+def stream_rows(rows: Iterable[Dict], fmt: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Stream rows as one JSON array or as NDJSON lines, STREAM_CHUNK_ROWS rows per write"""
+    def generate():
+        parts = ['['] if fmt == 'json' else []
+        for i, row in enumerate(rows):
+            if fmt == 'json':
+                parts.append(',' + json.dumps(row) if i else json.dumps(row))
+            else:
+                parts.append(json.dumps(row) + '\n')
+            if len(parts) >= STREAM_CHUNK_ROWS:
+                yield ''.join(parts)
+                parts = []
+        if fmt == 'json':
+            parts.append(']')
+        yield ''.join(parts)
+    
+    mimetype = 'application/json' if fmt == 'json' else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype, headers=headers)
+
+@bp.route('/api/wallets')
+def get_wallets():
+    """Tracked wallets in (chain, address) order, served from the wallet state cache
+    
+    Streams every wallet matching `chain`, `label` and `q` unless `limit` asks for one page; the
+    `X-Next-Cursor` header then holds the `after` value for the following page (`X-Prev-Cursor` the
+    `before` value when paging back). `fields` picks columns, `format=ndjson` gives one wallet per line.
+    `fresh=1` re-reads the wallets over RPC first; chains whose endpoints fail are served from the cache.
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'ndjson'):
+        return jsonify({'error': 'Format must be json or ndjson'}), 400
+    chain = request.args.get('chain') or None
+    if chain is not None and chain not in CHAINS:
+        return jsonify({'error': 'Invalid chain selected'}), 400
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'), WALLET_FIELDS)
+        after = parse_wallet_cursor(request.args.get('after'))
+        before = parse_wallet_cursor(request.args.get('before'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    match = wallet_matcher(request.args.get('label'), request.args.get('q'))
+    fresh = request.args.get('fresh') == '1'
+    
+    if limit is None and before is None:
+        return stream_rows(wallet_rows(tracked_wallets.scan(after, None, chain, match), fields, fresh), fmt)
+    
+    limit = min(max(limit if limit is not None else WALLET_PAGE_LIMIT, 1), WALLET_PAGE_LIMIT)
+    wallets, more = wallet_page(after, before, chain, match, limit)
+    headers = {}
+    if more and wallets:
+        if before is None:
+            headers['X-Next-Cursor'] = wallet_cursor(wallets[-1])
+        else:
+            headers['X-Prev-Cursor'] = wallet_cursor(wallets[0])
+    return stream_rows(wallet_rows(wallets, fields, fresh), fmt, headers)
+
+@bp.route('/api/wallets/<address>/history')
+def get_wallet_history(address):
+    """Downsampled balance history of a wallet on each chain it is tracked on
+    
+    Optional `chain`, `start` and `end` (unix seconds) narrow the range; `points` sets the number of buckets.
+    """
+    if not ADDRESS_PATTERN.fullmatch(address):
+        return jsonify({'error': 'Invalid wallet address format'}), 400
+    chain = request.args.get('chain') or None
+    if chain is not None and chain not in CHAINS:
+        return jsonify({'error': 'Invalid chain selected'}), 400
+    try:
+        start = float(request.args['start']) if request.args.get('start') else None
+        end = float(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'start and end must be unix timestamps'}), 400
+    if any(bound is not None and not math.isfinite(bound) for bound in (start, end)):
+        return jsonify({'error': 'start and end must be unix timestamps'}), 400
+    if start is not None and end is not None and start >= end:
+        return jsonify({'error': 'start must be before end'}), 400
+    try:
+        points = min(max(int(request.args.get('points', 500)), 1), HISTORY_MAX_POINTS)
+    except ValueError:
+        return jsonify({'error': 'points must be an integer'}), 400
+    
+    chains = [chain] if chain is not None else list(CHAINS)
+    wallets = [wallet for wallet in (tracked_wallets.get(chain_id, address) for chain_id in chains) if wallet is not None]
+    if not wallets:
+        return jsonify({'error': 'Wallet not found'}), 404
+    return jsonify({
+        'address': wallets[0].address,
+        'series': [balance_history.series(wallet.chain, wallet.address, start, end, points) for wallet in wallets]
+    })
+
+@bp.route('/api/portfolio')
+def get_portfolio():
+    """Live native and ERC-20 balances of the tracked wallets on one chain
+    
+    `tokens` is a comma-separated list of token contracts; it defaults to the chain's TOKENS_<CHAIN>.
+    Optionally narrowed to one `address` or `label`.
+    """
+    chain = request.args.get('chain', '')
+    if chain not in CHAINS:
+        return jsonify({'error': 'Invalid chain selected'}), 400
+    if chain not in tracker.rpc_clients:
+        return jsonify({'error': f"{CHAINS[chain]['name']} is not connected"}), 503
+    tokens_arg = request.args.get('tokens')
+    tokens = [token.strip() for token in tokens_arg.split(',') if token.strip()] if tokens_arg is not None else CHAINS[chain]['tokens']
+    if any(not ADDRESS_PATTERN.fullmatch(token) for token in tokens):
+        return jsonify({'error': 'Invalid token address format'}), 400
+    
+    wallets = list(tracked_wallets.for_chain(chain))
+    address = request.args.get('address')
+    if address:
+        wallets = [wallet for wallet in wallets if wallet.address.lower() == address.lower()]
+    label = request.args.get('label')
+    if label:
+        wallets = [wallet for wallet in wallets if wallet.label == label]
+    try:
+        snapshot = tracker.portfolio_reader.snapshot(chain, wallets, tokens)
+    except Exception as e:
+        logger.error(f"Error reading {chain} portfolio: {e}")
+        return jsonify({'error': 'RPC request failed'}), 502
+    
+    prices = tracker.prices.prices([(chain, NATIVE_ASSET)] + [(chain, token.lower()) for token in tokens])
+    for row in snapshot:
+        native_price = prices[(chain, NATIVE_ASSET)]
+        row['usd'] = float(row['balance']) * native_price if row['balance'] is not None and native_price is not None else None
+        for token in row['tokens']:
+            price = prices[(chain, token['address'])]
+            token['usd'] = float(token['balance']) * price if token['balance'] is not None and price is not None else None
+    return jsonify(snapshot)
 
-@app.route('/api/transactions')
+@bp.route('/api/portfolio/totals')
+def get_portfolio_totals():
+    """USD totals per chain and label from the wallet state cache, optionally for one `chain` or `label`"""
+    chain = request.args.get('chain') or None
+    if chain is not None and chain not in CHAINS:
+        return jsonify({'error': 'Invalid chain selected'}), 400
+    wallets = tracked_wallets.for_chain(chain) if chain is not None else tracked_wallets.snapshot()
+    label = request.args.get('label')
+    if label:
+        wallets = [wallet for wallet in wallets if wallet.label == label]
+    return jsonify(tracker.valuation.totals(wallets))
+
+@bp.route('/api/transactions')
 def get_transactions():
-    """API endpoint to get recent transactions"""
-    transactions_data = []
-    for tx in recent_transactions[-20:]:  # Last 20 transactions
-        tx_data = tx.copy()
-        if 'timestamp' in tx_data and isinstance(tx_data['timestamp'], datetime):
-            tx_data['timestamp'] = tx_data['timestamp'].isoformat()
-        transactions_data.append(tx_data)
-    return jsonify(transactions_data)
-
-@app.route('/health')
+    """API endpoint to get recent transactions
+    
+    Returns up to `limit` events oldest first. Pass the last event's id as `since` to
+    poll for newer ones, or the first event's id as `before` to page back through history.
+    `fields` picks columns. With `format=ndjson` and no `limit` or `before`, every event after
+    `since` is streamed one per line.
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'ndjson'):
+        return jsonify({'error': 'Format must be json or ndjson'}), 400
+    chain = request.args.get('chain') or None
+    address = request.args.get('address') or None
+    if chain is not None and chain not in CHAINS:
+        return jsonify({'error': 'Invalid chain selected'}), 400
+    if address is not None and not ADDRESS_PATTERN.fullmatch(address):
+        return jsonify({'error': 'Invalid wallet address format'}), 400
+    try:
+        since = int(request.args['since']) if request.args.get('since') else None
+        before = int(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({'error': 'since and before must be event ids'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), ACTIVITY_PAGE_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'), ActivityEvent.__slots__)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if fmt == 'ndjson' and not request.args.get('limit') and before is None:
+        def all_events() -> Iterator[ActivityEvent]:
+            cursor = since or 0
+            while True:
+                page = activity_log.query(chain=chain, address=address, since=cursor, limit=ACTIVITY_PAGE_LIMIT)
+                yield from page
+                if len(page) < ACTIVITY_PAGE_LIMIT:
+                    return
+                cursor = page[-1].id
+        
+        return stream_rows((select_fields(event.to_dict(), fields) for event in all_events()), fmt)
+    
+    events = activity_log.query(chain=chain, address=address, since=since, before=before, limit=limit)
+    if fmt == 'ndjson':
+        return stream_rows((select_fields(event.to_dict(), fields) for event in events), fmt)
+    return jsonify([select_fields(event.to_dict(), fields) for event in events])
+
+@bp.route('/api/stream')
+def stream_events():
+    """Server-Sent Events stream of activity, wallet and sweep updates"""
+    subscriber = event_broker.subscribe()
+    
+    def generate():
+        try:
+            yield f"retry: 5000\nevent: heartbeat\ndata: {json.dumps({'time': datetime.now().isoformat()})}\n\n"
+            while True:
+                try:
+                    message = subscriber.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield f"event: heartbeat\ndata: {json.dumps({'time': datetime.now().isoformat()})}\n\n"
+                    continue
+                if message is None:
+                    return  # dropped by the broker
+                yield message
+        finally:
+            event_broker.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/health')
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'tracked_wallets': len(tracked_wallets),
-        'connections': list(tracker.web3_connections.keys()),
+        'connections': tracker.connected_chains(),
+        'rpc_endpoints': {
+            chain_id: [endpoint.status() for endpoint in pool.endpoints]
+            for chain_id, pool in tracker.endpoint_pools.items()
+        },
         'telegram_configured': bool(TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID),
-        'recent_transactions': len(recent_transactions)
+        'alert_queue_depth': tracker.alert_dispatcher.queue_depth(),
+        'alerts_dropped': tracker.alert_dispatcher.dropped,
+        'wallet_cache': tracker.state_cache.stats(),
+        'scheduler': adaptive_scheduler.stats() if MONITOR_MODE == 'adaptive' else None,
+        'shard': shard.status() if shard is not None else None,
+        'recent_transactions': len(activity_log),
+        'stream_subscribers': event_broker.subscriber_count()
     })
 
-@app.route('/test_telegram')
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this process"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/test_telegram')
 def test_telegram():
     """Test Telegram integration"""
     try:
@@ -558,21 +4084,28 @@ This is a test message from your Multi-Chain Wallet Tracker!
 ✅ Bot is working correctly!
 """
         tracker.send_telegram_alert(message)
-        return jsonify({'success': True, 'message': 'Test message sent to Telegram'})
+        return jsonify({'success': True, 'message': 'Test message queued for Telegram'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    # Create templates on startup
-    create_templates()
+    # Roles: 'web' (dashboard only), 'monitor' (monitor only) or both when omitted
+    role = sys.argv[1] if len(sys.argv) > 1 else 'all'
+    if role == 'monitor':
+        run_monitor()
+        sys.exit(0)
+    
+    app = create_app()
     
     # Get port from environment variable (Render sets this automatically)
     port = int(os.environ.get('PORT', 5000))
     
+    if role != 'web':
+        start_monitor_thread()
+    
     # Log startup info
     logger.info(f"Starting Multi-Chain Wallet Tracker on port {port}")
     logger.info(f"Telegram configured: {bool(TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID)}")
-    logger.info(f"Connected chains: {list(tracker.web3_connections.keys())}")
     
     # Run the app
     app.run(host='0.0.0.0', port=port, debug=False)